@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 시맨틱 답변 캐시 모듈
+=================================
+핵심 기능:
+1. 재작성된 질문의 bge-m3 임베딩과 코사인 유사도가 임계값 이상인 이전 답변 재사용
+2. 답변마다 출처 인용문과 벡터스토어 인덱스 버전 기록 (재빌드되면 이전 답변은 무효)
+3. memory: 항목 수(LRU)와 TTL로 크기가 제한된 메모리 저장소 (워커별)
+4. sqlite: 워커/재시작 간 공유되는 로컬 SQLite 저장소
+5. 조회/적중/저장/무효화 통계
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class MemoryAnswerStore:
+    """항목 수(LRU)와 TTL로 크기가 제한된 메모리 답변 저장소"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # 항목 ID -> 답변 항목 dict
+        self._matrix = None  # (인덱스 버전, 항목 ID 목록, 정규화된 임베딩 행렬) - 항목이 바뀌면 다시 생성
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def search(self, embedding: np.ndarray, index_version: str) -> Tuple[float, Optional[Dict]]:
+        """같은 인덱스 버전의 항목 중 가장 유사한 답변 → (유사도, 항목)"""
+        with self._lock:
+            self._expire()
+            if self._matrix is None or self._matrix[0] != index_version:
+                ids = [entry_id for entry_id, entry in self._entries.items() if entry["index_version"] == index_version]
+                vectors = np.stack([self._entries[i]["embedding"] for i in ids]) if ids else None
+                self._matrix = (index_version, ids, vectors)
+            _, ids, vectors = self._matrix
+            if vectors is None:
+                return 0.0, None
+            scores = vectors @ embedding
+            best = int(np.argmax(scores))
+            entry = self._entries[ids[best]]
+            self._entries.move_to_end(ids[best])
+            return float(scores[best]), entry
+
+    def add(self, entry: Dict):
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def purge(self, index_version: str) -> int:
+        """다른 인덱스 버전의 답변 삭제 → 삭제 수"""
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry["index_version"] != index_version]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            if stale:
+                self._matrix = None
+            return len(stale)
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+
+class SQLiteAnswerStore:
+    """로컬 SQLite 답변 저장소 (임베딩 행렬은 행 수/최대 ID가 바뀔 때만 다시 읽음)"""
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT, embedding BLOB, answer TEXT, "
+            "sources TEXT, index_version TEXT, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answer_cache_version ON answer_cache (index_version)")
+        # 인덱스 버전(해시)별로 처음 관측된 시각 - 버전 간 선후를 판단해 이전 버전만 삭제
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_versions (index_version TEXT PRIMARY KEY, first_seen REAL)"
+        )
+        self._conn.commit()
+        self._matrix = None  # (인덱스 버전, 행 수, 최대 ID, 항목 ID 목록, 임베딩 행렬)
+        self._lock = threading.Lock()
+
+    def search(self, embedding: np.ndarray, index_version: str) -> Tuple[float, Optional[Dict]]:
+        """같은 인덱스 버전의 항목 중 가장 유사한 답변 → (유사도, 항목)"""
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            count, max_id = self._conn.execute(
+                "SELECT COUNT(*), MAX(id) FROM answer_cache WHERE index_version = ? AND created_at >= ?",
+                (index_version, cutoff),
+            ).fetchone()
+            if not count:
+                return 0.0, None
+            if self._matrix is None or self._matrix[:3] != (index_version, count, max_id):
+                rows = self._conn.execute(
+                    "SELECT id, embedding FROM answer_cache WHERE index_version = ? AND created_at >= ?",
+                    (index_version, cutoff),
+                ).fetchall()
+                ids = [row[0] for row in rows]
+                vectors = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                self._matrix = (index_version, count, max_id, ids, vectors)
+            ids, vectors = self._matrix[3:]
+            scores = vectors @ embedding
+            best = int(np.argmax(scores))
+            row = self._conn.execute(
+                "SELECT question, answer, sources, index_version, created_at FROM answer_cache WHERE id = ?",
+                (ids[best],),
+            ).fetchone()
+            if row is None:
+                self._matrix = None
+                return 0.0, None
+            question, answer, sources, version, created_at = row
+            return float(scores[best]), {
+                "question": question, "answer": answer, "sources": json.loads(sources or "[]"),
+                "index_version": version, "created_at": created_at,
+            }
+
+    def add(self, entry: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answer_cache (question, embedding, answer, sources, index_version, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (entry["question"], entry["embedding"].astype(np.float32).tobytes(), entry["answer"],
+                 json.dumps(entry["sources"], ensure_ascii=False), entry["index_version"], entry["created_at"]),
+            )
+            # 만료 항목과 최대 항목 수를 넘는 오래된 항목 정리
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM answer_cache WHERE id NOT IN (SELECT id FROM answer_cache ORDER BY id DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def purge(self, index_version: str) -> int:
+        """현재 인덱스 버전보다 먼저 관측된 버전의 답변 삭제 → 삭제 수
+
+        워커마다 재로드 시점이 달라 아직 이전 버전을 쓰는 워커가 호출해도 새 버전 답변은 삭제하지 않음
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO index_versions VALUES (?, ?)", (index_version, time.time())
+            )
+            deleted = self._conn.execute(
+                "DELETE FROM answer_cache WHERE index_version NOT IN ("
+                "SELECT index_version FROM index_versions WHERE first_seen >= "
+                "(SELECT first_seen FROM index_versions WHERE index_version = ?))",
+                (index_version,),
+            ).rowcount
+            self._conn.commit()
+            return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "path": self.path,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+class AnswerCache:
+    """ANSWER_CACHE 정책(none | memory | sqlite)에 따른 시맨틱 답변 캐시"""
+
+    def __init__(self, policy: str = None, threshold: float = None, max_entries: int = None,
+                 ttl_seconds: float = None, sqlite_path: str = None):
+        self.policy = (policy or os.environ.get("ANSWER_CACHE", "none")).lower()
+        self.threshold = threshold if threshold is not None \
+            else float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+        max_entries = max_entries or int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 1000))
+        ttl_seconds = ttl_seconds if ttl_seconds is not None \
+            else float(os.environ.get("ANSWER_CACHE_TTL", 86400))
+        sqlite_path = sqlite_path or os.environ.get("ANSWER_CACHE_DB", "/app/shared_data/answer_cache.sqlite")
+
+        self.store = None
+        if self.policy == "sqlite":
+            try:
+                self.store = SQLiteAnswerStore(sqlite_path, max_entries, ttl_seconds)
+            except sqlite3.Error as e:
+                print(f"SQLite 답변 캐시 사용 불가, 메모리 캐시 사용: {e}")
+                self.policy = "memory"
+        elif self.policy not in ("none", "memory"):
+            print(f"알 수 없는 답변 캐시 정책 '{self.policy}', 메모리 캐시 사용")
+            self.policy = "memory"
+        if self.policy == "memory":
+            self.store = MemoryAnswerStore(max_entries, ttl_seconds)
+
+        self._index_version = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def _check_version(self, index_version: str):
+        """인덱스 버전이 바뀌면(재빌드) 이전 버전 답변 삭제"""
+        if index_version != self._index_version:
+            removed = self.store.purge(index_version)
+            with self._lock:
+                self._index_version = index_version
+                self.invalidated += removed
+            if removed:
+                print(f"🧹 인덱스 버전 변경, 이전 캐시 답변 {removed}개 삭제")
+
+    def lookup(self, embedding, index_version: str) -> Tuple[float, Optional[Dict]]:
+        """유사도가 임계값 이상인 캐시 답변 → (최고 유사도, 항목 또는 None)"""
+        if not self.enabled or embedding is None or index_version is None:
+            return 0.0, None
+        self._check_version(index_version)
+        score, entry = self.store.search(_normalize(embedding), index_version)
+        hit = entry is not None and score >= self.threshold
+        with self._lock:
+            self.lookups += 1
+            self.hits += hit
+        return score, entry if hit else None
+
+    def add(self, question: str, embedding, answer: str, sources: List[str], index_version: str):
+        """생성된 답변을 출처 인용문, 인덱스 버전과 함께 저장"""
+        if not self.enabled or embedding is None or index_version is None:
+            return
+        self._check_version(index_version)
+        self.store.add({
+            "question": question,
+            "embedding": _normalize(embedding),
+            "answer": answer,
+            "sources": list(dict.fromkeys(sources)),
+            "index_version": index_version,
+            "created_at": time.time(),
+        })
+        with self._lock:
+            self.stores += 1
+
+    def close(self):
+        if isinstance(self.store, SQLiteAnswerStore):
+            self.store.close()
+
+    def stats(self) -> Dict:
+        """답변 캐시 적중률/저장소 통계"""
+        result = {"policy": self.policy}
+        if not self.enabled:
+            return result
+        result.update({
+            "threshold": self.threshold,
+            "index_version": self._index_version,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.lookups - self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "stores": self.stores,
+            "invalidated": self.invalidated,
+            **self.store.stats(),
+        })
+        return result
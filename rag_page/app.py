@@ -1,27 +1,31 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import json
 import uuid
 import os
+import asyncio
 from datetime import datetime
 from typing import Dict, List, Optional
 import httpx
 from pathlib import Path
 import hashlib
 import sys
+import time
 import warnings
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
 # LangChain 관련
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from typing_extensions import TypedDict, Annotated
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
 from langgraph.graph import END, StateGraph, START
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_teddynote.messages import random_uuid
 from langchain_core.runnables import RunnableConfig
 from langchain.memory import ConversationBufferWindowMemory
 
@@ -33,13 +37,45 @@ if str(current_dir) not in sys.path:
     sys.path.insert(0, str(current_dir))
 
 # Simple RAG import
-from simple_rag_with_pages import init_fast_rag, fast_search
+from simple_rag_with_pages import (
+    init_fast_rag, fast_search, fast_search_many, build_source_info, get_search_stats, embed_question,
+    lookup_cutoffs, expand_parents, load_tokenizer,
+)
+from concurrency_limiter import create_backend_limiters, create_request_limiter
+from reranker import LLMReranker, create_reranker
+from checkpointer import CheckpointerManager
+from answer_cache import AnswerCache
+from query_router import QueryRouter
+from context_packer import ContextPacker
+from metrics import (
+    LLMTokenCounter, span, llm_span, trace_request, traced_node, mark_trace_error, install_retry_counter,
+    render_metrics, trace_store, current_trace, SEARCH_SECONDS, RERANK_SECONDS, RERANK_DOCUMENTS,
+    QUEUE_WAIT_SECONDS, LLM_FIRST_TOKEN_SECONDS, ANSWER_CACHE_LOOKUPS, CUTOFF_LOOKUPS,
+    QUERY_ROUTES, CONTEXT_TOKENS,
+)
 
 # --- 경로 설정 ---
 APP_DIR = Path(__file__).parent.resolve()
 # --- 경로 설정 끝 ---
 
-app = FastAPI(title="병무청 Chat API", version="1.0.0")
+# 서버 준비 상태 (/readyz) - 인덱스 로드/워크플로우 컴파일은 백그라운드에서 진행
+startup_state = {"status": "starting", "error": None, "started_at": datetime.now().isoformat(), "ready_at": None}
+# 준비 실패(벡터스토어 없음 등) 시 재시도 간격(초)
+WARMUP_RETRY_INTERVAL = float(os.environ.get("WARMUP_RETRY_INTERVAL", 30))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """서버는 바로 연결을 받고, 무거운 초기화는 백그라운드 작업으로 실행"""
+    warmup_task = asyncio.create_task(warmup())
+    yield
+    warmup_task.cancel()
+    await checkpointer_manager.close()
+    answer_cache.close()
+    print("👋 서버 종료: 체크포인터/답변 캐시 연결 정리 완료")
+
+
+app = FastAPI(title="병무청 Chat API", version="1.0.0", lifespan=lifespan)
 
 # CORS 설정
 app.add_middleware(
@@ -58,44 +94,114 @@ app.mount("/static", StaticFiles(directory=str(APP_DIR / "static")), name="stati
 sessions: Dict[str, Dict] = {}
 lc_memories: Dict[str, ConversationBufferWindowMemory] = {}  # LangChain 메모리 관리 (세션별)
 
+# vLLM 서버 주소 (환경변수: VLLM_URL, VLLM_32B_URL - 벤치마크 시 스텁 서버로 교체)
+VLLM_URL = os.environ.get("VLLM_URL", "http://vllm_8b:8000/v1")
+VLLM_32B_URL = os.environ.get("VLLM_32B_URL", "http://vllm_32b:8000/v1")
+
 # LLM 모델 설정 (context 길이 제한 강화)
 llm_model_8b = ChatOpenAI(
     model_name="/root/.cache/huggingface/llama-3-Korean-Bllossom-8B",
-    base_url="http://vllm_8b:8000/v1",
+    base_url=VLLM_URL,
     api_key="EMPTY",
     temperature=0,
     max_tokens=24000, 
     timeout=120,  # 타임아웃 2분으로 증가
     max_retries=3,  # 최대 3회 재시도
+    callbacks=[LLMTokenCounter("vllm_8b")],  # 토큰 사용량 집계 (/metrics)
 )
 
 llm_model_32b = ChatOpenAI(
     model_name="/root/.cache/huggingface/Qwen2.5-32B-Instruct",
-    base_url="http://vllm_32b:8000/v1",
+    base_url=VLLM_32B_URL,
     api_key="EMPTY",
     temperature=0,
     max_tokens=24000,  # context 최대한 활용
     timeout=120,
     max_retries=3,
+    callbacks=[LLMTokenCounter("vllm_32b")],
 )
 
 llm_model_generate = ChatOpenAI(
     model_name="/root/.cache/huggingface/Qwen2.5-32B-Instruct",
-    base_url="http://vllm_32b:8000/v1",
+    base_url=VLLM_32B_URL,
     api_key="EMPTY",
     temperature=1,
     timeout=120,
     max_retries=3,
+    stream_usage=True,  # 스트리밍 응답에도 토큰 사용량 포함
+    callbacks=[LLMTokenCounter("vllm_32b")],
 )
+# openai 클라이언트 재시도 횟수 집계 (rag_llm_retries_total)
+install_retry_counter()
+
+# 백엔드별 동시성 제한 (환경변수: VLLM_8B_MAX_CONCURRENCY, VLLM_32B_MAX_CONCURRENCY, OLLAMA_MAX_CONCURRENCY)
+backend_limiters = create_backend_limiters()
+# 동시 RAG 요청 제한 (환경변수: RAG_MAX_CONCURRENT_REQUESTS), 초과 요청은 대기열에서 순번 대기
+request_limiter = create_request_limiter()
+
+
+async def invoke_llm(chain, inputs: dict, backend: str):
+    """백엔드 동시성 제한을 적용해 체인을 비동기 호출"""
+    async with backend_limiters[backend].slot(), llm_span(backend):
+        return await chain.ainvoke(inputs)
+
+
+# 요청별 스트리밍 이벤트 싱크 (WebSocket/SSE) - 그래프 노드와 검색 작업은 같은 컨텍스트를 상속
+event_sink: ContextVar[Optional[dict]] = ContextVar("event_sink", default=None)
+
+
+async def emit_event(event_type: str, **data):
+    """진행 단계/토큰 이벤트를 현재 요청의 싱크로 전송 (싱크가 없거나 전송 실패 시 무시)"""
+    sink = event_sink.get()
+    if sink is None:
+        return
+    event = {"type": event_type, "elapsed_ms": round((time.perf_counter() - sink["started"]) * 1000), **data}
+    try:
+        await sink["send"](event)
+    except Exception as e:
+        print(f"⚠️ 스트리밍 이벤트 전송 실패: {e}")
 
 
+async def stream_llm(chain, inputs: dict, backend: str) -> str:
+    """백엔드 동시성 제한을 적용해 체인 출력을 스트리밍, 토큰마다 이벤트 싱크로 전송 후 전체 답변 반환"""
+    chunks = []
+    async with backend_limiters[backend].slot(), llm_span(backend, stream=True) as record:
+        start = time.perf_counter()
+        async for chunk in chain.astream(inputs):
+            if chunk and not chunks:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, backend=backend)
+                record["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if chunk:
+                chunks.append(chunk)
+                await emit_event("token", content=chunk)
+    return "".join(chunks)
 
-# RAG 초기화
-print("🏗️ RAG 시스템 초기화 중...")
-# Docker 환경에서 데이터 경로 설정
+
+async def afast_search(query: str, k: int = 5):
+    """임베딩(Ollama) 호출이 포함된 검색을 이벤트 루프 밖 스레드에서 실행"""
+    async with backend_limiters["ollama"].slot(), span("search", SEARCH_SECONDS, {"kind": "single"}, queries=1):
+        return await asyncio.to_thread(fast_search, query, k)
+
+
+async def afast_search_many(queries: List[str], k: int = 5):
+    """여러 질의를 한 번의 배치 임베딩/인덱스 검색으로 처리 (질의 간 중복 제거된 질의별 결과)"""
+    async with backend_limiters["ollama"].slot(), \
+            span("search", SEARCH_SECONDS, {"kind": "batch"}, queries=len(queries)):
+        return await asyncio.to_thread(fast_search_many, queries, k)
+
+
+# 하위 질문 병렬 검색 전체 마감 시간(초) - 초과한 하위 질문 결과는 제외
+SEARCH_DEADLINE = float(os.environ.get("SEARCH_DEADLINE", 90))
+# 커트라인 점수 질문 구조화 조회 사용 여부 (1: 표 인덱스에서 찾으면 검색/리랭킹 생략)
+CUTOFF_LOOKUP = os.environ.get("CUTOFF_LOOKUP", "1") == "1"
+# fast 경로(리랭킹 없는 하이브리드 검색)에서 답변 생성에 넘길 문서 수
+ROUTER_FAST_K = int(os.environ.get("ROUTER_FAST_K", 8))
+
+
+# Docker 환경에서 데이터 경로 설정 (RAG 초기화는 lifespan의 warmup에서 수행)
 data_path = str(APP_DIR / "data")
-init_fast_rag(data_path=data_path, store_name="vector_store")
-print("✅ RAG 시스템 초기화 완료!")
+# 검색 프로세스가 로드하는 벡터스토어 이름 (make_vector_store.py가 빌드하는 폴더)
+vector_store_name = "vector_store"
 
 re_write_system = """
 당신의 역할은 사용자의 질문을 키워드 중심으로 재작성하는 것입니다.
@@ -256,103 +362,74 @@ semantic_reranking_system = """
 
 # 새로운 출처 추적 시스템 추가
 class SourceTracker:
-    """정확한 출처 추적을 위한 클래스"""
+    """정확한 출처 추적을 위한 클래스 - 인덱스 생성 시 미리 계산된 출처 메타데이터 사용"""
     
-    def __init__(self):
-        self.doc_source_map = {}  # 문서 ID -> 출처 정보 매핑
-        self.content_hash_map = {}  # 내용 해시 -> 출처 정보 매핑
+    def __init__(self, cache_size: int = 4096):
+        # 이전 형식 청크(출처 필드 없음)만 메타데이터 키 기준 LRU 캐시로 계산 (내용 해싱 없음)
+        self._cached_source_info = lru_cache(maxsize=cache_size)(self._source_info_from_key)
     
-    def register_document(self, doc_id: str, doc):
-        """문서 등록 및 출처 정보 매핑"""
-        source_info = self.extract_precise_source_info(doc)
-        content_hash = hashlib.md5(doc.page_content.encode()).hexdigest()
-        
-        self.doc_source_map[doc_id] = source_info
-        self.content_hash_map[content_hash] = source_info
-        
-        return source_info
+    @staticmethod
+    def _source_info_from_key(key):
+        source, pages, primary_page, page_span, chunk_index, total_chunks = key
+        return build_source_info({
+            'source': source,
+            'pages': list(pages),
+            'primary_page': primary_page,
+            'page_span': page_span,
+            'chunk_index': chunk_index,
+            'total_chunks': total_chunks
+        })
     
     def extract_precise_source_info(self, doc):
         """문서에서 정확한 출처 정보를 추출"""
         metadata = doc.metadata
-        
-        # 파일명 처리
-        source = metadata.get('source', '알 수 없음')
-        if isinstance(source, str):
-            # 경로에서 파일명만 추출하고 확장자 제거
-            file_name = os.path.basename(source)
-            if '.' in file_name:
-                file_name = file_name.rsplit('.', 1)[0]
-        else:
-            file_name = str(source)
-        
-        # 페이지 정보 정확히 추출
+        if 'source_citation' in metadata:
+            # 인덱스 생성 시 계산된 출처 정보
+            return {
+                'file_name': metadata.get('file_name', ''),
+                'page_info': metadata.get('page_info', ''),
+                'source_citation': metadata['source_citation'],
+                'pages': metadata.get('pages', []),
+                'primary_page': metadata.get('primary_page'),
+                'chunk_index': metadata.get('chunk_index', ''),
+                'total_chunks': metadata.get('total_chunks', ''),
+                'original_source': metadata.get('source', '알 수 없음')
+            }
         pages = metadata.get('pages', [])
-        primary_page = metadata.get('primary_page', None)
-        page_span = metadata.get('page_span', None)
-        
-        # 페이지 정보 우선순위: pages > primary_page > page_span
-        if isinstance(pages, list) and pages:
-            if len(pages) == 1:
-                page_info = f"p.{pages[0]}"
-            else:
-                page_info = f"p.{min(pages)}-{max(pages)}"
-        elif primary_page and primary_page != '?' and primary_page != 0:
-            page_info = f"p.{primary_page}"
-        elif page_span and page_span != '?' and page_span != '0':
-            page_info = f"p.{page_span}"
-        else:
-            page_info = ""
-        
-        # 청크 정보
-        chunk_index = metadata.get('chunk_index', '')
-        total_chunks = metadata.get('total_chunks', '')
-        
-        return {
-            'file_name': file_name,
-            'page_info': page_info,
-            'pages': pages,
-            'primary_page': primary_page,
-            'chunk_index': chunk_index,
-            'total_chunks': total_chunks,
-            'original_source': source
-        }
+        key = (
+            str(metadata.get('source', '알 수 없음')),
+            tuple(pages) if isinstance(pages, (list, tuple)) else (),
+            metadata.get('primary_page'),
+            metadata.get('page_span'),
+            metadata.get('chunk_index', ''),
+            metadata.get('total_chunks', '')
+        )
+        return self._cached_source_info(key)
     
     def get_source_citation(self, doc):
         """문서에 대한 정확한 출처 인용문 생성"""
-        content_hash = hashlib.md5(doc.page_content.encode()).hexdigest()
-        
-        # 해시로 먼저 찾기
-        if content_hash in self.content_hash_map:
-            source_info = self.content_hash_map[content_hash]
-        else:
-            # 실시간 추출
-            source_info = self.extract_precise_source_info(doc)
-        
-        file_name = source_info['file_name']
-        page_info = source_info['page_info']
-        
-        if page_info:
-            return f"[출처: {file_name} {page_info}]"
-        else:
-            return f"[출처: {file_name}]"
+        return self.extract_precise_source_info(doc)['source_citation']
     
     def get_detailed_source_info(self, doc):
         """상세한 출처 정보 반환"""
-        content_hash = hashlib.md5(doc.page_content.encode()).hexdigest()
-        
-        if content_hash in self.content_hash_map:
-            return self.content_hash_map[content_hash]
-        else:
-            return self.extract_precise_source_info(doc)
+        return self.extract_precise_source_info(doc)
 
 # 전역 출처 추적기 인스턴스
 source_tracker = SourceTracker()
 
+# 시맨틱 답변 캐시 (환경변수: ANSWER_CACHE=none|memory|sqlite, 기본 none)
+answer_cache = AnswerCache()
+
+# 질의 라우터 (환경변수: QUERY_ROUTER=auto|fast|standard|deep|off, 기본 auto)
+query_router = QueryRouter()
+
+# 답변 생성 문맥 패커 (환경변수: CONTEXT_TOKEN_BUDGET, CONTEXT_DOC_MAX_TOKENS, CONTEXT_TOKENIZER, 토크나이저는 warmup에서 설정)
+context_packer = ContextPacker()
+
 # 프롬프트 템플릿 생성
 re_write_prompt = ChatPromptTemplate.from_messages([
     ("system", re_write_system),
-    ("human", "chat history:\n{chat_history}")
+    ("human", "chat history:\n{chat_history}\n\n질문: {question}")
 ])
 
 
@@ -378,18 +455,30 @@ semantic_reranking_prompt = ChatPromptTemplate.from_messages([
     ("human", "문서: {document}\n\n질문: {question}"),
 ])
 
+# LLM 리랭커 (환경변수: RERANK_MAX_CONCURRENCY, RERANK_TIMEOUT, RERANK_EARLY_STOP)
+llm_reranker = LLMReranker(
+    chain=semantic_reranking_prompt | llm_model_8b | StrOutputParser(),
+    limiter=backend_limiters["vllm_8b"],
+)
+# 리랭커 선택 (환경변수: RERANKER_BACKEND=llm|cross_encoder)은 warmup에서 수행, 크로스인코더 실패 시 LLM 리랭커로 폴백
+semantic_reranker = llm_reranker
+
 # 새로운 함수들 정의
 
 def generate_content_hash(content: str) -> str:
     """문서 내용의 해시값을 생성하여 중복 체크에 사용"""
     return hashlib.md5(content.encode()).hexdigest()
 
-def enhanced_multi_search(question: str) -> List:
+def get_doc_key(doc) -> str:
+    """중복 체크용 문서 키 - 인덱스에 저장된 chunk_id 우선, 없을 때만 내용 해시"""
+    return doc.metadata.get("chunk_id") or generate_content_hash(doc.page_content)
+
+async def enhanced_multi_search(question: str) -> List:
     """BM25/FAISS+LLM 리랭킹만 사용하는 개선된 검색 함수"""
     try:
         # 1. 멀티쿼리 생성
         multi_query_generator = multi_query_prompt | llm_model_32b | StrOutputParser()
-        queries_result = multi_query_generator.invoke({"question": question})
+        queries_result = await invoke_llm(multi_query_generator, {"question": question}, "vllm_32b")
         try:
             # JSON 파싱 시도
             queries = json.loads(queries_result)
@@ -400,80 +489,78 @@ def enhanced_multi_search(question: str) -> List:
             queries = [question]
         print(f"🔍 생성된 멀티쿼리: {queries}")
         
-        # 2. 각 쿼리로 검색 수행 (키워드 필터링 없이, context 관리 강화)
-        all_documents = []
-        seen_hashes = set()
-        
-        for query in queries:
-            try:
-                docs_per_query = 5
-                docs = fast_search(query, k=docs_per_query)
-                
-                for doc in docs:
-                    content_hash = generate_content_hash(doc.page_content)
-                    if content_hash not in seen_hashes:
-                        seen_hashes.add(content_hash)
-                        all_documents.append(doc)
-                        
-            except Exception as e:
-                print(f"쿼리 '{query}' 검색 실패: {e}")
-                continue
-
-
+        # 2. 모든 쿼리를 한 번에 검색 (배치 임베딩 + 일괄 FAISS/BM25, 키워드 필터링 없이)
+        docs_per_query = 5
+        queries = [str(query) for query in queries if str(query).strip()] or [question]
+        all_documents = [
+            doc
+            for docs in await afast_search_many(queries, k=docs_per_query)
+            for doc in docs
+        ]
+        await emit_event("stage", stage="retrieval", status="progress", question=question, documents=len(all_documents))
         
-        # 3. LLM 의미적 리랭킹 (검색된 모든 문서에 대해)
-        scored_documents = []
-        reranker = semantic_reranking_prompt | llm_model_8b | StrOutputParser()
-        for i, doc in enumerate(all_documents):  # 모든 문서에 대해 리랭킹 수행
-            try:
-                content = doc.page_content.strip()
-                # 정말로 빈 문서만 제외(10자 미만)
-                if len(content) < 10:
-                    scored_documents.append((doc, 1))
-                    continue
-                # 그 외에는 모두 LLM 리랭킹에 맡김 (키워드 필터링 없음)
-                score_text = reranker.invoke({
-                    "document": content,  # 문서 전체 내용 사용
-                    "question": question
-                })
-                # 점수 추출 (1-10)
-                score = 1
-                for char in score_text:
-                    if char.isdigit():
-                        potential_score = int(char)
-                        if 1 <= potential_score <= 10:
-                            score = potential_score
-                            break
-                scored_documents.append((doc, score))
-            except Exception as e:
-                print(f"리랭킹 실패: {e}")
-                scored_documents.append((doc, 3))  # 낮은 기본 점수
+        # 3. 의미적 리랭킹 (LLM 또는 크로스인코더로 검색된 모든 문서 평가)
+        await emit_event("stage", stage="rerank", status="start", question=question, documents=len(all_documents))
+        RERANK_DOCUMENTS.observe(len(all_documents))
+        async with span("rerank", RERANK_SECONDS, documents=len(all_documents)):
+            scored_documents = await semantic_reranker.score(question, all_documents)
         
-        # 4. 점수 기준 정렬 및 상위 10개 문서 선택
+        # 4. 점수 기준 정렬 및 8점 이상 문서 선택 (점수는 문맥 패킹 순서에 사용, 검색 캐시 문서는 변경하지 않도록 복사)
         scored_documents.sort(key=lambda x: x[1], reverse=True)  # 점수 순으로 정렬
-        top_documents = [doc for doc, score in scored_documents if score >= 8]
+        top_documents = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": score})
+            for doc, score in scored_documents if score >= 8
+        ]
+        await emit_event("stage", stage="rerank", status="done", question=question, documents=len(top_documents))
         
         return top_documents
     except Exception as e:
         print(f"❌ 멀티쿼리 검색 실패: {e}")
         # 폴백: 기본 검색
-        return fast_search(question, k=10)
+        return await afast_search(question, k=10)
 
 # 그래프 상태 정의
 class GraphState(TypedDict):
     question: Annotated[str, "User question"]
     chat_history: Annotated[str, "Chat history for context"]
     sub_questions: Annotated[List[str], "List of sub-questions in logical order"]
-    current_question_index: Annotated[int, "Current sub-question being processed"]
     document: Annotated[List[str], "Combined documents"]
     generation: Annotated[str, "LLM generated answer"]
+    cached: Annotated[bool, "Answer served from the semantic answer cache"]
+    route: Annotated[str, "Query route chosen by the router (fast | standard | deep)"]
 
 # 노드 함수들 정의
 
-def re_writer(state):
+def has_chat_history(chat_history) -> bool:
+    """재작성이 필요한 대화 기록이 있는지 (re_writer의 건너뛰기 기준과 동일)"""
+    if isinstance(chat_history, list):
+        return bool(chat_history)
+    return bool(chat_history) and len(chat_history.strip()) >= 10
+
+async def route_query(state):
+    """LLM 없이 질문 경로 선택: fast(바로 검색) | standard(재작성 + 멀티쿼리/리랭킹) | deep(추가 질문 생성까지)"""
+    route, reason = query_router.classify(state["question"], has_chat_history(state.get("chat_history", "")))
+    QUERY_ROUTES.inc(route=route)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attributes.update(route=route, route_reason=reason)
+    print(f"🧭 질의 경로: {route} ({reason})")
+    await emit_event("stage", stage="route", status="done", route=route, reason=reason)
+    return {"route": route}
+
+async def direct_search(state):
+    """fast 경로: 멀티쿼리/리랭킹 없이 하이브리드 검색 결과를 그대로 답변 생성에 사용"""
+    question = state["question"]
+    await emit_event("stage", stage="retrieval", status="start", sub_questions=[question])
+    documents = await afast_search(question, k=ROUTER_FAST_K)
+    await emit_event("stage", stage="retrieval", status="done", documents=len(documents))
+    return {"document": documents, "sub_questions": [question]}
+
+async def re_writer(state):
     """질문 재작성 - chat_history를 올바르게 포맷해서 LLM 프롬프트에 넘김 (명사 추출 없이)"""
     question = state["question"]
     chat_history = state.get("chat_history", "")
+    await emit_event("stage", stage="rewrite", status="start")
     # chat_history가 리스트(messages)면 포맷팅
     if isinstance(chat_history, list):
         # ConversationBufferWindowMemory에서 직접 메시지 가져오기
@@ -497,25 +584,88 @@ def re_writer(state):
     # 첫 번째 질문이거나 chat history가 없으면 재작성 건너뛰기
     if not chat_history_str or chat_history_str.strip() == "" or len(chat_history_str.strip()) < 10:
         print(f"🔍 질문 재작성 건너뜀: 첫 번째 질문이거나 chat history 없음 - '{question}'")
+        await emit_event("stage", stage="rewrite", status="skipped", question=question)
         return {"question": question}
     try:
         re_writer_chain = re_write_prompt | llm_model_32b | StrOutputParser()
-        rewritten = re_writer_chain.invoke({
+        rewritten = await invoke_llm(re_writer_chain, {
             "question": question,
             "chat_history": chat_history_str
-        })
+        }, "vllm_32b")
         if len(rewritten) > len(question) * 2:
             print(f"⚠️  재작성 결과가 너무 길어서 원래 질문 유지: '{question}'")
-            return {"question": question}
-        print(f"✅ 질문 재작성(LLM): '{question}' → '{rewritten}'")
-        return {"question": rewritten}
+            rewritten = question
+        else:
+            print(f"✅ 질문 재작성(LLM): '{question}' → '{rewritten}'")
     except Exception as e:
         print(f"❌ 재작성 실패, 원본 유지: {e}")
-        return {"question": question}
+        rewritten = question
+    await emit_event("stage", stage="rewrite", status="done", question=rewritten)
+    return {"question": rewritten}
+
+def attach_cached_sources(answer: str, sources: List[str]) -> str:
+    """출처 표시가 없는 캐시 답변에는 저장해 둔 출처 인용문을 덧붙임"""
+    if not sources or "[출처:" in answer:
+        return answer
+    return answer + "\n\n" + "\n".join(sources[:5])
+
+async def answer_cache_lookup(state):
+    """재작성된 질문과 유사한 이전 답변(같은 인덱스 버전)이 있으면 검색/생성 없이 재사용"""
+    if not answer_cache.enabled:
+        return {"cached": False}
+    await emit_event("stage", stage="cache", status="start")
+    try:
+        embedding, index_version = await asyncio.to_thread(embed_question, state["question"])
+        score, entry = await asyncio.to_thread(answer_cache.lookup, embedding, index_version)
+    except Exception as e:
+        print(f"⚠️ 답변 캐시 조회 실패: {e}")
+        score, entry = 0.0, None
+    result = "hit" if entry is not None else "miss"
+    ANSWER_CACHE_LOOKUPS.inc(result=result)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attributes["answer_cache"] = result
+    await emit_event("stage", stage="cache", status=result, similarity=round(score, 3))
+    if entry is None:
+        return {"cached": False}
+    print(f"♻️ 답변 캐시 적중 (유사도 {score:.3f}): '{state['question']}' ≈ '{entry['question']}'")
+    return {"cached": True, "generation": attach_cached_sources(entry["answer"], entry["sources"]), "document": []}
+
+async def store_cached_answer(question: str, answer: str, docs: List):
+    """생성된 답변을 답변 캐시에 저장 (출처 인용문, 인덱스 버전 포함)"""
+    if not answer_cache.enabled:
+        return
+    try:
+        embedding, index_version = await asyncio.to_thread(embed_question, question)
+        sources = [source_tracker.get_source_citation(doc) for doc in docs]
+        await asyncio.to_thread(answer_cache.add, question, embedding, answer, sources, index_version)
+    except Exception as e:
+        print(f"⚠️ 답변 캐시 저장 실패: {e}")
 
-def question_decomposer(state):
+async def cutoff_lookup(state):
+    """커트라인 점수 질문(특기명 + 커트라인/합격 점수/선발인원)은 표 인덱스에서 바로 조회해 검색/리랭킹 생략"""
+    if not CUTOFF_LOOKUP:
+        return {"document": []}
+    try:
+        documents = await asyncio.to_thread(lookup_cutoffs, state["question"])
+    except Exception as e:
+        print(f"⚠️ 커트라인 조회 실패: {e}")
+        documents = None
+    result = "hit" if documents else "miss"
+    CUTOFF_LOOKUPS.inc(result=result)
+    if not documents:
+        return {"document": []}
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attributes["route"] = "cutoff"
+    print(f"📊 커트라인 구조화 조회: {len(documents)}개 문서 (벡터 검색 생략)")
+    await emit_event("stage", stage="retrieval", status="done", documents=len(documents), structured=True)
+    return {"document": documents, "sub_questions": [state["question"]]}
+
+async def question_decomposer(state):
     """입력 질문을 기반으로 추가 질문을 생성하여 풍부한 답변을 위한 문서 검색 - state 전체 유지하면서 필요한 값만 갱신"""
     max_retries = 3
+    await emit_event("stage", stage="decompose", status="start")
     
     for attempt in range(max_retries):
         print(f"🔍 추가 질문 생성 시도 {attempt + 1}/{max_retries}: {state['question']}")
@@ -523,9 +673,9 @@ def question_decomposer(state):
         try:
             # LLM 호출 시 제한 적용
             decomposer = question_decomposer_prompt | llm_model_8b | StrOutputParser()
-            result = decomposer.invoke({
+            result = await invoke_llm(decomposer, {
                 "question": state["question"]
-            })
+            }, "vllm_8b")
             
             # JSON 파싱 시도
             try:
@@ -541,12 +691,12 @@ def question_decomposer(state):
             # 질문이 3개를 넘으면 앞 3개만 사용 (context 관리)
             if len(sub_questions) > 3:
                 sub_questions = sub_questions[:3]
+            await emit_event("stage", stage="decompose", status="done", sub_questions=sub_questions)
             
             # state 전체를 유지하면서 필요한 값만 갱신
             return {
                 **state,  # 기존 state 유지
                 "sub_questions": sub_questions,
-                "current_question_index": 0,
                 "document": [],  # 매번 새로운 질문마다 document 초기화
                 "generation": ""
             }
@@ -554,10 +704,10 @@ def question_decomposer(state):
         except Exception as e:
             print(f"❌ 추가 질문 생성 실패 (시도 {attempt + 1}): {e}")
             if attempt == max_retries - 1:
+                await emit_event("stage", stage="decompose", status="done", sub_questions=[state["question"]])
                 return {
                     **state,  # 기존 state 유지
                     "sub_questions": [state["question"]],
-                    "current_question_index": 0,
                     "document": [],  # 매번 새로운 질문마다 document 초기화
                     "generation": ""
                 }
@@ -566,77 +716,81 @@ def question_decomposer(state):
     return {
         **state,  # 기존 state 유지
         "sub_questions": [state["question"]],
-        "current_question_index": 0,
         "document": [],  # 매번 새로운 질문마다 document 초기화
         "generation": ""
     }
             
 
-def recursive_search(state):
-    """재귀 검색 - state 전체 유지하면서 필요한 값만 갱신"""
-    sub_questions = state.get("sub_questions", [state["question"]])
-    current_index = state.get("current_question_index", 0)
-    all_documents = state.get("document", [])
-
-    if current_index >= len(sub_questions):
-        return {
-            **state,  # 기존 state 유지
-            "document": all_documents,
-            "current_question_index": current_index
-        }
-
-    current_question = sub_questions[current_index]
-
-    try:
-        print(f"🔍 하위 질문 {current_index + 1}: {current_question}")
-        documents = enhanced_multi_search(current_question)  
-    except Exception as e:
-        print(f"❌ 검색 중 오류: {e}")
-        documents = []
-
-    # 누적 방식으로 document 합치기
-    all_documents = all_documents + documents
+async def parallel_search(state):
+    """하위 질문 병렬 검색 - 모든 하위 질문을 동시에 검색하고 전체 마감 시간 내 결과만 합침"""
+    sub_questions = state.get("sub_questions") or [state["question"]]
+    await emit_event("stage", stage="retrieval", status="start", sub_questions=sub_questions)
+
+    tasks = [asyncio.ensure_future(enhanced_multi_search(q)) for q in sub_questions]
+    for i, q in enumerate(sub_questions):
+        print(f"🔍 하위 질문 {i + 1}: {q}")
+    done, pending = await asyncio.wait(tasks, timeout=SEARCH_DEADLINE)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"⏱️ 검색 마감 시간({SEARCH_DEADLINE}s) 초과: {len(pending)}개 하위 질문 결과 제외")
+
+    # 하위 질문 순서대로 합치면서 청크 ID(내용 기반 해시)로 중복 제거
+    all_documents = []
+    seen_keys = set()
+    for question, task in zip(sub_questions, tasks):
+        if task not in done:
+            continue
+        try:
+            documents = task.result()
+        except Exception as e:
+            print(f"❌ 검색 중 오류 ({question}): {e}")
+            continue
+        for doc in documents:
+            doc_key = get_doc_key(doc)
+            if doc_key not in seen_keys:
+                seen_keys.add(doc_key)
+                all_documents.append(doc)
+    await emit_event("stage", stage="retrieval", status="done", documents=len(all_documents))
 
     return {
         **state,  # 기존 state 유지
         "document": all_documents,
-        "current_question_index": current_index + 1,
         "sub_questions": sub_questions
     }
 
-def check_recursion_complete(state):
-    """재귀 처리가 완료되었는지 확인"""
-    sub_questions = state.get("sub_questions", [])
-    current_index = state.get("current_question_index", 0)
-    
-    if current_index >= len(sub_questions):
-        return "complete"
-    else:
-        return "continue"
-
 # 2. Qwen 32B용 포맷 함수 추가
 
-def format_docs_for_qwen(docs, max_docs=15):
-    """개선된 Qwen 32B용: 정확한 출처 정보가 포함된 문서 포맷"""
+def format_docs_for_qwen(docs):
+    """개선된 Qwen 32B용: 정확한 출처 정보가 포함된 문서 포맷 (문서 수/길이는 context_packer가 제한)"""
     formatted = []
-    for i, doc in enumerate(docs[:max_docs]):
+    for i, doc in enumerate(docs):
         content = doc.page_content
         
         # 출처 추적기를 사용한 정확한 출처 정보
         source_citation = source_tracker.get_source_citation(doc)
         
-        # 디버깅용 상세 정보 (개발 중에만 사용)
-        debug_info = source_tracker.get_detailed_source_info(doc)
-        
         formatted.append(
             f'<document id="{i+1}">'
             f'<content>{content}</content>'
             f'<source_citation>{source_citation}</source_citation>'
-            f'<debug_info>파일: {debug_info["file_name"]}, 페이지: {debug_info["page_info"]}, 청크: {debug_info["chunk_index"]}</debug_info>'
             f'</document>'
         )
     return "\n\n".join(formatted)
 
+
+async def pack_context(question: str, docs: List) -> List:
+    """토큰 예산에 맞춰 답변 생성 문맥 구성 (리랭킹 점수 순, 겹침 제거, 긴 문서는 관련 구간만) - 토큰 수는 트레이스에 기록"""
+    packed, stats = await asyncio.to_thread(context_packer.pack, question, docs)
+    CONTEXT_TOKENS.observe(stats["context_tokens"])
+    trace = current_trace.get()
+    if trace is not None:
+        trace.attributes["context"] = stats
+    print(f"📦 문맥 구성: 문서 {stats['input_docs']}개 → {stats['context_docs']}개, "
+          f"{stats['context_tokens']}/{stats['budget']}토큰 (겹침 제거 {stats['trimmed']}, 중복 {stats['duplicates']}, "
+          f"구간 추출 {stats['extracted']}, 제외 {stats['dropped']})")
+    return packed
+
 def format_chat_history_for_qwen(history) -> str:
     """Qwen 32B용: 모든 메시지 + 가장 최근 AI 답변 전체를 포맷"""
     if not history:
@@ -662,27 +816,31 @@ def format_chat_history_for_qwen(history) -> str:
     return result
 
 
-def generate_answer(state):
+async def generate_answer(state):
     """개선된 답변 생성 - 정확한 출처 정보 포함"""
     try:
         generator = generate_prompt | llm_model_generate | StrOutputParser()
-        docs = state["document"]
+        # parent 모드: 검색된 child 청크를 parent 청크로 확장한 뒤 토큰 예산에 맞춰 문맥 구성 (SQLite 조회는 작업 스레드에서)
+        docs = await asyncio.to_thread(expand_parents, state["document"])
+        if docs:
+            docs = await pack_context(state["question"], docs)
         chat_history = state.get("chat_history", "")
         
-        # 문서가 있는 경우에만 답변 생성
+        # 문서가 있는 경우에만 답변 생성 (스트리밍 요청이면 토큰 단위로 전송)
         if docs:
-            # 각 문서를 출처 추적기에 등록
-            for i, doc in enumerate(docs):
-                source_tracker.register_document(f"doc_{i}", doc)
-            
-            answer = generator.invoke({
+            await emit_event("stage", stage="generate", status="start", documents=len(docs),
+                             context_tokens=sum(doc.metadata.get("packed_tokens", 0) for doc in docs))
+            generate = stream_llm if event_sink.get() is not None else invoke_llm
+            answer = await generate(generator, {
                 "document": format_docs_for_qwen(docs),
                 "question": state["question"],
                 "chat_history": format_chat_history_for_qwen(chat_history) if isinstance(chat_history, list) else chat_history
-            })
+            }, "vllm_32b")
             
-            # 답변이 비어있는 경우 fallback
-            if not answer or not answer.strip():
+            # 답변이 비어있는 경우 fallback (정상 생성된 답변만 캐시에 저장)
+            if answer and answer.strip():
+                await store_cached_answer(state["question"], answer, docs)
+            else:
                 # 정확한 출처 정보가 포함된 문서 요약 제공
                 doc_summaries = []
                 for doc in docs[:5]:  # 상위 5개 문서만 사용
@@ -714,34 +872,100 @@ def generate_answer(state):
 # LangGraph 워크플로우 생성
 workflow = StateGraph(GraphState)
 
-# 노드들 추가
-workflow.add_node("re_writer", re_writer)
-workflow.add_node("question_decomposer", question_decomposer)
-workflow.add_node("recursive_search", recursive_search)
-workflow.add_node("generate_answer", generate_answer)
+# 노드들 추가 (노드별 실행 시간 계측: rag_node_seconds)
+workflow.add_node("query_router", traced_node("query_router", route_query))
+workflow.add_node("re_writer", traced_node("re_writer", re_writer))
+workflow.add_node("answer_cache", traced_node("answer_cache", answer_cache_lookup))
+workflow.add_node("cutoff_lookup", traced_node("cutoff_lookup", cutoff_lookup))
+workflow.add_node("question_decomposer", traced_node("question_decomposer", question_decomposer))
+workflow.add_node("parallel_search", traced_node("parallel_search", parallel_search))
+workflow.add_node("direct_search", traced_node("direct_search", direct_search))
+workflow.add_node("generate_answer", traced_node("generate_answer", generate_answer))
 
 # 워크플로우 구성
-workflow.add_edge(START, "re_writer")
-workflow.add_edge("re_writer", "question_decomposer")
-workflow.add_edge("question_decomposer", "recursive_search")
+workflow.add_edge(START, "query_router")
+# fast 경로는 질문 재작성 생략
 workflow.add_conditional_edges(
-    "recursive_search",
-    check_recursion_complete,
-    {
-        "continue": "recursive_search",  # 다음 하위 질문 처리
-        "complete": "generate_answer"    # 모든 질문 처리 완료 시 답변 생성
-    }
+    "query_router",
+    lambda state: "fast" if state.get("route") == "fast" else "rewrite",
+    {"fast": "answer_cache", "rewrite": "re_writer"},
+)
+workflow.add_edge("re_writer", "answer_cache")
+# 캐시 적중 시 바로 종료, 아니면 커트라인 조회부터 진행
+workflow.add_conditional_edges(
+    "answer_cache",
+    lambda state: "hit" if state.get("cached") else "miss",
+    {"hit": END, "miss": "cutoff_lookup"},
 )
+# 커트라인 표에서 찾으면 바로 답변 생성, 아니면 경로별 검색
+# (fast: 하이브리드 검색만, standard: 원래 질문으로 멀티쿼리 검색 + 리랭킹, deep: 추가 질문 생성 후 검색)
+workflow.add_conditional_edges(
+    "cutoff_lookup",
+    lambda state: "found" if state.get("document") else state.get("route") or "deep",
+    {"found": "generate_answer", "fast": "direct_search", "standard": "parallel_search",
+     "deep": "question_decomposer"},
+)
+workflow.add_edge("question_decomposer", "parallel_search")  # 하위 질문 동시 검색
+workflow.add_edge("parallel_search", "generate_answer")      # 검색 완료 후 답변 생성
+workflow.add_edge("direct_search", "generate_answer")
 
 # 답변 생성 후 종료
 workflow.add_edge("generate_answer", END)
 
-# 워크플로우 컴파일
-flow = workflow.compile(checkpointer=MemorySaver())
+# 체크포인터 정책 (환경변수: RAG_CHECKPOINTER=none|memory|sqlite, 기본 none)
+checkpointer_manager = CheckpointerManager()
+flow = None
+
+
+async def get_flow():
+    """워크플로우 컴파일 (SQLite 체크포인터는 이벤트 루프 안에서 생성되어야 하므로 첫 요청 시 컴파일)"""
+    global flow
+    if flow is None:
+        flow = workflow.compile(checkpointer=await checkpointer_manager.get())
+    return flow
+
+
+async def warmup():
+    """백그라운드 준비 작업: 검색 인덱스 로드(웹 프로세스에서는 빌드하지 않음), 리랭커 로드, 워크플로우 컴파일"""
+    global semantic_reranker
+    started = time.perf_counter()
+    while True:
+        try:
+            print("🏗️ RAG 시스템 초기화 중...")
+            rag = await asyncio.to_thread(init_fast_rag, data_path, vector_store_name, False)
+            if context_packer.tokenizer is None:
+                # 문맥 토큰 수: CONTEXT_TOKENIZER(예: Qwen 토크나이저)가 없으면 검색용 bge-m3 토크나이저 사용
+                context_packer.tokenizer = (
+                    await asyncio.to_thread(load_tokenizer, context_packer.tokenizer_path)
+                    if context_packer.tokenizer_path else rag.tokenizer
+                )
+            if semantic_reranker is llm_reranker:
+                semantic_reranker = await asyncio.to_thread(create_reranker, llm_reranker)
+            await get_flow()
+            startup_state.update(status="ready", error=None, ready_at=datetime.now().isoformat())
+            print(f"✅ RAG 시스템 초기화 완료! ({time.perf_counter() - started:.1f}s)")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            startup_state.update(status="failed", error=str(e))
+            print(f"❌ RAG 시스템 초기화 실패, {WARMUP_RETRY_INTERVAL:.0f}초 후 재시도: {e}")
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+
+def ensure_ready():
+    """준비 완료 전 요청은 503으로 거절"""
+    if startup_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail="RAG 시스템을 준비 중입니다. 잠시 후 다시 시도해주세요.")
 
 # RAG 처리 함수
-async def process_rag_query(question: str, session_id: Optional[str] = None) -> str:
-    """RAG 시스템을 통해 질문을 처리하고 답변을 반환 - context 관리 및 fallback 로직 강화"""
+async def process_rag_query(question: str, session_id: Optional[str] = None, on_queue=None, on_event=None) -> str:
+    """RAG 시스템을 통해 질문을 처리하고 답변을 반환 - context 관리 및 fallback 로직 강화
+
+    on_queue: 동시 처리 용량 초과로 대기할 때 대기 순번(1부터)을 받는 콜백
+    on_event: 단계 진행(stage)/답변 토큰(token) 이벤트 dict를 받는 비동기 콜백 (스트리밍 응답용)
+    """
+    sink_token = event_sink.set({"send": on_event, "started": time.perf_counter()}) if on_event is not None else None
     try:
         print(f"🔍 RAG 처리 시작: {question}")
         
@@ -767,7 +991,7 @@ async def process_rag_query(question: str, session_id: Optional[str] = None) ->
         # LLM 호출 제한 적용
         config = RunnableConfig(
             recursion_limit=20, 
-            configurable={"thread_id": random_uuid()},
+            configurable={"thread_id": checkpointer_manager.thread_id(session_id)},
             timeout=120,  # 2분 타임아웃
             max_retries=3  # 최대 3회 재시도
         )
@@ -776,14 +1000,24 @@ async def process_rag_query(question: str, session_id: Optional[str] = None) ->
             "question": question,
             "chat_history": chat_history_str,
             "sub_questions": [],
-            "current_question_index": 0,
             "document": [],  # 매번 새로운 질문마다 document 초기화
-            "generation": ""
+            "generation": "",
+            "cached": False,
+            "route": ""
         }
         
         print(f"⚙️ 입력 데이터 준비 완료")
-        print(f"🚀 워크플로우 실행 시작...")
-        result = flow.invoke(inputs, config)
+        def report_queue(position: int):
+            print(f"⏳ 처리 용량 초과, 대기 순번: {position}")
+            if on_queue is not None:
+                return on_queue(position)
+
+        wait_start = time.perf_counter()
+        async with request_limiter.slot(on_queue=report_queue):
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+            print(f"🚀 워크플로우 실행 시작...")
+            compiled_flow = await get_flow()
+            result = await compiled_flow.ainvoke(inputs, config)
         print(f"✅ 워크플로우 실행 완료")
         print(f"📊 결과: {list(result.keys())}")
         
@@ -802,9 +1036,13 @@ async def process_rag_query(question: str, session_id: Optional[str] = None) ->
                 
     except Exception as e:
         print(f"💥 RAG 처리 오류: {e}")
+        mark_trace_error(str(e))
         import traceback
         traceback.print_exc()
         return f"죄송합니다. 처리 중 오류가 발생했습니다: {str(e)}"
+    finally:
+        if sink_token is not None:
+            event_sink.reset(sink_token)
 
 class ChatManager:
     def __init__(self):
@@ -897,13 +1135,55 @@ async def delete_session(session_id: str):
     del sessions[session_id]
     if session_id in lc_memories:
         del lc_memories[session_id]
+    await checkpointer_manager.delete_thread(session_id)
     
     return {"message": "Session deleted successfully"}
 
+@app.get("/healthz")
+async def healthz():
+    """프로세스 생존 확인 (준비 여부와 무관하게 즉시 응답)"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """요청 처리 준비 여부 - 인덱스 로드/워크플로우 컴파일 완료 전에는 503"""
+    return JSONResponse(status_code=200 if startup_state["status"] == "ready" else 503, content=startup_state)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 형식 지연 시간/토큰 지표 (노드, LLM 호출, 검색, 리랭킹, 요청 전체)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{request_id}")
+async def get_trace(request_id: str):
+    """요청별 구간 트레이스 (최근 RAG_TRACE_HISTORY개 보관)"""
+    trace = trace_store.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.get("/stats")
+async def get_stats():
+    """요청 대기열, 백엔드별 동시성, 체크포인터 메모리, 검색 캐시 현황"""
+    return {
+        "limiters": {
+            "request": request_limiter.stats(),
+            **{name: limiter.stats() for name, limiter in backend_limiters.items()},
+        },
+        "checkpointer": await checkpointer_manager.stats(),
+        "search_cache": get_search_stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
 @app.post("/chat/{session_id}")
 async def chat(session_id: str, message: dict):
+    return await handle_chat_message(session_id, message)
+
+async def handle_chat_message(session_id: str, message: dict, on_queue=None, on_event=None):
+    """채팅 메시지 처리 (HTTP/WebSocket/SSE 공용)"""
     if session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
+    ensure_ready()
     
     user_message = message.get("message", "")
     if not user_message.strip():
@@ -921,13 +1201,16 @@ async def chat(session_id: str, message: dict):
         lc_memories[session_id] = ConversationBufferWindowMemory(k=2, return_messages=True)
     lc_memories[session_id].chat_memory.add_user_message(user_message)
     
+    request_id = str(uuid.uuid4())
     try:
-        response_text = await process_rag_query(user_message, session_id)
+        async with trace_request(request_id, session_id=session_id, question=user_message):
+            response_text = await process_rag_query(user_message, session_id, on_queue=on_queue, on_event=on_event)
         # LangChain 메모리에 AI 답변 추가
         lc_memories[session_id].chat_memory.add_ai_message(response_text)
         return {
             "response": response_text,
             "question": user_message,
+            "request_id": request_id,
             "session_id": session_id,
             "timestamp": datetime.now().isoformat()
         }
@@ -942,6 +1225,39 @@ async def chat(session_id: str, message: dict):
             "timestamp": datetime.now().isoformat()
         }
 
+@app.post("/chat/{session_id}/stream")
+async def chat_stream(session_id: str, message: dict):
+    """SSE(text/event-stream) 채팅: queue/stage/token 이벤트 후 전체 답변(bot_response) 전송"""
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    ensure_ready()
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        try:
+            response = await handle_chat_message(
+                session_id, message,
+                on_queue=lambda position: events.put_nowait({"type": "queue", "position": position}),
+                on_event=events.put,
+            )
+            await events.put({"type": "bot_response", "message": response.get("response", ""),
+                              "request_id": response.get("request_id"), "timestamp": response.get("timestamp")})
+        finally:
+            await events.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while (event := await events.get()) is not None:
+                event["session_id"] = session_id
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            if not task.done():
+                task.cancel()  # 클라이언트 연결 종료 시 처리 중단
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await chat_manager.connect(websocket, session_id)
@@ -949,12 +1265,30 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
-            
-            response = await chat(session_id, message)
+
+            async def send_queue_position(position: int):
+                await chat_manager.send_message(json.dumps({
+                    "type": "queue",
+                    "position": position,
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat()
+                }), session_id)
+
+            async def send_event(event: dict):
+                event["session_id"] = session_id
+                await chat_manager.send_message(json.dumps(event, ensure_ascii=False), session_id)
+
+            try:
+                response = await handle_chat_message(
+                    session_id, message, on_queue=send_queue_position, on_event=send_event
+                )
+            except HTTPException as e:
+                response = {"response": e.detail, "timestamp": datetime.now().isoformat()}
             
             websocket_response = {
                 "type": "bot_response",
                 "message": response.get("response", ""),
+                "request_id": response.get("request_id"),
                 "session_id": session_id,
                 "timestamp": response.get("timestamp")
             }
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 전체 파이프라인 오프라인 벤치마크
+===============================================
+스텁 vLLM(OpenAI 호환)/Ollama 서버를 띄우고, data/ PDF로 만든 실제 SimpleRAGWithPages 인덱스
+(스텁 임베딩 사용)에 대해 process_rag_query(handle_chat_message 경유) 또는 /chat/{session_id}를
+동시 세션 N개로 호출합니다.
+
+측정 항목: 지연 시간 p50/p95/p99, 처리량(질문/초), 질문당 LLM 호출 수(종류별), 최대 RSS, 답변 생성 문맥 토큰 수,
+질의 경로(fast/standard/deep/cutoff)별 지연 시간
+--baseline으로 저장된 결과와 비교해 허용 범위를 넘는 악화를 표시합니다.
+--router-mode를 여러 번 지정하면(예: off, auto) 라우터 분류(auto 기준)별로 지연 시간 단축을 비교합니다.
+
+실행 방법:
+- python benchmark_e2e.py --data ../data --concurrency 1 --concurrency 4 --output e2e.json
+- 기준선 저장: python benchmark_e2e.py --save-baseline e2e_baseline.json
+- 기준선 비교: python benchmark_e2e.py --baseline e2e_baseline.json --fail-on-regression
+- HTTP 경로 측정: python benchmark_e2e.py --mode http
+- 라우터 효과: python benchmark_e2e.py --router-mode off --router-mode auto
+※ 토크나이저(bge-m3)는 로컬 HF 캐시 또는 TOKENIZER_PATH가 필요합니다.
+※ 같은 질문을 반복하면 검색 결과 캐시가 적중하므로 --repeat 2 이상은 캐시 포함 수치입니다.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmark_stubs import start_stub_backends
+
+DEFAULT_QUESTIONS = [
+    "카투사 지원자격",
+    "운전병 지원자격",
+    "어학병 지원 자격",
+    "전차 운전병 자격요건",
+    "기술행정병 1차 합격 커트라인",
+    "공군 모집 일정",
+    "연고지복무병 지원 조건",
+    "직계가족복무부대병 지원 방법",
+    "동반입대병 신청 절차",
+    "병역이행 안내서 입영 연기",
+]
+
+# 기준선 비교 대상 (지표, 클수록 좋은지)
+COMPARED_METRICS = [
+    ("latency_p50", False),
+    ("latency_p95", False),
+    ("latency_p99", False),
+    ("throughput_qps", True),
+    ("llm_calls_per_question", False),
+]
+
+
+def peak_rss_mb() -> float:
+    """프로세스 최대 RSS (Linux ru_maxrss는 KB 단위)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_level(app_module, stats, questions: List[str], concurrency: int, mode: str) -> Dict:
+    """동시 세션 concurrency개가 질문 대기열을 나눠 처리"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for question in questions:
+        queue.put_nowait(question)
+    latencies: List[float] = []
+    records: List[Dict] = []  # 질문별 (질문, 지연 시간, 실제 경로)
+    errors = 0
+    before = stats.snapshot()
+
+    async def session_worker(client=None):
+        nonlocal errors
+        if client is not None:
+            session_id = (await client.post("/create-session")).json()["session_id"]
+        else:
+            session_id = (await app_module.create_session())["session_id"]
+        while not queue.empty():
+            question = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                if client is not None:
+                    response = await client.post(f"/chat/{session_id}", json={"message": question}, timeout=600)
+                    response.raise_for_status()
+                    result = response.json()
+                else:
+                    result = await app_module.handle_chat_message(session_id, {"message": question})
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ 요청 실패 ({question}): {e}")
+                continue
+            latency = time.perf_counter() - start
+            latencies.append(latency)
+            trace = app_module.trace_store.get(result.get("request_id") or "") or {}
+            records.append({"question": question, "latency": latency, "route": trace.get("route"),
+                            "context_tokens": (trace.get("context") or {}).get("context_tokens")})
+
+    start = time.perf_counter()
+    if mode == "http":
+        import httpx
+
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await asyncio.gather(*(session_worker(client) for _ in range(concurrency)))
+    else:
+        await asyncio.gather(*(session_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    after = stats.snapshot()
+    calls = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+    answered = max(len(latencies), 1)
+    context_tokens = [record["context_tokens"] for record in records if record["context_tokens"] is not None]
+    return {
+        "concurrency": concurrency,
+        "questions": len(questions),
+        "errors": errors,
+        "latency_p50": float(np.percentile(latencies, 50)) if latencies else None,
+        "latency_p95": float(np.percentile(latencies, 95)) if latencies else None,
+        "latency_p99": float(np.percentile(latencies, 99)) if latencies else None,
+        "throughput_qps": len(latencies) / elapsed if elapsed else 0.0,
+        "llm_calls_per_question": calls.get("llm_calls", 0) / answered,
+        "llm_calls_by_kind": {
+            kind: calls[kind] / answered
+            for kind in ("rewrite", "decompose", "multi_query", "rerank", "generate", "other") if calls.get(kind)
+        },
+        "embed_calls_per_question": calls.get("embed_calls", 0) / answered,
+        "peak_rss_mb": peak_rss_mb(),
+        "context_tokens_mean": float(np.mean(context_tokens)) if context_tokens else None,
+        "by_route": summarize_by(records, "route"),
+        "records": records,
+    }
+
+
+def summarize_by(records: List[Dict], key: str) -> Dict:
+    """records를 key 값별로 묶은 지연 시간 p50/p95"""
+    groups: Dict[str, List[float]] = {}
+    for record in records:
+        groups.setdefault(record.get(key) or "unknown", []).append(record["latency"])
+    return {
+        name: {"count": len(values), "latency_p50": float(np.percentile(values, 50)),
+               "latency_p95": float(np.percentile(values, 95))}
+        for name, values in sorted(groups.items())
+    }
+
+
+def compare_router_modes(runs: Dict[str, List[Dict]], classify) -> Dict:
+    """라우터 모드별 결과를 auto 라우터 분류(대화 기록 없음 기준) 단위로 비교"""
+    comparison = {}
+    print("\n🧭 라우터 분류별 지연 시간 (p50, 초)")
+    modes = list(runs)
+    for concurrency in sorted({level["concurrency"] for levels in runs.values() for level in levels}):
+        for mode in modes:
+            for level in runs[mode]:
+                if level["concurrency"] != concurrency:
+                    continue
+                records = [{**record, "class": classify(record["question"])} for record in level["records"]]
+                comparison.setdefault(concurrency, {})[mode] = summarize_by(records, "class")
+        classes = sorted({name for by_mode in comparison[concurrency].values() for name in by_mode})
+        for name in classes:
+            values = {mode: comparison[concurrency].get(mode, {}).get(name, {}).get("latency_p50") for mode in modes}
+            line = " | ".join(f"{mode} {value:.3f}" if value is not None else f"{mode} -" for mode, value in values.items())
+            first, last = values[modes[0]], values[modes[-1]]
+            gain = f" ({(last - first) / first:+.1%})" if first and last is not None else ""
+            print(f"  c={concurrency:<3} {name:<9} {line}{gain}")
+    return comparison
+
+
+def compare_with_baseline(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """동시성 단계별로 기준선 대비 tolerance(비율) 넘게 나빠진 지표 목록"""
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    print("\n📏 기준선 비교")
+    for level in result["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for key, higher_is_better in COMPARED_METRICS:
+            current, previous = level.get(key), base.get(key)
+            if current is None or not previous:
+                continue
+            change = (current - previous) / previous
+            worse = -change if higher_is_better else change
+            flag = "❌" if worse > tolerance else "  "
+            print(f"  {flag} c={level['concurrency']:<3} {key:<24} {previous:10.3f} → {current:10.3f} ({change:+.1%})")
+            if worse > tolerance:
+                regressions.append(f"c={level['concurrency']} {key} {change:+.1%}")
+    return regressions
+
+
+def main():
+    """전체 파이프라인 벤치마크 메인 함수"""
+    parser = argparse.ArgumentParser(description="스텁 vLLM/Ollama 백엔드로 전체 RAG 파이프라인 지연 시간/처리량 측정")
+    parser.add_argument("--data", default=str(Path(__file__).resolve().parent.parent / "data"), help="PDF 폴더")
+    parser.add_argument("--store-path", default="/tmp/rag_benchmark_store", help="스텁 임베딩 벡터스토어 경로")
+    parser.add_argument("--questions", help="한 줄에 질문 하나씩 적힌 파일 (기본: 내장 질문 목록)")
+    parser.add_argument("--repeat", type=int, default=1, help="질문 목록 반복 횟수")
+    parser.add_argument("--concurrency", type=int, action="append", help="동시 세션 수 (여러 번 지정 가능, 기본 1, 4)")
+    parser.add_argument("--mode", choices=["direct", "http"], default="direct",
+                        help="direct: handle_chat_message 직접 호출, http: /chat/{session_id} (ASGI)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="LLM 호출당 지연(초)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="생성 토큰당 지연(초)")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="임베딩 요청당 지연(초)")
+    parser.add_argument("--embed-dim", type=int, default=1024)
+    parser.add_argument("--router-mode", action="append",
+                        help="질의 라우터 모드 (auto | off | fast | standard | deep, 여러 번 지정하면 분류별 비교)")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    parser.add_argument("--save-baseline", help="결과를 기준선 파일로 저장")
+    parser.add_argument("--baseline", help="비교할 기준선 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="허용 악화 비율 (기본 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="악화 시 종료 코드 1")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    questions = questions * max(1, args.repeat)
+
+    llm_server, ollama_server, stats = start_stub_backends(
+        args.llm_latency, args.token_latency, args.embed_latency, args.embed_dim
+    )
+    # app/simple_rag_with_pages가 읽는 백엔드 주소를 스텁으로 교체한 뒤 import
+    os.environ["VLLM_URL"] = f"{llm_server.url}/v1"
+    os.environ["VLLM_32B_URL"] = f"{llm_server.url}/v1"
+    os.environ["OLLAMA_URL"] = ollama_server.url
+    os.environ.setdefault("RERANKER_BACKEND", "llm")
+    import simple_rag_with_pages
+    import app as app_module
+
+    print("=" * 50)
+    print(f"🏁 전체 파이프라인 벤치마크: 질문 {len(questions)}개, 모드 {args.mode}")
+    print(f"   스텁 LLM {llm_server.url} (지연 {args.llm_latency}s + 토큰당 {args.token_latency}s)")
+    print(f"   스텁 임베딩 {ollama_server.url} (지연 {args.embed_latency}s, 차원 {args.embed_dim})")
+    print("=" * 50)
+
+    rag_system = simple_rag_with_pages.SimpleRAGWithPages(data_path=args.data, store_path=args.store_path)
+    build_start = time.perf_counter()
+    rag_system.create_vectorstore("vector_store")
+    build_time = time.perf_counter() - build_start
+    simple_rag_with_pages.rag_instance = rag_system
+    app_module.data_path = args.data
+
+    router_modes = args.router_mode or [app_module.query_router.mode]
+
+    async def run_all() -> Dict[str, List[Dict]]:
+        # 준비 실패 시 warmup은 재시도를 반복하므로 시간 제한
+        await asyncio.wait_for(app_module.warmup(), timeout=300)
+        runs = {}
+        for router_mode in router_modes:
+            app_module.query_router.mode = router_mode
+            # 모드 간 비교가 검색/답변 캐시에 영향받지 않도록 초기화
+            rag_system.result_cache.clear()
+            rag_system.query_embedding_cache.clear()
+            if app_module.answer_cache.enabled:
+                app_module.answer_cache.store.purge("")
+            print(f"\n🧭 라우터 모드: {router_mode}")
+            levels = []
+            for concurrency in args.concurrency or [1, 4]:
+                level = await run_level(app_module, stats, questions, concurrency, args.mode)
+                level["router_mode"] = router_mode
+                levels.append(level)
+                print(
+                    f"  동시 {concurrency:<3} | p50 {level['latency_p50'] or 0:.3f}s p95 {level['latency_p95'] or 0:.3f}s "
+                    f"p99 {level['latency_p99'] or 0:.3f}s | {level['throughput_qps']:.2f} q/s | "
+                    f"LLM {level['llm_calls_per_question']:.1f}회/질문 | 문맥 {level['context_tokens_mean'] or 0:.0f}토큰 | "
+                    f"RSS {level['peak_rss_mb']:.0f}MB | 오류 {level['errors']}"
+                )
+                print("        경로별 p50: " + ", ".join(
+                    f"{route} {summary['latency_p50']:.3f}s×{summary['count']}"
+                    for route, summary in level["by_route"].items()
+                ))
+            runs[router_mode] = levels
+        return runs
+
+    result = {
+        "mode": args.mode,
+        "questions": len(questions),
+        "llm_latency": args.llm_latency,
+        "token_latency": args.token_latency,
+        "embed_latency": args.embed_latency,
+        "vectorstore_build_s": build_time,
+    }
+    runs = asyncio.run(run_all())
+    # 기준선 비교는 마지막 라우터 모드 결과 사용
+    result["levels"] = runs[router_modes[-1]]
+    result["router_modes"] = runs
+    if len(runs) > 1:
+        from query_router import QueryRouter
+
+        auto_router = QueryRouter("auto")
+        result["router_comparison"] = compare_router_modes(runs, lambda q: auto_router.classify(q)[0])
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {os.path.abspath(path)}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ 기준선 대비 악화 {len(regressions)}건: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n✅ 기준선 대비 악화 없음")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - FAISS 인덱스 유형 벤치마크 스크립트
+===============================================
+현재 벡터스토어의 청크 벡터(임베딩 캐시 사용)로 여러 index spec을 만들어
+Flat(정확 검색) 대비 recall@k, 질의 지연 시간, 인덱스 메모리, 빌드 시간을 비교합니다.
+
+실행 방법:
+- rag-chat 컨테이너에서 실행: python benchmark_index.py
+- 비교할 인덱스 지정: python benchmark_index.py --spec HNSW32 --spec "IVF64,PQ32" --spec SQ8
+- 검색 파라미터: python benchmark_index.py --nprobe 8 --ef-search 128 --output index_result.json
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from simple_rag_with_pages import SimpleRAGWithPages
+from vector_index import build_faiss_index, apply_search_params, index_memory_bytes
+
+DEFAULT_SPECS = ["HNSW32", "IVF64,Flat", "IVF64,PQ32", "IVF64,SQ8", "SQ8"]
+
+DEFAULT_QUESTIONS = [
+    "카투사 지원자격",
+    "운전병 지원자격",
+    "어학병 지원 자격",
+    "전차 운전병 자격요건",
+    "기술행정병 1차 합격 커트라인",
+    "공군 모집 일정",
+    "연고지복무병 지원 조건",
+    "직계가족복무부대병 지원 방법",
+    "동반입대병 신청 절차",
+    "병역이행 안내서 입영 연기",
+]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """질의별 (근사 상위 k ∩ 정확 상위 k) / k 평균"""
+    hits = [len(set(f[:k]) & set(t[:k]) - {-1}) / k for f, t in zip(found, truth)]
+    return float(np.mean(hits))
+
+
+def measure(spec: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray,
+            k: int, nprobe: int, ef_search: int, repeat: int) -> Dict:
+    start = time.perf_counter()
+    index = build_faiss_index(spec, vectors)
+    train_time = time.perf_counter() - start
+    index.add(vectors)
+    build_time = time.perf_counter() - start
+    apply_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+    # 서비스와 같은 단일 질의 검색 지연 시간
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            t = time.perf_counter()
+            index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - t)
+    _, found = index.search(queries, k)
+    return {
+        "spec": spec,
+        f"recall@{k}": recall_at_k(found, truth, k),
+        "latency_ms_mean": float(np.mean(latencies) * 1000),
+        "latency_ms_p95": float(np.percentile(latencies, 95) * 1000),
+        "memory_mb": index_memory_bytes(index) / 1e6,
+        "train_s": train_time,
+        "build_s": build_time,
+    }
+
+
+def main():
+    """인덱스 벤치마크 메인 함수"""
+    parser = argparse.ArgumentParser(description="FAISS 인덱스 유형별 recall/지연 시간/메모리 비교")
+    parser.add_argument("--spec", action="append", help="비교할 index_factory 문자열 (여러 번 지정 가능)")
+    parser.add_argument("--store-path", default="/app/shared_data")
+    parser.add_argument("--store-name", default="vector_store")
+    parser.add_argument("--questions", help="한 줄에 질문 하나씩 적힌 파일 (기본: 내장 질문 목록)")
+    parser.add_argument("--sample-queries", type=int, default=200, help="질의로 추가 사용할 청크 벡터 수")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3, help="지연 시간 측정 반복 횟수")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    print("=" * 50)
+    print("🏁 FAISS 인덱스 벤치마크 시작")
+    print("=" * 50)
+    rag_system = SimpleRAGWithPages(store_path=args.store_path)
+    if not rag_system.load_retriever(args.store_name):
+        print("❌ 벡터스토어를 먼저 생성하세요: python make_vector_store.py")
+        return
+
+    # 청크 벡터는 임베딩 캐시에서, 질의는 질문 임베딩 + 무작위 청크 벡터
+    texts = [doc.page_content for doc in rag_system.vectorstore.docstore._dict.values()]
+    vectors = np.array(rag_system.embedding.embed_documents(texts), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    sampled = vectors[rng.choice(len(vectors), min(args.sample_queries, len(vectors)), replace=False)]
+    queries = np.vstack([np.array(rag_system.embed_queries(questions), dtype=np.float32), sampled])
+    print(f"📦 청크 {len(vectors)}개 (차원 {vectors.shape[1]}), 질의 {len(queries)}개, k={args.k}")
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+
+    rows: List[Dict] = []
+    for spec in ["Flat"] + [spec for spec in (args.spec or DEFAULT_SPECS) if spec != "Flat"]:
+        try:
+            row = measure(spec, vectors, queries, truth, args.k, args.nprobe, args.ef_search, args.repeat)
+        except Exception as e:
+            print(f"⚠️ {spec}: {e}")
+            continue
+        rows.append(row)
+        print(
+            f"  {spec:<14} | recall@{args.k} {row[f'recall@{args.k}']:.3f} | "
+            f"평균 {row['latency_ms_mean']:.3f}ms p95 {row['latency_ms_p95']:.3f}ms | "
+            f"{row['memory_mb']:.1f}MB | 빌드 {row['build_s']:.2f}s"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "chunks": len(vectors), "queries": len(queries), "k": args.k,
+                "nprobe": args.nprobe, "ef_search": args.ef_search, "rows": rows,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
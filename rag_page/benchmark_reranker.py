@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 리랭커 벤치마크 스크립트
+===============================================
+같은 검색 후보에 대해 LLM 리랭커와 크로스인코더 리랭커의
+지연 시간과 순위 일치도(Spearman, 상위 k 겹침, 8점 이상 선택 일치)를 비교합니다.
+
+실행 방법:
+- rag-chat 컨테이너에서 실행: python benchmark_reranker.py
+- 질문 파일 지정: python benchmark_reranker.py --questions questions.txt --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app import afast_search, llm_reranker, data_path, vector_store_name
+from simple_rag_with_pages import init_fast_rag
+from reranker import CrossEncoderReranker
+
+DEFAULT_QUESTIONS = [
+    "카투사 지원자격",
+    "운전병 지원자격",
+    "어학병 지원 자격",
+    "전차 운전병 자격요건",
+    "기술행정병 1차 합격 커트라인",
+    "공군 모집 일정",
+    "연고지복무병 지원 조건",
+    "직계가족복무부대병 지원 방법",
+    "동반입대병 신청 절차",
+    "병역이행 안내서 입영 연기",
+]
+
+
+def rank_array(values: List[float]) -> np.ndarray:
+    """동점은 평균 순위를 부여한 순위 배열"""
+    values = np.asarray(values, dtype=float)
+    order = values.argsort()
+    ranks = np.empty(len(values), dtype=float)
+    ranks[order] = np.arange(len(values), dtype=float)
+    for value in np.unique(values):
+        mask = values == value
+        ranks[mask] = ranks[mask].mean()
+    return ranks
+
+
+def spearman(a: List[float], b: List[float]) -> float:
+    """두 점수 목록의 Spearman 순위 상관계수"""
+    if len(a) < 2:
+        return float("nan")
+    ra, rb = rank_array(a), rank_array(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def top_k_overlap(a: List[float], b: List[float], k: int) -> float:
+    """두 리랭커 상위 k 문서 집합의 겹침 비율"""
+    k = min(k, len(a))
+    if k == 0:
+        return float("nan")
+    top_a = set(np.argsort(a)[::-1][:k])
+    top_b = set(np.argsort(b)[::-1][:k])
+    return len(top_a & top_b) / k
+
+
+async def timed_scores(reranker, question: str, documents: List) -> Dict:
+    start = time.perf_counter()
+    scored = await reranker.score(question, documents)
+    elapsed = time.perf_counter() - start
+    score_map = {id(doc): score for doc, score in scored}
+    return {
+        "latency": elapsed,
+        "scores": [float(score_map.get(id(doc), 0)) for doc in documents],
+    }
+
+
+async def run_benchmark(questions: List[str], candidates: int, top_k: int, threshold: float) -> Dict:
+    # 조기 종료 없이 전체 후보를 평가해야 순위 비교가 가능
+    llm_reranker.early_stop_count = 0
+    # 서버 시작 시(lifespan)와 같이 저장된 벡터스토어 로드
+    await asyncio.to_thread(init_fast_rag, data_path, vector_store_name, False)
+    cross_encoder = CrossEncoderReranker()
+    print(f"🔄 크로스인코더 로드 완료: {cross_encoder.model_name}")
+
+    rows = []
+    for question in questions:
+        documents = await afast_search(question, k=candidates)
+        if not documents:
+            print(f"⚠️ 검색 결과 없음: {question}")
+            continue
+        llm_result = await timed_scores(llm_reranker, question, documents)
+        ce_result = await timed_scores(cross_encoder, question, documents)
+        llm_selected = {i for i, s in enumerate(llm_result["scores"]) if s >= threshold}
+        ce_selected = {i for i, s in enumerate(ce_result["scores"]) if s >= threshold}
+        union = llm_selected | ce_selected
+        row = {
+            "question": question,
+            "candidates": len(documents),
+            "llm_latency": llm_result["latency"],
+            "cross_encoder_latency": ce_result["latency"],
+            "spearman": spearman(llm_result["scores"], ce_result["scores"]),
+            f"top{top_k}_overlap": top_k_overlap(llm_result["scores"], ce_result["scores"], top_k),
+            "selection_jaccard": len(llm_selected & ce_selected) / len(union) if union else 1.0,
+        }
+        rows.append(row)
+        print(
+            f"  {question[:20]:<20} | 후보 {row['candidates']:>2} | "
+            f"LLM {row['llm_latency']:6.2f}s | CE {row['cross_encoder_latency']:6.2f}s | "
+            f"spearman {row['spearman']:.2f} | top{top_k} {row[f'top{top_k}_overlap']:.2f}"
+        )
+
+    def mean(key):
+        values = [row[key] for row in rows if not np.isnan(row[key])]
+        return float(np.mean(values)) if values else float("nan")
+
+    summary = {
+        "questions": len(rows),
+        "llm_latency_mean": mean("llm_latency"),
+        "cross_encoder_latency_mean": mean("cross_encoder_latency"),
+        "spearman_mean": mean("spearman"),
+        f"top{top_k}_overlap_mean": mean(f"top{top_k}_overlap"),
+        "selection_jaccard_mean": mean("selection_jaccard"),
+    }
+    return {"summary": summary, "rows": rows}
+
+
+def main():
+    """리랭커 벤치마크 메인 함수"""
+    parser = argparse.ArgumentParser(description="LLM 리랭커 vs 크로스인코더 리랭커 비교")
+    parser.add_argument("--questions", help="한 줄에 질문 하나씩 적힌 파일 (기본: 내장 질문 목록)")
+    parser.add_argument("--candidates", type=int, default=15, help="질문당 리랭킹 후보 수")
+    parser.add_argument("--top-k", type=int, default=5, help="상위 k 겹침 계산 기준")
+    parser.add_argument("--threshold", type=float, default=8, help="선택 기준 점수")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    print("=" * 50)
+    print(f"🏁 리랭커 벤치마크 시작: 질문 {len(questions)}개")
+    print("=" * 50)
+    result = asyncio.run(run_benchmark(questions, args.candidates, args.top_k, args.threshold))
+
+    print("\n📊 요약")
+    for key, value in result["summary"].items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 벤치마크용 스텁 백엔드
+===============================================
+GPU 없이 전체 파이프라인을 측정하기 위한 로컬 HTTP 서버 (표준 라이브러리만 사용)
+1. OpenAI 호환 서버 (/v1/chat/completions, 스트리밍 포함) - vLLM 8B/32B 대체
+   - 프롬프트 종류(재작성/추가 질문/멀티쿼리/리랭킹/답변)를 구분해 결정적인 출력 반환
+2. Ollama 호환 서버 (/api/embed) - 텍스트 해시로 만든 결정적 단위 벡터 반환
+3. 호출 지연 시간 설정 및 종류별 호출 횟수 집계
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def classify_prompt(messages: List[Dict]) -> str:
+    """app.py 프롬프트 템플릿 기준으로 호출 종류 판별"""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    human = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if human.startswith("chat history:\n"):
+        return "rewrite"
+    if "\n\n 문서: \n" in human:
+        return "generate"
+    if human.startswith("문서: "):
+        return "rerank"
+    if "여러 쿼리" in system:
+        return "multi_query"
+    if "추가 질문" in system:
+        return "decompose"
+    return "other"
+
+
+def _question_of(human: str) -> str:
+    return human.rsplit("질문:", 1)[-1].strip()
+
+
+def stub_completion(kind: str, messages: List[Dict]) -> str:
+    """호출 종류별 결정적 출력"""
+    human = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if kind == "rewrite":
+        # 현재 질문을 그대로 사용 (이미 명확한 질문)
+        return _question_of(human)
+    if kind == "decompose":
+        question = _question_of(human)
+        return json.dumps([question, f"{question} 자격"], ensure_ascii=False)
+    if kind == "multi_query":
+        question = _question_of(human)
+        return json.dumps([question, f"{question} 안내"], ensure_ascii=False)
+    if kind == "rerank":
+        document, _, question = human.partition("\n\n질문:")
+        words = [w for w in question.split() if len(w) >= 2]
+        hits = sum(w in document for w in words)
+        return "9" if words and hits * 2 >= len(words) else "3"
+    if kind == "generate":
+        document = human.split("\n\n 문서: \n", 1)[-1]
+        sources = re.findall(r"<source_citation>(.*?)</source_citation>", document)
+        contents = re.findall(r"<content>(.*?)</content>", document, flags=re.S)
+        summary = " ".join((contents[0] if contents else "").split()[:40])
+        return f"{summary}\n{sources[0] if sources else ''}".strip()
+    return "확인"
+
+
+def stub_embedding(text: str, dim: int) -> List[float]:
+    """텍스트 해시를 시드로 한 결정적 단위 벡터"""
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubStats:
+    """종류별 호출 횟수 (스레드 안전)"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, amount: int = 1):
+        with self._lock:
+            self._counts[key] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "RagBenchStub/1.0"
+
+    def log_message(self, format, *args):
+        pass  # 요청 로그 생략
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: Dict, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class OpenAIStubHandler(_StubHandler):
+    """OpenAI 호환 chat.completions (vLLM 대체)"""
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        request = self._read_json()
+        messages = request.get("messages", [])
+        kind = classify_prompt(messages)
+        self.server.stats.add(kind)
+        self.server.stats.add("llm_calls")
+        text = stub_completion(kind, messages)
+        tokens = re.findall(r"\S+\s*", text) or [text]
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        model = request.get("model", "stub")
+        created = int(time.time())
+        time.sleep(self.server.latency)
+
+        if not request.get("stream"):
+            time.sleep(self.server.token_latency * len(tokens))
+            self._send_json({
+                "id": f"chatcmpl-{created}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, **extra) -> bytes:
+            payload = {"id": f"chatcmpl-{created}", "object": "chat.completion.chunk", "created": created,
+                       "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        for token in tokens:
+            time.sleep(self.server.token_latency)
+            self._send_chunk(event([{"index": 0, "delta": {"content": token}, "finish_reason": None}]))
+        self._send_chunk(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_chunk(event([], usage=usage))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+class OllamaStubHandler(_StubHandler):
+    """Ollama 호환 /api/embed (bge-m3 대체)"""
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/api/embed":
+            self._send_json({"error": "not found"}, 404)
+            return
+        request = self._read_json()
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        self.server.stats.add("embed_calls")
+        self.server.stats.add("embed_texts", len(texts))
+        time.sleep(self.server.latency)
+        self._send_json({
+            "model": request.get("model", "stub"),
+            "embeddings": [stub_embedding(text, self.server.dim) for text in texts],
+        })
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, stats: StubStats, latency: float = 0.0, token_latency: float = 0.0,
+                 dim: int = 1024, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), handler)
+        self.stats = stats
+        self.latency = latency
+        self.token_latency = token_latency
+        self.dim = dim
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def start_stub_backends(llm_latency: float = 0.0, token_latency: float = 0.0, embed_latency: float = 0.0,
+                        embed_dim: int = 1024) -> Tuple[StubServer, StubServer, StubStats]:
+    """OpenAI/Ollama 스텁 서버를 임의 포트로 시작 → (LLM 서버, 임베딩 서버, 공용 호출 통계)"""
+    stats = StubStats()
+    llm = StubServer(OpenAIStubHandler, stats, latency=llm_latency, token_latency=token_latency).start()
+    ollama = StubServer(OllamaStubHandler, stats, latency=embed_latency, dim=embed_dim).start()
+    return llm, ollama, stats
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - LangGraph 체크포인터 정책 모듈
+=================================
+핵심 기능:
+1. none: 체크포인트 저장 없음 (일회성 실행, 기본값)
+2. memory: 스레드 수(LRU)와 TTL, 스레드별 체크포인트 수로 크기가 제한된 메모리 체크포인터
+3. sqlite: 실제 session_id에 묶인 로컬 SQLite 체크포인터
+4. 체크포인터 메모리/저장소 통계
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class BoundedMemorySaver(MemorySaver):
+    """스레드 수(LRU)와 마지막 접근 후 TTL, 스레드별 최근 체크포인트 수로 크기가 제한된 MemorySaver"""
+
+    def __init__(self, max_threads: int = 256, ttl_seconds: float = 3600, max_checkpoints: int = 4):
+        super().__init__()
+        self.max_threads = max(1, int(max_threads))
+        self.ttl_seconds = ttl_seconds
+        # 같은 세션(스레드)에 요청마다 체크포인트가 쌓이므로 최근 max_checkpoints개만 유지
+        self.max_checkpoints = max(1, int(max_checkpoints))
+        self._last_access = OrderedDict()  # thread_id -> 마지막 저장 시각
+        self.evicted = 0
+        self.pruned = 0
+        # 체크포인트 정리는 MemorySaver 내부 구조(storage/writes/blob)에 의존 (requirements.txt의 langgraph-checkpoint 버전 고정)
+        # 구조가 달라 정리에 실패하면 정리를 끄고 스레드 수/TTL 제한(delete_thread)만 사용
+        self.prune_enabled = True
+
+    def _touch(self, thread_id: str):
+        """스레드 접근 기록 후 만료/초과 스레드 정리"""
+        now = time.monotonic()
+        self._last_access[thread_id] = now
+        self._last_access.move_to_end(thread_id)
+        while self._last_access:
+            oldest_id, last_access = next(iter(self._last_access.items()))
+            expired = self.ttl_seconds and now - last_access > self.ttl_seconds
+            if oldest_id == thread_id or not (expired or len(self._last_access) > self.max_threads):
+                break
+            self.delete_thread(oldest_id)
+            self.evicted += 1
+
+    def _prune(self, thread_id: str):
+        """스레드의 오래된 체크포인트와 그 writes, 남은 체크포인트가 참조하지 않는 blob 삭제"""
+        for checkpoint_ns, saved in self.storage.get(thread_id, {}).items():
+            if len(saved) <= self.max_checkpoints:
+                continue
+            for checkpoint_id in sorted(saved)[:-self.max_checkpoints]:
+                del saved[checkpoint_id]
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                self.pruned += 1
+            referenced = set()
+            for checkpoint, _, _ in saved.values():
+                referenced.update(self.serde.loads_typed(checkpoint)["channel_versions"].items())
+            stale = [
+                key for key in self.blobs
+                if key[0] == thread_id and key[1] == checkpoint_ns and (key[2], key[3]) not in referenced
+            ]
+            for key in stale:
+                del self.blobs[key]
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        if self.prune_enabled:
+            try:
+                self._prune(thread_id)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                self.prune_enabled = False
+                print(f"⚠️ 체크포인트 정리 중단 (MemorySaver 내부 구조 불일치, 스레드 수/TTL 제한만 사용): {e!r}")
+        self._touch(thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._last_access.pop(thread_id, None)
+
+    def stats(self) -> Dict:
+        """저장된 스레드/체크포인트 수와 직렬화된 상태의 대략적인 크기"""
+        checkpoints = 0
+        size = 0
+        per_thread = {}
+        for thread_id, namespaces in self.storage.items():
+            per_thread[thread_id] = sum(len(saved) for saved in namespaces.values())
+            for saved in namespaces.values():
+                checkpoints += len(saved)
+                for checkpoint, metadata, _ in saved.values():
+                    size += len(checkpoint[1]) + len(metadata[1])
+        size += sum(len(blob[1]) for blob in self.blobs.values())
+        size += sum(
+            len(write[2][1])
+            for task_writes in self.writes.values()
+            for write in task_writes.values()
+        )
+        return {
+            "threads": len(self.storage),
+            "checkpoints": checkpoints,
+            "checkpoints_per_thread": per_thread,
+            "approx_bytes": size,
+            "evicted_threads": self.evicted,
+            "pruned_checkpoints": self.pruned,
+            "prune_enabled": self.prune_enabled,
+            "max_checkpoints_per_thread": self.max_checkpoints,
+            "max_threads": self.max_threads,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class CheckpointerManager:
+    """RAG_CHECKPOINTER 정책(none | memory | sqlite)에 따라 체크포인터를 생성/관리"""
+
+    def __init__(self, policy: str = None, sqlite_path: str = None,
+                 max_threads: int = None, ttl_seconds: float = None, max_checkpoints: int = None):
+        self.policy = (policy or os.environ.get("RAG_CHECKPOINTER", "none")).lower()
+        self.sqlite_path = sqlite_path or os.environ.get(
+            "RAG_CHECKPOINT_DB", "/app/shared_data/checkpoints.sqlite"
+        )
+        self.max_threads = max_threads or int(os.environ.get("RAG_CHECKPOINT_MAX_THREADS", 256))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None \
+            else float(os.environ.get("RAG_CHECKPOINT_TTL", 3600))
+        self.max_checkpoints = max_checkpoints or int(os.environ.get("RAG_CHECKPOINT_MAX_PER_THREAD", 4))
+        self.saver = None
+        self._created = False
+        self._lock = None
+
+    async def get(self):
+        """체크포인터 반환 (SQLite 저장소는 실행 중인 이벤트 루프가 필요하므로 지연 생성)"""
+        if self._created:
+            return self.saver
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._created:
+                self.saver = await self._create()
+                self._created = True
+                print(f"체크포인터 정책: {self.policy}")
+        return self.saver
+
+    async def _create(self):
+        if self.policy == "none":
+            return None
+        if self.policy == "sqlite":
+            try:
+                import aiosqlite
+                from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+                os.makedirs(os.path.dirname(self.sqlite_path) or ".", exist_ok=True)
+                conn = await aiosqlite.connect(self.sqlite_path)
+                return AsyncSqliteSaver(conn)
+            except ImportError as e:
+                print(f"SQLite 체크포인터 사용 불가 (langgraph-checkpoint-sqlite 필요), 메모리 체크포인터 사용: {e}")
+                self.policy = "memory"
+        elif self.policy != "memory":
+            print(f"알 수 없는 체크포인터 정책 '{self.policy}', 메모리 체크포인터 사용")
+            self.policy = "memory"
+        return BoundedMemorySaver(
+            max_threads=self.max_threads, ttl_seconds=self.ttl_seconds, max_checkpoints=self.max_checkpoints
+        )
+
+    async def close(self):
+        """서버 종료 시 SQLite 연결 정리"""
+        if self.saver is not None and hasattr(self.saver, "conn"):
+            try:
+                await self.saver.conn.close()
+            except Exception as e:
+                print(f"체크포인터 연결 종료 실패: {e}")
+        self.saver = None
+        self._created = False
+
+    def thread_id(self, session_id: Optional[str] = None) -> str:
+        """세션이 있으면 session_id를 스레드 ID로 사용 (세션 삭제 시 함께 정리)"""
+        return session_id or str(uuid.uuid4())
+
+    async def delete_thread(self, thread_id: str):
+        """세션 삭제 시 해당 스레드의 체크포인트 제거"""
+        saver = await self.get()
+        if saver is None:
+            return
+        try:
+            await saver.adelete_thread(thread_id)
+        except Exception as e:
+            print(f"체크포인트 삭제 실패 ({thread_id}): {e}")
+
+    async def stats(self) -> Dict:
+        """체크포인터 메모리/저장소 통계"""
+        saver = await self.get()
+        result = {"policy": self.policy}
+        if isinstance(saver, BoundedMemorySaver):
+            result.update(saver.stats())
+        elif saver is not None:
+            result["path"] = self.sqlite_path
+            result["file_bytes"] = os.path.getsize(self.sqlite_path) if os.path.exists(self.sqlite_path) else 0
+            try:
+                await saver.setup()
+                async with saver.conn.execute(
+                    "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+                ) as cursor:
+                    threads, checkpoints = await cursor.fetchone()
+                result.update({"threads": threads, "checkpoints": checkpoints})
+            except Exception as e:
+                result["error"] = str(e)
+        return result
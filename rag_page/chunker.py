@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 청킹 모듈
+=================================
+핵심 기능:
+1. PDF 파일 전체를 한 번만 토큰화하고 토큰 오프셋 기준으로 분할 (분할 후보마다 다시 토큰화하지 않음)
+2. 분할 위치 우선순위: 제목 > 단락/페이지 > 줄 > 문장 (제목에서 끊으면 겹침 없이 새 구역 시작)
+3. 페이지를 넘나드는 청크 (pages: 청크가 걸친 페이지, primary_page: 글자가 가장 많이 속한 페이지)
+4. parent 모드: 검색은 작은 child 청크로, 답변 생성은 child가 속한 큰 parent 청크로 (parents.sqlite)
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+from langchain.schema import Document
+
+PARENT_FILE = "parents.sqlite"
+CHUNK_MODES = ("flat", "parent")
+
+# 분할 경계 우선순위
+SENTENCE, LINE, PARAGRAPH, HEADING = 1, 2, 3, 4
+# 번호/기호로 시작하는 제목 (제1장, 1., Ⅰ., 가., □ 등)
+HEADING_PATTERN = re.compile(r"^(제\s*\d+\s*[장절관편]|\d{1,2}\s*[.)]\s|[IVXⅠ-Ⅻ]+\s*\.|[가-하]\s*[.)]\s|[□■◆◇▶◎【])")
+BULLET_PATTERN = re.compile(r"^[•·\-*※○●▪]")
+SENTENCE_END = re.compile(r"(다\.|요\.|[.?!])\s+")
+# 페이지 사이 구분 (단락 경계로 취급)
+PAGE_SEPARATOR = "\n\n"
+
+
+def is_heading(line: str, next_line: str) -> bool:
+    """제목 줄 판별 - 번호/기호 제목이거나, 짧고 문장으로 끝나지 않으며 다음 줄이 글머리표/본문인 줄"""
+    text = line.strip()
+    if not text or BULLET_PATTERN.match(text) or not re.search(r"[가-힣A-Za-z]", text):
+        return False
+    if HEADING_PATTERN.match(text):
+        return len(text) <= 60
+    if len(text) > 25 or text[-1] in ".,:;" or text.endswith("다"):
+        return False
+    next_text = next_line.strip()
+    return bool(next_text) and (bool(BULLET_PATTERN.match(next_text)) or len(next_text) > 40)
+
+
+def scan_boundaries(text: str) -> Tuple[Dict[int, int], List[Tuple[int, str]]]:
+    """글자 위치별 분할 경계 우선순위와 제목 목록 [(위치, 제목)]"""
+    boundaries = {}
+    headings = []
+    lines = text.split("\n")
+    position = 0
+    for i, line in enumerate(lines):
+        if i > 0:
+            if not lines[i - 1].strip():
+                boundaries[position] = PARAGRAPH
+            elif line.strip():
+                boundaries[position] = LINE
+            next_line = next((candidate for candidate in lines[i + 1:] if candidate.strip()), "")
+            if is_heading(line, next_line):
+                boundaries[position] = HEADING
+                headings.append((position, line.strip()))
+        for match in SENTENCE_END.finditer(line):
+            if match.end() < len(line):
+                boundaries.setdefault(position + match.end(), SENTENCE)
+        position += len(line) + 1
+    if lines and is_heading(lines[0], next((line for line in lines[1:] if line.strip()), "")):
+        headings.insert(0, (0, lines[0].strip()))
+    return boundaries, headings
+
+
+class TokenChunker:
+    """토큰 오프셋 기반 구조 인식 청커"""
+
+    def __init__(self, tokenizer, size: int, overlap: int, mode: str = "flat", parent_size: int = None):
+        self.tokenizer = tokenizer
+        self.size = max(16, int(size))
+        self.overlap = max(0, min(int(overlap), self.size // 2))
+        self.mode = mode if mode in CHUNK_MODES else "flat"
+        self.parent_size = max(self.size, int(parent_size or self.size * 4))
+
+    def tokenize(self, text: str) -> List[Tuple[int, int]]:
+        """문서 전체를 한 번 토큰화 → 토큰별 (시작, 끝) 글자 위치"""
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [(start, end) for start, end in encoded["offset_mapping"] if end > start]
+
+    def split_spans(self, begin: int, end: int, size: int, overlap: int,
+                    positions: List[int], priorities: Dict[int, int]) -> List[Tuple[int, int]]:
+        """토큰 구간 [begin, end)를 size 토큰 이하의 (시작, 끝) 구간으로 분할"""
+        spans = []
+        start = begin
+        while start < end:
+            limit = min(start + size, end)
+            stop = limit if limit == end else (self._best_boundary(start, limit, size, positions, priorities) or limit)
+            spans.append((start, stop))
+            if stop >= end:
+                break
+            # 제목에서 끊었으면 겹침 없이, 아니면 overlap 토큰 앞의 줄 경계부터 다음 청크 시작
+            if priorities.get(stop) == HEADING or not overlap:
+                start = stop
+            else:
+                target = max(stop - overlap, start + 1)
+                line_starts = [
+                    pos for pos in positions[bisect_left(positions, target):bisect_left(positions, stop)]
+                    if priorities[pos] >= LINE
+                ]
+                start = line_starts[0] if line_starts else target
+        return spans
+
+    @staticmethod
+    def _best_boundary(start: int, limit: int, size: int, positions: List[int], priorities: Dict[int, int]):
+        """(start + size/3, limit] 안에서 우선순위가 가장 높고 가장 늦은 경계 (없으면 None)"""
+        best = None
+        for pos in positions[bisect_right(positions, start + size // 3):bisect_right(positions, limit)]:
+            if best is None or priorities[pos] >= priorities[best]:
+                best = pos
+        return best
+
+    def split(self, page_documents: List[Document]) -> Tuple[List[Document], List[Document]]:
+        """한 파일의 페이지 문서 → (검색용 청크, parent 청크) - flat 모드면 parent는 빈 목록
+
+        청크 메타데이터: source, pages, primary_page, section, chunk_index, total_chunks, token_count (parent 모드면 parent_index)
+        """
+        if not page_documents:
+            return [], []
+        source = page_documents[0].metadata["source"]
+        total_pages = page_documents[0].metadata.get("total_pages")
+
+        # 페이지를 이어 붙인 전체 텍스트와 페이지별 시작 위치
+        page_starts, page_numbers, parts = [], [], []
+        position = 0
+        for doc in page_documents:
+            page_starts.append(position)
+            page_numbers.append(doc.metadata["page"])
+            parts.append(doc.page_content)
+            position += len(doc.page_content) + len(PAGE_SEPARATOR)
+        text = PAGE_SEPARATOR.join(parts)
+
+        offsets = self.tokenize(text)
+        if not offsets:
+            return [], []
+        token_starts = [start for start, _ in offsets]
+        char_boundaries, headings = scan_boundaries(text)
+        # 글자 위치 경계 → 그 위치에서 시작하는 토큰 번호
+        priorities = {}
+        for char_pos, priority in char_boundaries.items():
+            token_pos = bisect_left(token_starts, char_pos)
+            if 0 < token_pos < len(offsets):
+                priorities[token_pos] = max(priorities.get(token_pos, 0), priority)
+        positions = sorted(priorities)
+        heading_tokens = [bisect_left(token_starts, char_pos) for char_pos, _ in headings]
+
+        def make_chunk(start: int, stop: int) -> Document:
+            char_start, char_end = offsets[start][0], offsets[stop - 1][1]
+            # 청크가 걸친 페이지와 페이지별 글자 수
+            first = max(bisect_right(page_starts, char_start) - 1, 0)
+            last = max(bisect_right(page_starts, char_end - 1) - 1, 0)
+            pages = page_numbers[first:last + 1]
+            overlap_chars = [
+                min(char_end, page_starts[i] + len(parts[i])) - max(char_start, page_starts[i])
+                for i in range(first, last + 1)
+            ]
+            heading_index = bisect_right(heading_tokens, start) - 1
+            metadata = {
+                "source": source,
+                "page": pages[0],
+                "total_pages": total_pages,
+                "pages": pages,
+                "primary_page": pages[overlap_chars.index(max(overlap_chars))],
+                "section": headings[heading_index][1] if heading_index >= 0 else "",
+                "token_count": stop - start,
+            }
+            return Document(page_content=text[char_start:char_end].strip(), metadata=metadata)
+
+        if self.mode == "parent":
+            parents, chunks = [], []
+            for parent_start, parent_stop in self.split_spans(0, len(offsets), self.parent_size, 0, positions, priorities):
+                parent = make_chunk(parent_start, parent_stop)
+                parents.append(parent)
+                for start, stop in self.split_spans(parent_start, parent_stop, self.size, self.overlap,
+                                                    positions, priorities):
+                    chunk = make_chunk(start, stop)
+                    chunk.metadata["parent_index"] = len(parents) - 1
+                    chunks.append(chunk)
+        else:
+            parents = []
+            chunks = [make_chunk(start, stop)
+                      for start, stop in self.split_spans(0, len(offsets), self.size, self.overlap, positions, priorities)]
+
+        chunks = [chunk for chunk in chunks if chunk.page_content]
+        for documents in (parents, chunks):
+            for chunk_index, chunk in enumerate(documents):
+                chunk.metadata.update({"chunk_index": chunk_index, "total_chunks": len(documents)})
+        return chunks, parents
+
+
+class ParentStore:
+    """parent 청크 저장소 (parents.sqlite, 조회 시 필요한 parent만 읽음)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    @staticmethod
+    def save(save_path: str, parents: Iterable[Document]):
+        """parent_id가 채워진 parent 문서를 parents.sqlite로 저장 (임시 파일에 쓴 뒤 교체)"""
+        path = os.path.join(save_path, PARENT_FILE)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("CREATE TABLE parents (parent_id TEXT PRIMARY KEY, content TEXT, metadata TEXT)")
+            conn.executemany(
+                "INSERT OR REPLACE INTO parents VALUES (?, ?, ?)",
+                [(doc.metadata["chunk_id"], doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                 for doc in parents],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, save_path: str) -> "ParentStore":
+        path = os.path.join(save_path, PARENT_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return cls(path)
+
+    def get_many(self, parent_ids: Iterable[str]) -> Dict[str, Document]:
+        """parent_id → parent 문서 (없는 ID는 제외)"""
+        parent_ids = list(parent_ids)
+        rows = []
+        with self._lock:
+            # SQLite 바인딩 변수 수 제한 때문에 나눠서 조회
+            for i in range(0, len(parent_ids), 500):
+                batch = parent_ids[i:i + 500]
+                rows += self._conn.execute(
+                    f"SELECT parent_id, content, metadata FROM parents WHERE parent_id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+        return {parent_id: Document(page_content=content, metadata=json.loads(metadata))
+                for parent_id, content, metadata in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
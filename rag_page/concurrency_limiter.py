@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 동시성 제한 모듈
+=================================
+핵심 기능:
+1. 백엔드(vLLM 8B/32B, Ollama)별 동시 요청 수 제한
+2. 용량 초과 요청의 FIFO 대기열 및 대기 순번 보고
+"""
+
+import os
+import asyncio
+import inspect
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+
+class ConcurrencyLimiter:
+    """동시 실행 수를 제한하고 대기 순번을 알려주는 FIFO 세마포어"""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._active = 0
+        self._queue = deque()
+        self._cond = None  # 이벤트 루프 안에서 지연 생성
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @staticmethod
+    def _notify(on_queue: Optional[Callable], position: int):
+        """대기 순번 콜백 호출 (코루틴이면 백그라운드로 실행해 락을 오래 잡지 않음)"""
+        if on_queue is None:
+            return
+        try:
+            result = on_queue(position)
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+        except Exception as e:
+            print(f"대기 순번 알림 실패: {e}")
+
+    @asynccontextmanager
+    async def slot(self, on_queue: Optional[Callable[[int], object]] = None):
+        """실행 슬롯 획득 - 용량이 없으면 순서대로 대기하며 on_queue(순번)을 호출"""
+        cond = self._condition()
+        ticket = object()
+        async with cond:
+            self._queue.append(ticket)
+            last_position = None
+            try:
+                while not (self._queue[0] is ticket and self._active < self.max_concurrency):
+                    position = self._queue.index(ticket) + 1
+                    if position != last_position:
+                        self._notify(on_queue, position)
+                        last_position = position
+                    await cond.wait()
+            except BaseException:
+                # 대기 중 취소되면 대기열에서 제거하고 다음 대기자를 깨움
+                self._queue.remove(ticket)
+                cond.notify_all()
+                raise
+            self._queue.popleft()
+            self._active += 1
+            # 남은 용량이 있으면 다음 대기자도 진행할 수 있도록 알림
+            cond.notify_all()
+        try:
+            yield
+        finally:
+            async with cond:
+                self._active -= 1
+                cond.notify_all()
+
+    def stats(self) -> Dict:
+        """현재 실행/대기 현황"""
+        return {
+            "name": self.name,
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": len(self._queue),
+        }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def create_backend_limiters() -> Dict[str, ConcurrencyLimiter]:
+    """환경변수 설정으로 백엔드별 제한기 생성"""
+    return {
+        "vllm_8b": ConcurrencyLimiter("vllm_8b", _env_int("VLLM_8B_MAX_CONCURRENCY", 8)),
+        "vllm_32b": ConcurrencyLimiter("vllm_32b", _env_int("VLLM_32B_MAX_CONCURRENCY", 4)),
+        "ollama": ConcurrencyLimiter("ollama", _env_int("OLLAMA_MAX_CONCURRENCY", 4)),
+    }
+
+
+def create_request_limiter() -> ConcurrencyLimiter:
+    """동시에 처리할 RAG 요청 수 제한기 생성"""
+    return ConcurrencyLimiter("rag_request", _env_int("RAG_MAX_CONCURRENT_REQUESTS", 4))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 답변 생성 문맥 패커 모듈
+=================================
+핵심 기능:
+1. 리랭킹 점수(rerank_score) 순으로 토큰 예산(CONTEXT_TOKEN_BUDGET)을 채움 (점수가 없으면 검색 순서)
+2. 같은 파일의 앞선 문서와 겹치는 줄(청크 overlap, 중복 청크)을 잘라내거나 문서째 제외
+3. 긴 문서는 질문 용어가 많이 나오는 구간(passage)만 추출 (CONTEXT_DOC_MAX_TOKENS 이하)
+4. 토큰 수는 bge-m3 토크나이저(기본) 또는 CONTEXT_TOKENIZER로 지정한 토크나이저(Qwen 등)로 계산
+"""
+
+import os
+from typing import Dict, List, Set, Tuple
+
+from langchain.schema import Document
+
+# 추출한 구간 사이 구분 표시
+PASSAGE_SEPARATOR = "\n…\n"
+
+
+class ContextPacker:
+    """토큰 예산 기반 답변 생성 문맥 구성기"""
+
+    def __init__(self, tokenizer=None, budget: int = None, max_doc_tokens: int = None,
+                 max_docs: int = None, passage_tokens: int = None, min_tokens: int = None):
+        # 토크나이저는 RAG 초기화 후 설정 (CONTEXT_TOKENIZER가 있으면 해당 토크나이저를 따로 로드)
+        self.tokenizer = tokenizer
+        self.tokenizer_path = os.environ.get("CONTEXT_TOKENIZER", "")
+        self.budget = budget or int(os.environ.get("CONTEXT_TOKEN_BUDGET", 6000))
+        self.max_doc_tokens = max_doc_tokens or int(os.environ.get("CONTEXT_DOC_MAX_TOKENS", 1500))
+        self.max_docs = max_docs or int(os.environ.get("CONTEXT_MAX_DOCS", 15))
+        self.passage_tokens = passage_tokens or int(os.environ.get("CONTEXT_PASSAGE_TOKENS", 160))
+        # 남은 예산이 이보다 작으면 더 이상 문서를 넣지 않음
+        self.min_tokens = min_tokens or int(os.environ.get("CONTEXT_MIN_TOKENS", 120))
+
+    def encode(self, text: str) -> List[int]:
+        if self.tokenizer is None:
+            # 토크나이저 로드 전: 한국어 약 2글자당 1토큰으로 추정
+            return list(range(max(1, len(text) // 2)))
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encode(text))
+
+    @staticmethod
+    def order_by_score(docs: List[Document]) -> List[Document]:
+        """rerank_score 내림차순 (점수가 같거나 없으면 기존 순서 유지)"""
+        return sorted(docs, key=lambda doc: -(doc.metadata.get("rerank_score") or 0))
+
+    @staticmethod
+    def trim_overlap(lines: List[str], seen: Set[str]) -> List[str]:
+        """앞선 문서에 이미 들어간 줄을 앞/뒤에서 잘라냄 (가운데 줄은 표 반복 행일 수 있어 유지)"""
+        start, end = 0, len(lines)
+        while start < end and lines[start] in seen:
+            start += 1
+        while end > start and lines[end - 1] in seen:
+            end -= 1
+        return lines[start:end]
+
+    def extract_passages(self, question: str, lines: List[str], limit: int) -> Tuple[str, int]:
+        """질문 용어가 많이 나오는 구간만 limit 토큰 이하로 추출 → (본문, 토큰 수)
+
+        구간은 passage_tokens 토큰 안팎의 연속된 줄 묶음이며, 문서 안에서 드문 용어일수록 가중치가 큼.
+        추출한 구간은 원래 순서대로 이어 붙임
+        """
+        passages = []  # [줄 목록, 토큰 수, 토큰 ID 집합]
+        for line in lines:
+            ids = self.encode(line)
+            if not passages or passages[-1][1] + len(ids) > self.passage_tokens:
+                passages.append([[], 0, set()])
+            passages[-1][0].append(line)
+            passages[-1][1] += len(ids)
+            passages[-1][2].update(ids)
+
+        question_terms = set(self.encode(question))
+        document_frequency = {}
+        for _, _, terms in passages:
+            for term in terms & question_terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        scores = [
+            sum(1.0 / document_frequency[term] for term in terms & question_terms)
+            for _, _, terms in passages
+        ]
+
+        selected = []
+        used = 0
+        # 점수 순 (같으면 앞 구간 우선), 질문 용어가 없는 문서는 앞부분부터
+        for index in sorted(range(len(passages)), key=lambda i: (-scores[i], i)):
+            tokens = passages[index][1]
+            if used + tokens > limit:
+                continue
+            selected.append(index)
+            used += tokens
+        if not selected:
+            # 가장 점수가 높은 구간도 예산보다 크면 그 구간 앞부분을 글자 수 비율로 자름
+            best = min(range(len(passages)), key=lambda i: (-scores[i], i))
+            text = "\n".join(passages[best][0])
+            tokens = passages[best][1]
+            while tokens > limit and text:
+                text = text[:int(len(text) * min(0.9, limit / tokens))]
+                tokens = self.count_tokens(text)
+            return text, tokens
+        return PASSAGE_SEPARATOR.join("\n".join(passages[i][0]) for i in sorted(selected)), used
+
+    def pack(self, question: str, docs: List[Document]) -> Tuple[List[Document], Dict]:
+        """리랭킹 점수 순으로 토큰 예산을 채운 문서 목록과 패킹 통계
+
+        반환 문서는 복사본(본문만 잘라내고 메타데이터에 packed_tokens 추가)이라 검색 캐시 문서를 변경하지 않음
+        """
+        packed = []
+        used = 0
+        stats = {"input_docs": len(docs), "trimmed": 0, "extracted": 0, "duplicates": 0, "dropped": 0}
+        seen_lines = {}  # 파일명 → 이미 넣은 줄 집합
+        for doc in self.order_by_score(docs):
+            remaining = self.budget - used
+            if len(packed) >= self.max_docs or remaining < self.min_tokens:
+                stats["dropped"] += 1
+                continue
+            source = doc.metadata.get("source", "")
+            seen = seen_lines.setdefault(source, set())
+            all_lines = [line.strip() for line in doc.page_content.split("\n") if line.strip()]
+            lines = self.trim_overlap(all_lines, seen)
+            if not lines:
+                stats["duplicates"] += 1
+                continue
+            if len(lines) < len(all_lines):
+                stats["trimmed"] += 1
+
+            text = "\n".join(lines)
+            # 잘리지 않은 청크는 빌드 시 기록한 토큰 수 사용 (토크나이저가 같을 때만)
+            tokens = doc.metadata.get("token_count") if len(lines) == len(all_lines) and not self.tokenizer_path else None
+            tokens = tokens or self.count_tokens(text)
+            limit = min(self.max_doc_tokens, remaining)
+            if tokens > limit:
+                text, tokens = self.extract_passages(question, lines, limit)
+                stats["extracted"] += 1
+            seen.update(lines)
+            used += tokens
+            packed.append(Document(page_content=text, metadata={**doc.metadata, "packed_tokens": tokens}))
+        stats.update({"context_docs": len(packed), "context_tokens": used, "budget": self.budget})
+        return packed, stats
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 커트라인 표 구조화 인덱스 모듈
+=================================
+핵심 기능:
+1. 커트라인 PDF의 표를 pdfplumber extract_tables로 행 단위 추출
+   - 육군 기술행정병 회차별 표: 군사특기 | 군사특기명 | 입영부대 | 총점 | 생년월일(동점자 기준)
+   - 공군 모집직종별 표: 직종 × 입영일 열, 커트라인/선발인원 행
+2. (군, 회차, 입영월, 특기, 커트라인, 선발인원, 출처 파일/페이지) 행을 SQLite(cutoffs.sqlite)로 저장
+   - 벡터스토어 빌드 시 함께 생성, 파일 해시가 같은 PDF는 이전 빌드의 행 재사용
+3. 점수 질문(커트라인/합격 점수/선발인원 + 특기명)은 벡터 검색/리랭킹 없이 구조화 조회
+"""
+
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+CUTOFF_FILE = "cutoffs.sqlite"
+COLUMNS = (
+    "branch", "round", "enlist_month", "enlist_date", "apply_month", "specialty_code", "specialty",
+    "category", "unit", "cutoff", "tie_birthdate", "selected", "source", "page", "file_hash",
+)
+
+# 점수 질문 판별 / 특기명 매칭에서 제외할 단어
+SCORE_QUESTION = re.compile(r"커트라인|컷|합격\s*(점수|선|기준)|합격선|총점|몇\s*점|선발\s*인원|몇\s*명")
+STOPWORDS = {
+    "커트라인", "커트", "합격", "점수", "총점", "선발인원", "선발", "인원", "기술행정병", "육군", "공군", "회차",
+    "입영", "지원", "특기", "1차", "1차합격", "몇점", "얼마", "알려줘", "알려주세요", "어떻게", "되나요", "인가요",
+}
+
+
+def is_cutoff_file(path: str) -> bool:
+    return "커트라인" in os.path.basename(path)
+
+
+def normalize_name(text: str) -> str:
+    """특기명 비교용: 공백/구분 기호 제거, 소문자"""
+    return re.sub(r"[\s/·()\-]", "", text or "").lower()
+
+
+def _clean(cell) -> str:
+    return re.sub(r"\s+", "", cell or "")
+
+
+def _number(cell) -> Optional[float]:
+    value = _clean(cell).replace(",", "")
+    return float(value) if re.fullmatch(r"\d+(\.\d+)?", value) else None
+
+
+def _army_round_info(file_name: str) -> Dict:
+    """'25-5회차(25년 8월 입영) ...' → 회차 '25-5', 입영월 '2025-08'"""
+    match = re.search(r"(\d{2})-(\d{1,2})회차\((\d{2})년\s*(\d{1,2})월\s*입영\)", file_name)
+    if not match:
+        return {"round": None, "enlist_month": None}
+    year, number, enlist_year, enlist_month = match.groups()
+    return {"round": f"{year}-{int(number)}", "enlist_month": f"20{enlist_year}-{int(enlist_month):02d}"}
+
+
+def _parse_army_table(table: List[List], file_name: str) -> List[Dict]:
+    """군사특기 | 군사특기명 | 입영부대 | 총점 | 생년월일 표"""
+    round_info = _army_round_info(file_name)
+    rows = []
+    for row in table[1:]:
+        if len(row) < 5 or _number(row[3]) is None:
+            continue
+        rows.append({
+            "branch": "육군", **round_info,
+            "specialty_code": _clean(row[0]), "specialty": _clean(row[1]), "unit": _clean(row[2]),
+            "cutoff": _number(row[3]), "tie_birthdate": _clean(row[4]) or None,
+        })
+    return rows
+
+
+def _air_force_column(header: str) -> Optional[Dict]:
+    """"24.9.9.\\n('24.6월)" → 입영일 2024-09-09, 접수월 2024-06 (모집 없는 열은 None)"""
+    match = re.match(r"(\d{2})\.(\d{1,2})\.(\d{1,2})\.", _clean(header))
+    if not match:
+        return None
+    year, month, day = (int(value) for value in match.groups())
+    apply = re.search(r"'(\d{2})\.(\d{1,2})월", _clean(header))
+    return {
+        "enlist_month": f"20{year:02d}-{month:02d}",
+        "enlist_date": f"20{year:02d}-{month:02d}-{day:02d}",
+        "apply_month": f"20{int(apply.group(1)):02d}-{int(apply.group(2)):02d}" if apply else None,
+    }
+
+
+def _parse_air_force_table(table: List[List]) -> List[Dict]:
+    """직종(병합 셀) × 입영일 열 표 - 직종마다 커트라인 행 다음에 선발인원 행"""
+    columns = {index: _air_force_column(cell) for index, cell in enumerate(table[0]) if index >= 3}
+    rows = {}
+    category = specialty = None
+    for row in table[1:]:
+        category = _clean(row[0]) or category
+        specialty = _clean(row[1]) or specialty
+        kind = _clean(row[2])
+        if kind not in ("커트라인", "선발인원"):
+            continue
+        for index, column in columns.items():
+            if column is None or index >= len(row):
+                continue
+            value = _number(row[index])
+            if value is None:
+                continue
+            entry = rows.setdefault((specialty, index), {
+                "branch": "공군", "round": None, **column, "specialty": specialty,
+                "category": f"{category}기술" if category and not category.endswith("기술") else category,
+            })
+            if kind == "커트라인":
+                entry["cutoff"] = value
+            else:
+                entry["selected"] = int(value)
+    return [row for row in rows.values() if row.get("cutoff") is not None]
+
+
+def extract_cutoff_rows(pdf_path: str) -> List[Dict]:
+    """커트라인 PDF 한 개의 표 행 추출 (출처 파일명/페이지 포함)"""
+    import pdfplumber
+
+    file_name = os.path.basename(pdf_path)
+    rows = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num, page in enumerate(pdf.pages, 1):
+            for table in page.extract_tables():
+                if not table or not table[0]:
+                    continue
+                header = [_clean(cell) for cell in table[0]]
+                if header[:2] == ["군사특기", "군사특기명"]:
+                    parsed = _parse_army_table(table, file_name)
+                elif header[0].startswith("입영일") and len(header) > 3:
+                    parsed = _parse_air_force_table(table)
+                else:
+                    continue
+                rows.extend({**row, "source": file_name, "page": page_num} for row in parsed)
+    return rows
+
+
+def format_cutoff_row(row: Dict) -> str:
+    """조회 결과 한 행을 답변 생성용 문장으로"""
+    if row["branch"] == "공군":
+        when = f"{row['enlist_date']} 입영" + (f"({row['apply_month']} 접수)" if row.get("apply_month") else "")
+        text = f"공군 {row.get('category') or ''} {row['specialty']} | {when} | 1차선발 커트라인 {row['cutoff']:g}점"
+        if row.get("selected") is not None:
+            text += f" | 선발인원 {row['selected']}명"
+        return text
+    when = f"{row['round']}회차({row['enlist_month']} 입영)" if row.get("round") else row.get("enlist_month") or ""
+    text = f"육군 기술행정병 {when} | {row['specialty_code']} {row['specialty']} | 입영부대 {row['unit']}"
+    text += f" | 1차 합격 커트라인 총점 {row['cutoff']:g}점"
+    if row.get("tie_birthdate"):
+        text += f" | 커트라인 동점자 생년월일 기준 {row['tie_birthdate']}"
+    return text
+
+
+class CutoffIndex:
+    """커트라인 표 행 보관/조회 (저장: SQLite, 조회: 메모리)"""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        self.specialties = {}  # 정규화된 특기명 → 원래 특기명
+        for row in rows:
+            self.specialties.setdefault(normalize_name(row["specialty"]), row["specialty"])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, files: Dict[str, Tuple[str, str]], previous: "CutoffIndex" = None) -> "CutoffIndex":
+        """{파일명: (경로, 파일 해시)} 중 커트라인 PDF의 표 추출 (해시가 같은 파일은 이전 행 재사용)"""
+        reusable = {}
+        for row in previous.rows if previous is not None else []:
+            reusable.setdefault((row["source"], row["file_hash"]), []).append(row)
+        rows = []
+        for name, (pdf_path, digest) in sorted(files.items()):
+            if not is_cutoff_file(name):
+                continue
+            if (name, digest) in reusable:
+                rows.extend(reusable[(name, digest)])
+                continue
+            try:
+                rows.extend({**row, "file_hash": digest} for row in extract_cutoff_rows(pdf_path))
+            except Exception as e:
+                print(f"커트라인 표 추출 실패 ({name}): {e}")
+        return cls(rows)
+
+    def save(self, save_path: str):
+        """cutoffs.sqlite로 저장 (임시 파일에 쓴 뒤 교체)"""
+        path = os.path.join(save_path, CUTOFF_FILE)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute(
+                "CREATE TABLE cutoffs (branch TEXT, round TEXT, enlist_month TEXT, enlist_date TEXT, "
+                "apply_month TEXT, specialty_code TEXT, specialty TEXT, category TEXT, unit TEXT, cutoff REAL, "
+                "tie_birthdate TEXT, selected INTEGER, source TEXT, page INTEGER, file_hash TEXT)"
+            )
+            conn.execute("CREATE INDEX cutoffs_specialty ON cutoffs (specialty)")
+            conn.executemany(
+                f"INSERT INTO cutoffs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row.get(column) for column in COLUMNS) for row in self.rows],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, save_path: str) -> "CutoffIndex":
+        path = os.path.join(save_path, CUTOFF_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(row) for row in conn.execute(f"SELECT {', '.join(COLUMNS)} FROM cutoffs")]
+        finally:
+            conn.close()
+        return cls(rows)
+
+    def match_specialties(self, question: str) -> List[str]:
+        """질문에 나온 특기명 (전체 이름 포함 우선, 없으면 2글자 이상 단어를 포함하는 특기명)"""
+        normalized = normalize_name(question)
+        matched = [key for key in self.specialties if key and key in normalized]
+        # "K-9자주포조종"이 맞으면 그 안에 포함된 짧은 이름("자주포조종" 등)은 제외
+        matched = [key for key in matched if not any(key != other and key in other for other in matched)]
+        if not matched:
+            words = [
+                normalize_name(word) for word in re.findall(r"[\w/\-]+", question)
+                if normalize_name(word) not in STOPWORDS
+            ]
+            words = [re.sub(r"(은|는|이|가|의|을|를|도)$", "", word) for word in words]
+            matched = [
+                key for key in self.specialties
+                if any(len(word) >= 2 and word not in STOPWORDS and word in key for word in words)
+            ]
+        return [self.specialties[key] for key in matched]
+
+    def lookup(self, question: str, limit: int = 40) -> Optional[List[Dict]]:
+        """점수 질문이면 특기/회차/입영월/군 조건에 맞는 행, 아니면 None
+
+        회차·입영월 조건에 맞는 행이 없으면 해당 특기의 전체 회차를 반환 (최근 입영월 순)
+        """
+        if not self.rows or not SCORE_QUESTION.search(question):
+            return None
+        specialties = set(self.match_specialties(question))
+        if not specialties:
+            return None
+        rows = [row for row in self.rows if row["specialty"] in specialties]
+        if "공군" in question:
+            rows = [row for row in rows if row["branch"] == "공군"] or rows
+        elif "육군" in question or "기술행정병" in question:
+            rows = [row for row in rows if row["branch"] == "육군"] or rows
+
+        filters = []
+        round_match = re.search(r"(\d{2})\s*(?:-|년\s*)(\d{1,2})\s*회차", question)
+        if round_match:
+            round_name = f"{round_match.group(1)}-{int(round_match.group(2))}"
+            filters.append(lambda row: row.get("round") == round_name)
+        month_match = re.search(r"(?:(\d{2,4})년\s*)?(\d{1,2})월\s*입영", question)
+        if month_match:
+            year = month_match.group(1)
+            month = f"{int(month_match.group(2)):02d}"
+            filters.append(lambda row: (row.get("enlist_month") or "").endswith(f"-{month}")
+                           and (not year or (row.get("enlist_month") or "").startswith(f"20{year[-2:]}")))
+        filtered = [row for row in rows if all(condition(row) for condition in filters)]
+        rows = filtered or rows
+        rows.sort(key=lambda row: (row.get("enlist_month") or "", row["specialty"]), reverse=True)
+        return rows[:limit]
+
+    def stats(self) -> Dict:
+        return {
+            "rows": len(self.rows),
+            "specialties": len(self.specialties),
+            "files": len({row["source"] for row in self.rows}),
+        }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 임베딩 클라이언트/캐시 모듈
+=================================
+핵심 기능:
+1. Ollama /api/embed 배치 요청 (배치 크기, 동시 요청 수, 지수 백오프 재시도)
+2. (모델, 텍스트 해시) 단위 디스크 임베딩 캐시
+   - keys.txt: 고정 길이(40자 SHA-1 + 개행) 키 목록, 줄 번호 = 벡터 행 번호
+   - vectors.f32: float32 행렬 (np.memmap으로 읽음)
+   - 여러 프로세스(uvicorn 워커, 빌드 스크립트)가 파일 락으로 안전하게 공유
+3. 디스크 캐시는 인덱스 빌드 시 문서 임베딩에만 사용 (질의 임베딩은 디스크에 쓰지 않고 호출 측 메모리 LRU 사용)
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_KEY_LINE_BYTES = 41  # SHA-1 hex 40자 + 개행
+
+
+def text_key(text: str) -> str:
+    """임베딩 캐시 키 (텍스트 SHA-1)"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """모델별 append-only 디스크 임베딩 캐시"""
+
+    def __init__(self, cache_dir: str, model: str):
+        self.model = model
+        self.dir = os.path.join(cache_dir, re.sub(r"[^0-9A-Za-z_.-]+", "_", model))
+        os.makedirs(self.dir, exist_ok=True)
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.lock_path = os.path.join(self.dir, ".lock")
+        self.dim = None
+        self._index: Dict[str, int] = {}
+        self._rows = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        self._refresh()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _refresh(self):
+        """다른 프로세스가 추가한 키를 읽어 인덱스 갱신"""
+        if not os.path.exists(self.keys_path):
+            return
+        rows = os.path.getsize(self.keys_path) // _KEY_LINE_BYTES
+        if rows <= self._rows:
+            return
+        if self.dim is None:
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._rows * _KEY_LINE_BYTES)
+            data = f.read((rows - self._rows) * _KEY_LINE_BYTES)
+        for i in range(rows - self._rows):
+            key = data[i * _KEY_LINE_BYTES:i * _KEY_LINE_BYTES + 40].decode("ascii")
+            self._index.setdefault(key, self._rows + i)
+        self._rows = rows
+        self._mmap = None  # 행 수가 바뀌었으므로 memmap 재생성
+
+    def _vectors(self) -> np.ndarray:
+        if self._mmap is None:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                   shape=(self._rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """캐시에 있는 키의 벡터만 반환"""
+        with self._lock:
+            if any(key not in self._index for key in keys):
+                self._refresh()
+            rows = {key: self._index[key] for key in keys if key in self._index}
+            if not rows:
+                return {}
+            vectors = self._vectors()
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """벡터 추가 - 파일 락 안에서 현재 행 수 뒤에 벡터를 쓰고 키를 추가"""
+        if not items:
+            return
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new_items = [(k, v) for k, v in items.items() if k not in self._index]
+                if not new_items:
+                    return
+                matrix = np.asarray([v for _, v in new_items], dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(matrix.shape[1])
+                    with open(self.meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model, "dim": self.dim}, f)
+                # 키 파일 기준 행 위치에 기록 (중단되어 남은 불완전한 벡터는 덮어씀)
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(self._rows * self.dim * 4)
+                    f.write(matrix.tobytes())
+                with open(self.keys_path, "a", encoding="ascii") as f:
+                    f.write("".join(f"{k}\n" for k, _ in new_items))
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CachedOllamaEmbeddings(Embeddings):
+    """디스크 캐시 + 배치/동시 요청 + 재시도를 지원하는 Ollama 임베딩 클라이언트"""
+
+    def __init__(self, model: str = "bge-m3:latest", base_url: str = "http://ollama:11434",
+                 cache_dir: Optional[str] = None, batch_size: int = None, max_concurrency: int = None,
+                 max_retries: int = None, backoff: float = 0.5, timeout: float = 120, offline: bool = None):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size or int(os.environ.get("EMBED_BATCH_SIZE", 32))
+        self.max_concurrency = max_concurrency or int(os.environ.get("EMBED_CONCURRENCY", 4))
+        self.max_retries = max_retries or int(os.environ.get("EMBED_MAX_RETRIES", 4))
+        self.backoff = backoff
+        self.client = httpx.Client(timeout=timeout)
+        self.cache = EmbeddingCache(cache_dir, model) if cache_dir else None
+        # 오프라인 모드 (EMBED_OFFLINE=1): 캐시에 없는 문서 텍스트는 요청하지 않고 오류
+        self.offline = offline if offline is not None else os.environ.get("EMBED_OFFLINE") == "1"
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """한 배치 임베딩 요청 - 연결 오류/5xx는 지수 백오프로 재시도"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": self.model, "input": texts}
+                )
+                if response.status_code >= 500:
+                    raise httpx.HTTPStatusError(
+                        f"Ollama 서버 오류 {response.status_code}", request=response.request, response=response
+                    )
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                is_server_error = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500
+                if attempt >= self.max_retries or not is_server_error:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"임베딩 요청 실패, {delay:.1f}s 후 재시도 ({attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(delay)
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """배치로 나눠 최대 max_concurrency개 요청을 동시에 전송"""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(self._embed_batch, batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(text) for text in texts]
+        cached = self.cache.get_many(keys) if self.cache is not None else {}
+        # 캐시에 없는 텍스트만 (중복 제거 후) 요청
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        uncached = sum(1 for key in keys if key not in cached)
+        self.hits += len(keys) - uncached
+        self.misses += uncached
+        if missing and self.offline:
+            raise RuntimeError(f"오프라인 모드: 캐시에 없는 임베딩 {len(missing)}개 (먼저 Ollama 연결 상태로 실행해 캐시를 채우세요)")
+        if missing:
+            vectors = self._embed_uncached(list(missing.values()))
+            fresh = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            if self.cache is not None:
+                self.cache.put_many(fresh)
+            cached.update(fresh)
+        return [cached[key].tolist() for key in keys]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """질의 임베딩 - 디스크 캐시를 거치지 않고 바로 요청 (오프라인 모드에서도 요청, 재사용은 호출 측 메모리 캐시)"""
+        return self._embed_uncached(list(texts)) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def stats(self) -> Dict:
+        """캐시 적중/미스 횟수와 캐시 크기"""
+        return {
+            "model": self.model,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_vectors": len(self.cache) if self.cache is not None else 0,
+        }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 검색 품질/지연 시간 평가 스크립트
+===============================================
+golden_set.json(질문 → 정답 (파일명, 페이지))으로 설정별 검색 결과를 채점합니다.
+
+- 설정 축: 청크 크기/겹침(--chunk-size, --chunk-overlap), 청킹 모드(--chunk-mode flat | parent, --parent-size),
+  인덱스 유형(--index-spec), 결합 가중치(--weights)
+- 지표: recall@k(정답 (파일, 페이지) 중 상위 k 청크가 포함한 비율), MRR, 검색 지연 시간, 인덱스 크기,
+  상위 k 문서의 토큰 수(답변 생성에 들어가는 문맥 크기, parent 모드는 parent로 확장한 뒤 채점)
+- 대상: fast_search (기본), enhanced_multi_search (--multi-search, 멀티쿼리 + 리랭킹 LLM 필요),
+  커트라인 구조화 조회 (--cutoff-lookup, 점수 질문만: 첫 문서에 정답 점수가 있는 비율 포함)
+- 청크 임베딩은 공용 캐시(--embedding-cache)를 사용하며, --offline이면 캐시에 없는 청크 임베딩은 요청하지 않음 (질의는 항상 요청)
+  (처음 한 번은 Ollama 연결 상태로 실행해 캐시를 채워야 함)
+
+실행 방법:
+- rag-chat 컨테이너에서 실행: python evaluate_retrieval.py
+- 설정 비교: python evaluate_retrieval.py --chunk-size 1024 --chunk-size 512 --weights 0.6,0.4 --weights 0.3,0.7
+- parent/child 비교: python evaluate_retrieval.py --chunk-size 256 --chunk-mode flat --chunk-mode parent
+- 인덱스 유형 비교: python evaluate_retrieval.py --index-spec Flat --index-spec HNSW32 --offline
+- 멀티쿼리 검색 포함(스텁 LLM): python evaluate_retrieval.py --multi-search --stub-llm
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from chunker import PARENT_FILE
+from sparse_index import BM25_FILE
+from vector_store_io import BLOB_FILE, INDEX_FILE, LEGACY_DOCSTORE_FILE, META_FILE, resolve_store_dir
+
+GOLDEN_SET = str(Path(__file__).resolve().parent / "golden_set.json")
+VECTOR_STORE_FILES = (INDEX_FILE, BLOB_FILE, META_FILE)  # 현재 세대 폴더에 있는 파일
+STORE_FILES = (BM25_FILE, PARENT_FILE, LEGACY_DOCSTORE_FILE)
+
+
+def load_golden_set(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["items"]
+
+
+def doc_pages(doc) -> Set[Tuple[str, int]]:
+    """검색된 청크가 담고 있는 (파일명, 페이지) 집합"""
+    source = os.path.basename(str(doc.metadata.get("source", "")))
+    pages = doc.metadata.get("pages") or [doc.metadata.get("primary_page")]
+    return {(source, int(page)) for page in pages if page not in (None, "", "?")}
+
+
+def score_ranking(docs: Sequence, expected: List[Dict], ks: Sequence[int]) -> Dict:
+    """한 질문의 recall@k와 reciprocal rank"""
+    expected_pairs = {(item["source"], int(item["page"])) for item in expected}
+    found_at = {}  # 정답 쌍 → 처음 나온 순위(1부터)
+    first_relevant = None
+    for rank, doc in enumerate(docs, 1):
+        matched = doc_pages(doc) & expected_pairs
+        if matched and first_relevant is None:
+            first_relevant = rank
+        for pair in matched:
+            found_at.setdefault(pair, rank)
+    result = {f"recall@{k}": sum(1 for rank in found_at.values() if rank <= k) / len(expected_pairs) for k in ks}
+    result["rr"] = 1.0 / first_relevant if first_relevant else 0.0
+    return result
+
+
+def summarize(rows: List[Dict], ks: Sequence[int]) -> Dict:
+    latencies = [row["latency_ms"] for row in rows]
+    summary = {f"recall@{k}": float(np.mean([row[f"recall@{k}"] for row in rows])) for k in ks}
+    summary["mrr"] = float(np.mean([row["rr"] for row in rows]))
+    summary["latency_ms_mean"] = float(np.mean(latencies))
+    summary["latency_ms_p95"] = float(np.percentile(latencies, 95))
+    if all("context_tokens" in row for row in rows):
+        summary["context_tokens_mean"] = float(np.mean([row["context_tokens"] for row in rows]))
+    by_category = {}
+    for row in rows:
+        by_category.setdefault(row["category"], []).append(row)
+    summary["by_category"] = {
+        category: {f"recall@{max(ks)}": float(np.mean([r[f"recall@{max(ks)}"] for r in items])),
+                   "mrr": float(np.mean([r["rr"] for r in items]))}
+        for category, items in by_category.items()
+    }
+    return summary
+
+
+def store_size_mb(save_path: str) -> float:
+    """저장된 인덱스 파일(FAISS, 청크 blob/메타데이터, BM25) 크기 합계"""
+    paths = [os.path.join(resolve_store_dir(save_path), name) for name in VECTOR_STORE_FILES]
+    paths += [os.path.join(save_path, name) for name in STORE_FILES]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path)) / 1e6
+
+
+def evaluate_fast_search(rag_module, golden: List[Dict], weights, k: int, ks: Sequence[int]) -> List[Dict]:
+    rows = []
+    for item in golden:
+        start = time.perf_counter()
+        # parent 모드는 답변 생성 시와 같이 parent 청크로 확장한 결과를 채점
+        docs = rag_module.expand_parents(rag_module.fast_search(item["question"], k=k, weights=weights))
+        latency = (time.perf_counter() - start) * 1000
+        rows.append({"id": item["id"], "category": item["category"], "latency_ms": latency,
+                     "context_tokens": sum(doc.metadata.get("token_count", 0) for doc in docs[:k]),
+                     **score_ranking(docs, item["expected"], ks)})
+    return rows
+
+
+def evaluate_cutoff_lookup(rag, golden: List[Dict], ks: Sequence[int]) -> List[Dict]:
+    """점수 질문(category=cutoff)의 커트라인 표 조회 - 조회 실패는 빈 결과로 채점"""
+    rows = []
+    for item in golden:
+        if item["category"] != "cutoff":
+            continue
+        start = time.perf_counter()
+        docs = rag.lookup_cutoffs(item["question"]) or []
+        latency = (time.perf_counter() - start) * 1000
+        answer = item.get("answer")
+        rows.append({"id": item["id"], "category": item["category"], "latency_ms": latency,
+                     "answer_found": bool(docs and answer and f" {answer}점" in docs[0].page_content) if answer else None,
+                     **score_ranking(docs, item["expected"], ks)})
+    return rows
+
+
+def evaluate_multi_search(app_module, golden: List[Dict], ks: Sequence[int]) -> List[Dict]:
+    async def run():
+        rows = []
+        for item in golden:
+            start = time.perf_counter()
+            docs = await app_module.enhanced_multi_search(item["question"])
+            latency = (time.perf_counter() - start) * 1000
+            rows.append({"id": item["id"], "category": item["category"], "latency_ms": latency,
+                         "returned": len(docs), **score_ranking(docs, item["expected"], ks)})
+        return rows
+    return asyncio.run(run())
+
+
+def main():
+    """검색 평가 메인 함수"""
+    parser = argparse.ArgumentParser(description="골든셋 기반 검색 recall@k / MRR / 지연 시간 / 인덱스 크기 평가")
+    parser.add_argument("--golden", default=GOLDEN_SET)
+    parser.add_argument("--data", default="/app/workspace/data", help="PDF 폴더")
+    parser.add_argument("--store-path", default="/app/shared_data/eval", help="설정별 평가용 벡터스토어 경로")
+    parser.add_argument("--embedding-cache", default="/app/shared_data/embedding_cache",
+                        help="청크/질의 임베딩 캐시 (서비스 벡터스토어와 공유)")
+    parser.add_argument("--chunk-size", type=int, action="append", help="청크 토큰 수 (여러 번 지정 가능)")
+    parser.add_argument("--chunk-overlap", type=int, default=None, help="청크 겹침 토큰 수 (기본: 청크 크기의 10%%)")
+    parser.add_argument("--chunk-mode", action="append", choices=["flat", "parent"],
+                        help="청킹 모드 (여러 번 지정 가능, parent: 청크 크기는 child 크기)")
+    parser.add_argument("--parent-size", type=int, default=None, help="parent 모드의 parent 청크 토큰 수")
+    parser.add_argument("--index-spec", action="append", help="FAISS index_factory 문자열 (여러 번 지정 가능)")
+    parser.add_argument("--weights", action="append", help="FAISS,BM25 결합 가중치 (예: 0.6,0.4, 여러 번 지정 가능)")
+    parser.add_argument("--k", type=int, action="append", help="recall@k의 k (기본 1, 3, 5, 10)")
+    parser.add_argument("--cutoff-lookup", action="store_true", help="커트라인 구조화 조회도 평가 (점수 질문만)")
+    parser.add_argument("--multi-search", action="store_true", help="enhanced_multi_search도 평가 (LLM 필요)")
+    parser.add_argument("--stub-llm", action="store_true", help="멀티쿼리/리랭킹 LLM을 로컬 스텁 서버로 대체")
+    parser.add_argument("--offline", action="store_true", help="임베딩 캐시에 없는 텍스트는 Ollama에 요청하지 않음")
+    parser.add_argument("--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    if args.offline:
+        os.environ["EMBED_OFFLINE"] = "1"
+    if args.stub_llm:
+        from benchmark_stubs import start_stub_backends
+
+        llm_server, _, _ = start_stub_backends()
+        os.environ["VLLM_URL"] = os.environ["VLLM_32B_URL"] = f"{llm_server.url}/v1"
+    import simple_rag_with_pages as rag_module
+
+    golden = load_golden_set(args.golden)
+    ks = sorted(set(args.k or [1, 3, 5, 10]))
+    chunk_sizes = args.chunk_size or [rag_module.DEFAULT_CHUNKING["size"]]
+    chunk_modes = args.chunk_mode or [rag_module.DEFAULT_CHUNKING["mode"]]
+    parent_size = args.parent_size or rag_module.DEFAULT_CHUNKING["parent_size"]
+    index_specs = args.index_spec or [os.environ.get("FAISS_INDEX_SPEC", "Flat")]
+    weight_options = [tuple(float(w) for w in value.split(",")) for value in args.weights or ["0.6,0.4"]]
+    app_module = None
+
+    print("=" * 50)
+    print(f"🏁 검색 평가 시작: 질문 {len(golden)}개, recall@{ks}")
+    print("=" * 50)
+    results = []
+    for chunk_size, chunk_mode, index_spec in itertools.product(chunk_sizes, chunk_modes, index_specs):
+        overlap = args.chunk_overlap if args.chunk_overlap is not None else chunk_size // 10
+        chunking = f"{chunk_size}/{overlap}" + (f" p{parent_size}" if chunk_mode == "parent" else "")
+        store_name = f"cs{chunk_size}_o{overlap}_{chunk_mode}{parent_size if chunk_mode == 'parent' else ''}" \
+            f"_{re.sub(r'[^0-9A-Za-z]+', '_', index_spec)}"
+        rag = rag_module.SimpleRAGWithPages(
+            data_path=args.data, store_path=args.store_path, chunk_size=chunk_size, chunk_overlap=overlap,
+            chunk_mode=chunk_mode, parent_size=parent_size, embedding_cache_dir=args.embedding_cache,
+        )
+        build_start = time.perf_counter()
+        vectorstore = rag.create_vectorstore(store_name, index_spec=index_spec)
+        build_time = time.perf_counter() - build_start
+        if vectorstore is None or not rag.load_retriever(store_name):
+            print(f"⚠️ 벡터스토어 생성 실패: {store_name}")
+            continue
+        rag_module.rag_instance = rag
+        config = {
+            "chunk_size": chunk_size, "chunk_overlap": overlap, "chunk_mode": chunk_mode,
+            "parent_size": parent_size if chunk_mode == "parent" else None, "index_spec": index_spec,
+            "chunks": rag.last_build_report["total"],
+            "index_size_mb": store_size_mb(os.path.join(args.store_path, store_name)),
+            "build_s": build_time,
+        }
+
+        for weights in weight_options:
+            rag.result_cache.clear()
+            rows = evaluate_fast_search(rag_module, golden, weights, max(ks), ks)
+            summary = summarize(rows, ks)
+            results.append({"method": "fast_search", **config, "weights": list(weights),
+                            "summary": summary, "rows": rows})
+            print(
+                f"  fast_search | chunk {chunking} | {index_spec:<10} | w={weights} | "
+                + " ".join(f"R@{k} {summary[f'recall@{k}']:.2f}" for k in ks)
+                + f" | MRR {summary['mrr']:.3f} | {summary['latency_ms_mean']:.1f}ms"
+                + f" | 문맥 {summary['context_tokens_mean']:.0f}토큰"
+                + f" | {config['chunks']}청크 {config['index_size_mb']:.1f}MB"
+            )
+
+        if args.cutoff_lookup:
+            rows = evaluate_cutoff_lookup(rag, golden, ks)
+            summary = summarize(rows, ks)
+            answered = [row["answer_found"] for row in rows if row["answer_found"] is not None]
+            summary["answer_accuracy"] = float(np.mean(answered)) if answered else None
+            results.append({"method": "cutoff_lookup", **config, "summary": summary, "rows": rows})
+            print(
+                f"  cutoff_lookup | 점수 질문 {len(rows)}개 | "
+                + " ".join(f"R@{k} {summary[f'recall@{k}']:.2f}" for k in ks)
+                + f" | MRR {summary['mrr']:.3f} | 정답 점수 {summary['answer_accuracy'] or 0:.2f}"
+                + f" | {summary['latency_ms_mean']:.2f}ms"
+            )
+
+        if args.multi_search:
+            if app_module is None:
+                import app as app_module
+            rows = evaluate_multi_search(app_module, golden, ks)
+            summary = summarize(rows, ks)
+            results.append({"method": "enhanced_multi_search", **config, "summary": summary, "rows": rows})
+            print(
+                f"  multi_search | chunk {chunking} | {index_spec:<10} | "
+                + " ".join(f"R@{k} {summary[f'recall@{k}']:.2f}" for k in ks)
+                + f" | MRR {summary['mrr']:.3f} | {summary['latency_ms_mean']:.0f}ms"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"golden": args.golden, "questions": len(golden), "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 하이브리드 검색 엔진
+=================================
+핵심 기능:
+1. FAISS(의미) 검색과 BM25(키워드) 검색을 동시에 실행
+2. 문서 객체가 아닌 정수 행 번호로 가중 RRF / 가중 점수 결합을 벡터 연산으로 수행
+3. 최종 상위 k개만 docstore 문서로 변환
+4. 호출별 k, 후보 수(fetch_k), 가중치 조정
+5. 여러 질의 일괄 검색 (임베딩 1회 배치 요청, 쌓은 질의 행렬로 FAISS 1회, BM25 1회)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from sparse_index import SparseBM25Index
+
+
+def _parse_weights(value: str) -> Tuple[float, float]:
+    dense, sparse = (float(w) for w in value.split(","))
+    return dense, sparse
+
+
+def fuse_rankings(rankings: Sequence[np.ndarray], weights: Sequence[float], c: int = 60,
+                  scores: Optional[Sequence[np.ndarray]] = None, method: str = "rrf") -> Tuple[np.ndarray, np.ndarray]:
+    """순위 목록(정수 행 번호 배열)들을 결합해 (행 번호, 점수)를 점수 내림차순으로 반환
+
+    rrf: weight / (rank + c) 합산 (EnsembleRetriever와 같은 방식)
+    score: 목록별 점수를 min-max 정규화한 뒤 가중합 (scores 필요)
+    동점은 목록 순서(앞 목록, 높은 순위)에서 먼저 나온 행이 앞에 옵니다.
+    """
+    rows = np.concatenate([np.asarray(r, dtype=np.int64) for r in rankings])
+    if not len(rows):
+        return rows, np.zeros(0, dtype=np.float64)
+    contributions = []
+    for i, (ranking, weight) in enumerate(zip(rankings, weights)):
+        if method == "score":
+            values = np.asarray(scores[i], dtype=np.float64)
+            spread = values.max() - values.min() if len(values) else 0.0
+            normalized = (values - values.min()) / spread if spread > 0 else np.ones(len(values))
+            contributions.append(weight * normalized)
+        else:
+            contributions.append(weight / (np.arange(1, len(ranking) + 1, dtype=np.float64) + c))
+    contributions = np.concatenate(contributions)
+
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions, minlength=len(unique_rows))
+    first_seen = np.full(len(unique_rows), len(rows), dtype=np.int64)
+    np.minimum.at(first_seen, inverse, np.arange(len(rows)))
+    order = np.lexsort((first_seen, -fused))
+    return unique_rows[order], fused[order]
+
+
+class HybridSearcher:
+    """FAISS 인덱스 + BM25 희소 인덱스를 FAISS 행 번호 기준으로 결합하는 검색기"""
+
+    def __init__(self, faiss_index, row_ids: Sequence[str], bm25_index: SparseBM25Index,
+                 embed_queries: Callable[[List[str]], List[List[float]]], tokenize: Callable[[str], List[int]],
+                 normalize_l2: bool = False, weights: Tuple[float, float] = None,
+                 fetch_k: int = None, c: int = None, method: str = None):
+        self.faiss_index = faiss_index
+        self.row_ids = list(row_ids)  # FAISS 행 번호 → chunk_id
+        self.bm25_index = bm25_index
+        self.embed_queries = embed_queries
+        self.tokenize = tokenize
+        self.normalize_l2 = normalize_l2
+        self.weights = weights or _parse_weights(os.environ.get("HYBRID_WEIGHTS", "0.6,0.4"))  # FAISS, BM25
+        self.fetch_k = fetch_k or int(os.environ.get("HYBRID_FETCH_K", 10))
+        self.c = c or int(os.environ.get("RRF_C", 60))
+        self.method = (method or os.environ.get("HYBRID_FUSION", "rrf")).lower()
+        # BM25 행 번호 → FAISS 행 번호 (벡터스토어에 없는 청크는 -1)
+        row_of = {chunk_id: row for row, chunk_id in enumerate(self.row_ids)}
+        self.bm25_to_row = np.array([row_of.get(str(chunk_id), -1) for chunk_id in bm25_index.doc_ids], dtype=np.int64)
+        self.higher_is_better = faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT
+        self._executor = ThreadPoolExecutor(max_workers=int(os.environ.get("HYBRID_SEARCH_THREADS", 4)))
+
+    def dense_search_vectors(self, vectors: np.ndarray, fetch_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """질의 벡터 행렬로 FAISS 검색 → (행 번호 [n, fetch_k], 높을수록 관련된 점수)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.normalize_l2:
+            faiss.normalize_L2(vectors)
+        distances, rows = self.faiss_index.search(vectors, min(fetch_k, self.faiss_index.ntotal))
+        return rows, distances if self.higher_is_better else -distances
+
+    def sparse_search_many(self, queries: List[str], fetch_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """질의별 BM25 검색 → [(FAISS 행 번호, BM25 점수)]"""
+        results = []
+        for hits in self.bm25_index.search_many([self.tokenize(query) for query in queries], fetch_k):
+            rows = self.bm25_to_row[[row for row, _ in hits]] if hits else np.zeros(0, dtype=np.int64)
+            scores = np.array([score for _, score in hits], dtype=np.float64)
+            keep = rows >= 0
+            results.append((rows[keep], scores[keep]))
+        return results
+
+    def fuse(self, dense: Tuple[np.ndarray, np.ndarray], sparse: Tuple[np.ndarray, np.ndarray],
+             k: int, weights: Tuple[float, float] = None) -> List[str]:
+        """FAISS/BM25 결과 결합 후 상위 k개 chunk_id"""
+        dense_rows, dense_scores = dense
+        keep = dense_rows >= 0  # 인덱스 크기보다 fetch_k가 크면 -1로 채워짐
+        rows, _ = fuse_rankings(
+            [dense_rows[keep], sparse[0]], weights or self.weights, c=self.c,
+            scores=[dense_scores[keep], sparse[1]], method=self.method,
+        )
+        return [self.row_ids[row] for row in rows[:k]]
+
+    def search_many(self, queries: List[str], k: int = 5, fetch_k: int = None,
+                    weights: Tuple[float, float] = None) -> List[List[str]]:
+        """질의별로 FAISS/BM25 결과를 결합한 상위 k개 chunk_id 목록"""
+        if not queries:
+            return []
+        fetch_k = fetch_k or max(k, self.fetch_k)
+        # BM25는 작업 스레드에서, 질의 임베딩(HTTP 1회) + FAISS 검색(1회)은 현재 스레드에서 동시에 실행
+        try:
+            sparse_future = self._executor.submit(self.sparse_search_many, queries, fetch_k)
+        except RuntimeError:
+            sparse_future = None  # close()된 검색기(인덱스 교체 직후 진행 중인 검색): BM25도 현재 스레드에서 실행
+        rows, scores = self.dense_search_vectors(np.array(self.embed_queries(queries)), fetch_k)
+        sparse_results = sparse_future.result() if sparse_future is not None else self.sparse_search_many(queries, fetch_k)
+        return [
+            self.fuse((rows[i], scores[i]), sparse, k, weights)
+            for i, sparse in enumerate(sparse_results)
+        ]
+
+    def close(self):
+        """BM25 작업 스레드 풀 종료 (이후 검색은 BM25를 호출한 스레드에서 실행)"""
+        self._executor.shutdown(wait=False)
+
+    def search(self, query: str, k: int = 5, fetch_k: int = None,
+               weights: Tuple[float, float] = None) -> List[str]:
+        """FAISS/BM25 동시 검색 후 결합한 상위 k개 chunk_id"""
+        return self.search_many([query], k, fetch_k, weights)[0]
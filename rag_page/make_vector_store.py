@@ -4,15 +4,30 @@
 병무청 AI 상담 시스템 - 벡터스토어 생성 스크립트
 ===============================================
 PDF 문서들을 토큰 기반 청킹으로 처리하여 FAISS 벡터스토어를 생성합니다.
+기본적으로 매니페스트를 비교해 새로 추가/변경/삭제된 PDF만 반영하는 증분 빌드를 수행합니다.
 
 실행 방법:
 - rag-chat 컨테이너에서 실행: python make_vector_store.py
+- 전체 재빌드: python make_vector_store.py --full
+- PDF 추출 워커 수 지정: python make_vector_store.py --workers 8
+- 인덱스 유형 지정: python make_vector_store.py --index-spec "IVF256,PQ64"
+  (Flat, HNSW32, IVF256,Flat, IVF256,PQ64, SQ8 등 faiss.index_factory 문자열, 비교는 benchmark_index.py)
 """
 
+import argparse
+
 from simple_rag_with_pages import SimpleRAGWithPages
 
 def main():
     """벡터스토어 생성 메인 함수"""
+    parser = argparse.ArgumentParser(description="병무청 AI 상담 시스템 벡터스토어 생성")
+    parser.add_argument("--full", action="store_true", help="매니페스트를 무시하고 전체 재빌드")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF 텍스트 병렬 추출 프로세스 수 (기본: PDF_EXTRACT_WORKERS 또는 CPU 수)")
+    parser.add_argument("--index-spec", default=None,
+                        help="FAISS index_factory 문자열 (기본: FAISS_INDEX_SPEC 또는 Flat)")
+    args = parser.parse_args()
+    
     print("=" * 50)
     print("🏗️ 병무청 AI 상담 시스템 - 벡터스토어 생성 시작")
     print("=" * 50)
@@ -21,15 +36,21 @@ def main():
     print("🔄 RAG 시스템 인스턴스 생성 중...")
     rag_system = SimpleRAGWithPages(
         data_path="/app/workspace/data",
-        store_path="/app/shared_data"
+        store_path="/app/shared_data",
+        extract_workers=args.workers
     )
     
     # 벡터스토어 생성
     print("\n🔄 벡터스토어 생성 시작...")
-    vectorstore = rag_system.create_vectorstore(store_name="vector_store")
+    vectorstore = rag_system.create_vectorstore(
+        store_name="vector_store", incremental=not args.full, index_spec=args.index_spec
+    )
     
     if vectorstore:
         print("\n✅ 벡터스토어 생성 완료!")
+        report = rag_system.last_build_report
+        print(f"📊 청크 재사용 {report['reused']}개 / 추가 {report['added']}개 / 삭제 {report['removed']}개 "
+              f"(총 {report['total']}개, 인덱스 {report['index_spec']}, 버전 {report['version'][:12]})")
         print("💡 이제 병무청 AI 상담 시스템을 사용할 수 있습니다.")
     else:
         print("\n❌ 벡터스토어 생성 실패!")
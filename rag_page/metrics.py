@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 지연 시간/토큰 계측 모듈
+=================================
+핵심 기능:
+1. Prometheus 텍스트 형식 히스토그램/카운터 (/metrics, 외부 라이브러리 없이 구현)
+   - 그래프 노드, LLM 호출, 검색, 리랭킹, 요청 전체 소요 시간
+   - LLM 프롬프트/완성 토큰 수, 재시도 횟수
+2. 요청별 트레이스 (request_id 단위 구간 기록, 최근 N개 보관 및 선택적으로 JSON 파일 저장)
+3. LangChain 콜백으로 백엔드별 LLM 토큰 사용량 수집, openai 클라이언트 재시도 로그 집계
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+# 초 단위 기본 구간 (LLM 호출은 수십 초까지 걸릴 수 있음)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """라벨별 누적 구간 카운트/합계를 보관하는 Prometheus 히스토그램"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # 라벨 값 → [구간별 카운트, 합계, 전체 카운트]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Counter:
+    """라벨별 누적 값을 보관하는 Prometheus 카운터"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+REGISTRY: List = []
+
+REQUEST_SECONDS = Histogram("rag_request_seconds", "RAG 요청 전체 처리 시간", ["status"])
+QUEUE_WAIT_SECONDS = Histogram("rag_queue_wait_seconds", "동시 처리 슬롯 대기 시간")
+NODE_SECONDS = Histogram("rag_node_seconds", "그래프 노드별 실행 시간", ["node"])
+LLM_SECONDS = Histogram("rag_llm_call_seconds", "LLM 호출 시간 (재시도 포함, 대기열 제외)", ["backend", "status"])
+LLM_FIRST_TOKEN_SECONDS = Histogram("rag_llm_first_token_seconds", "스트리밍 LLM 호출의 첫 토큰까지 시간", ["backend"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM 토큰 사용량", ["backend", "kind"])
+LLM_RETRIES = Counter("rag_llm_retries_total", "openai 클라이언트 재시도 횟수", ["backend"])
+SEARCH_SECONDS = Histogram("rag_search_seconds", "하이브리드 검색 호출 시간 (배치 포함)", ["kind"])
+RERANK_SECONDS = Histogram("rag_rerank_seconds", "하위 질문별 리랭킹 시간")
+RERANK_DOCUMENTS = Histogram(
+    "rag_rerank_documents", "하위 질문별 리랭킹 문서 수", buckets=(1, 5, 10, 15, 20, 30, 50, 100)
+)
+ANSWER_CACHE_LOOKUPS = Counter("rag_answer_cache_lookups_total", "시맨틱 답변 캐시 조회 수", ["result"])
+CUTOFF_LOOKUPS = Counter("rag_cutoff_lookups_total", "커트라인 구조화 조회 수 (hit: 벡터 검색 생략)", ["result"])
+QUERY_ROUTES = Counter("rag_query_routes_total", "질의 라우터 경로 선택 수", ["route"])
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens", "답변 생성 문맥 토큰 수 (패킹 후)", buckets=(500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000)
+)
+
+
+def render_metrics() -> str:
+    """/metrics 응답 본문 (Prometheus text format 0.0.4)"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class RequestTrace:
+    """요청 하나의 구간(span) 기록"""
+
+    def __init__(self, request_id: str, **attributes):
+        self.request_id = request_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[str] = None
+
+    def offset_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            **self.attributes,
+            "spans": self.spans,
+        }
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+current_backend: ContextVar[Optional[str]] = ContextVar("current_backend", default=None)
+
+
+class TraceStore:
+    """최근 요청 트레이스 보관 (RAG_TRACE_HISTORY개, 0이면 보관 안 함) + 선택적 JSON 파일 저장 (RAG_TRACE_DIR)"""
+
+    def __init__(self, max_size: int = None, trace_dir: str = None):
+        self.max_size = max_size if max_size is not None else int(os.environ.get("RAG_TRACE_HISTORY", 200))
+        self.trace_dir = trace_dir if trace_dir is not None else os.environ.get("RAG_TRACE_DIR", "")
+        self._traces: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: RequestTrace):
+        data = trace.to_dict()
+        if self.max_size > 0:
+            with self._lock:
+                self._traces[trace.request_id] = data
+                while len(self._traces) > self.max_size:
+                    self._traces.popitem(last=False)
+        if self.trace_dir:
+            try:
+                os.makedirs(self.trace_dir, exist_ok=True)
+                with open(os.path.join(self.trace_dir, f"{trace.request_id}.json"), "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                print(f"트레이스 저장 실패: {e}")
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._traces.get(request_id)
+
+
+trace_store = TraceStore()
+
+
+@asynccontextmanager
+async def trace_request(request_id: str = None, **attributes):
+    """요청 트레이스 시작 → 종료 시 전체 시간 기록 및 보관"""
+    trace = RequestTrace(request_id or str(uuid.uuid4()), **attributes)
+    token = current_trace.set(trace)
+    status = "error"
+    try:
+        yield trace
+        status = trace.status or "ok"
+    finally:
+        current_trace.reset(token)
+        trace.duration_ms = trace.offset_ms()
+        trace.status = status
+        REQUEST_SECONDS.observe(trace.duration_ms / 1000, status=status)
+        trace_store.add(trace)
+
+
+def mark_trace_error(message: str):
+    """예외를 처리하고 대체 답변을 반환하는 경우에도 현재 요청을 error로 기록"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.status = "error"
+        trace.attributes["error"] = message
+
+
+@asynccontextmanager
+async def span(name: str, histogram: Histogram = None, labels: Dict = None, **attributes):
+    """구간 소요 시간을 히스토그램과 현재 요청 트레이스에 기록
+
+    yield된 dict에 값을 넣으면 트레이스 구간 속성으로 함께 저장됩니다.
+    labels에서 값이 None인 라벨은 구간 결과(ok | error)로 채웁니다.
+    """
+    trace = current_trace.get()
+    offset = trace.offset_ms() if trace is not None else 0.0
+    start = time.perf_counter()
+    record = dict(attributes)
+    status = "error"
+    try:
+        yield record
+        status = "ok"
+    finally:
+        duration = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(duration, **{k: (status if v is None else v) for k, v in (labels or {}).items()})
+        if trace is not None:
+            trace.spans.append({
+                "name": name, "start_ms": offset, "duration_ms": round(duration * 1000, 1),
+                "status": status, **record,
+            })
+
+
+@asynccontextmanager
+async def llm_span(backend: str, **attributes):
+    """LLM 호출 구간 - rag_llm_call_seconds 기록, 구간 안의 openai 재시도 로그를 이 백엔드로 집계"""
+    token = current_backend.set(backend)
+    try:
+        async with span("llm", LLM_SECONDS, {"backend": backend, "status": None}, backend=backend, **attributes) as record:
+            yield record
+    finally:
+        current_backend.reset(token)
+
+
+def traced_node(name: str, node):
+    """그래프 노드 실행 시간을 rag_node_seconds와 트레이스에 기록하는 래퍼"""
+    async def wrapper(state):
+        async with span(f"node:{name}", NODE_SECONDS, {"node": name}):
+            return await node(state)
+    wrapper.__name__ = getattr(node, "__name__", name)
+    wrapper.__doc__ = node.__doc__
+    return wrapper
+
+
+class LLMTokenCounter(AsyncCallbackHandler):
+    """LLM 응답의 토큰 사용량(usage)을 rag_llm_tokens_total과 현재 요청 트레이스에 누적
+
+    모델(ChatOpenAI)마다 callbacks로 하나씩 붙여 리랭킹 등 모든 호출을 집계합니다.
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+
+    async def on_llm_end(self, response, **kwargs):
+        prompt_tokens = completion_tokens = 0
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens") or 0
+            completion_tokens = usage.get("completion_tokens") or 0
+        else:
+            # 스트리밍 응답은 메시지의 usage_metadata에 담김 (stream_usage=True 필요)
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens") or 0
+                    completion_tokens += metadata.get("output_tokens") or 0
+        LLM_TOKENS.inc(prompt_tokens, backend=self.backend, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, backend=self.backend, kind="completion")
+        trace = current_trace.get()
+        if trace is not None:
+            totals = trace.attributes.setdefault("llm", {}).setdefault(
+                self.backend, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+
+
+class _RetryLogHandler(logging.Handler):
+    """openai 클라이언트의 'Retrying request' 로그를 현재 LLM 백엔드의 재시도로 집계"""
+
+    def emit(self, record: logging.LogRecord):
+        if not record.getMessage().startswith("Retrying request"):
+            return
+        backend = current_backend.get() or "unknown"
+        LLM_RETRIES.inc(backend=backend)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.spans.append({"name": "llm_retry", "start_ms": trace.offset_ms(), "backend": backend})
+
+
+def install_retry_counter():
+    """openai 재시도 로그(INFO)를 받도록 핸들러 등록 (중복 등록 방지)"""
+    logger = logging.getLogger("openai._base_client")
+    if not any(isinstance(handler, _RetryLogHandler) for handler in logger.handlers):
+        logger.addHandler(_RetryLogHandler(level=logging.INFO))
+        if logger.getEffectiveLevel() > logging.INFO:
+            logger.setLevel(logging.INFO)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - PDF 텍스트 추출 모듈
+=================================
+핵심 기능:
+1. 파일/페이지 범위 단위로 나눈 pdfplumber 추출을 프로세스 풀에서 병렬 실행
+2. (파일 해시, 페이지 번호) 단위 페이지 텍스트 캐시 (gzip JSON)
+   → 변경되지 않은 페이지는 재빌드/청킹 실험 시 pdfplumber를 다시 실행하지 않음
+"""
+
+import os
+import gzip
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pdfplumber
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """[start, end) 페이지(1부터) 텍스트 추출 - 프로세스 풀 작업 단위"""
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in range(start, end):
+            text = pdf.pages[page_num - 1].extract_text()
+            results.append((page_num, text or ""))
+    return results
+
+
+def _page_runs(pages: List[int]) -> List[Tuple[int, int]]:
+    """정렬된 페이지 번호 → 연속 구간 [(시작, 끝+1)]"""
+    runs = []
+    for page in pages:
+        if runs and runs[-1][1] == page:
+            runs[-1][1] = page + 1
+        else:
+            runs.append([page, page + 1])
+    return [(start, end) for start, end in runs]
+
+
+class PageTextCache:
+    """파일 해시별 페이지 텍스트 캐시 ({cache_dir}/{file_hash}.json.gz, 일부 페이지만 있을 수 있음)"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{file_hash}.json.gz")
+
+    def load(self, file_hash: str) -> Optional[dict]:
+        """{"total_pages": n, "pages": {"1": "...", ...}} 또는 None (pages에는 추출에 성공한 페이지만)"""
+        path = self._path(file_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"페이지 캐시 로드 실패 ({file_hash[:12]}): {e}")
+            return None
+
+    def save(self, file_hash: str, total_pages: int, pages: Dict[int, str]):
+        """임시 파일에 쓴 뒤 교체해 중간에 중단되어도 캐시가 깨지지 않도록 저장"""
+        path = self._path(file_hash)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {"total_pages": total_pages, "pages": {str(k): v for k, v in pages.items()}},
+                f, ensure_ascii=False, separators=(",", ":")
+            )
+        os.replace(tmp_path, path)
+
+
+class PDFExtractor:
+    """페이지 캐시를 사용하는 병렬 PDF 텍스트 추출기"""
+
+    def __init__(self, cache_dir: str, max_workers: int = None, pages_per_task: int = 16):
+        self.cache = PageTextCache(cache_dir)
+        self.max_workers = max_workers or int(os.environ.get("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+        self.pages_per_task = max(1, pages_per_task)
+
+    def extract(self, files: List[Tuple[str, str]]) -> Tuple[Dict[str, Dict[int, str]], Dict[str, Exception]]:
+        """[(pdf_path, file_hash)] → ({pdf_path: {page_num: text}}, {pdf_path: 오류})"""
+        results = {}
+        errors = {}
+        pending = {}  # pdf_path -> (file_hash, total_pages, 캐시된 페이지)
+        tasks = []
+        for pdf_path, file_hash in files:
+            cached = self.cache.load(file_hash)
+            try:
+                if cached is not None:
+                    total_pages = cached["total_pages"]
+                    pages = {int(k): v for k, v in cached["pages"].items()}
+                else:
+                    with pdfplumber.open(pdf_path) as pdf:
+                        total_pages = len(pdf.pages)
+                    pages = {}
+            except Exception as e:
+                errors[pdf_path] = e
+                continue
+            missing = [p for p in range(1, total_pages + 1) if p not in pages]
+            if not missing:
+                results[pdf_path] = pages
+                continue
+            pending[pdf_path] = (file_hash, total_pages, pages)
+            # 누락된 페이지를 연속 구간으로 묶고, 구간을 pages_per_task 페이지 이하 작업으로 분할 (캐시된 페이지는 다시 추출하지 않음)
+            for run_start, run_end in _page_runs(missing):
+                for start in range(run_start, run_end, self.pages_per_task):
+                    tasks.append((pdf_path, start, min(start + self.pages_per_task, run_end)))
+
+        cached_files = len(results)
+        if tasks:
+            print(f"PDF 텍스트 추출: {len(pending)}개 파일, {len(tasks)}개 작업, 워커 {self.max_workers}개 "
+                  f"(캐시 사용 {cached_files}개 파일)")
+            for (pdf_path, _, _), outcome in zip(tasks, self._run(tasks)):
+                if isinstance(outcome, Exception):
+                    errors.setdefault(pdf_path, outcome)
+                    continue
+                pending[pdf_path][2].update(outcome)
+        elif files:
+            print(f"PDF 텍스트 추출: 전체 {cached_files}개 파일 캐시 사용")
+
+        for pdf_path, (file_hash, total_pages, pages) in pending.items():
+            # 일부 구간이 실패해도 추출된 페이지는 캐시에 병합 저장 (다음 실행은 실패한 페이지만 다시 추출)
+            self.cache.save(file_hash, total_pages, pages)
+            if pdf_path not in errors:
+                results[pdf_path] = pages
+        return results, errors
+
+    def _run(self, tasks: List[Tuple[str, int, int]]) -> List:
+        """작업 실행 - 워커가 1개면 현재 프로세스에서 순차 실행"""
+        if self.max_workers <= 1 or len(tasks) == 1:
+            outcomes = []
+            for task in tasks:
+                try:
+                    outcomes.append(dict(_extract_page_range(*task)))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(_extract_page_range, *task) for task in tasks]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(dict(future.result()))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 질의 라우터 모듈
+=================================
+LLM 호출 없이 키워드/길이 규칙으로 질문 처리 경로를 선택합니다.
+1. fast: 주제가 하나인 짧은 질문 → 재작성/추가 질문/멀티쿼리/리랭킹 없이 하이브리드 검색 → 답변 생성
+2. standard: 대화 맥락이 필요하거나 일반적인 질문 → 재작성 → 멀티쿼리 검색 + 리랭킹 (추가 질문 생성 생략)
+3. deep: 비교/여러 주제/여러 조건 질문 → 재작성 → 추가 질문 생성 → 하위 질문별 검색 + 리랭킹
+QUERY_ROUTER로 고정 경로 지정 가능 (auto | fast | standard | deep | off, off는 모든 질문 deep)
+"""
+
+import os
+import re
+from typing import Tuple
+
+ROUTES = ("fast", "standard", "deep")
+
+# 모집 제도 (두 개 이상 언급되면 제도별 문서를 따로 모아야 하므로 deep)
+PROGRAM_KEYWORDS = (
+    "카투사", "어학병", "동반입대", "연고지", "직계가족", "기술행정병", "전문특기병", "공군", "해군", "해병",
+    "사회복무", "전환복무", "산업기능", "전문연구",
+)
+# 그 밖의 주제어 (제도/주제가 하나인 짧은 질문은 한 번의 검색으로 충분)
+TOPIC_KEYWORDS = PROGRAM_KEYWORDS + (
+    "운전병", "취사병", "조리병", "의무병", "통역병", "정비병", "포병", "전차", "헬기", "화생방", "사이버",
+    "입영", "병역", "신체검사", "예비군",
+)
+# 여러 문서를 모아야 하는 질문 (비교/열거/조건 결합)
+DEEP_PATTERN = re.compile(
+    r"비교|차이|다른\s*점|vs|VS|어느\s*(쪽|것|게)|뭐가\s*더|어떤\s*(게|것이)\s*더|각각|모두|둘\s*다|전부|"
+    r"유리|추천|어떻게\s*해야|준비\s*(방법|과정)|전체\s*(절차|과정)|장단점"
+)
+CONJUNCTION_PATTERN = re.compile(r"그리고|또한|하고\s|이랑|랑\s|및|,|\?.+\?")
+# 이전 대화를 가리키는 표현 (재작성 필요)
+REFERENCE_PATTERN = re.compile(r"(^|\s)(그|이|저|해당|위|앞|거기|그거|그것|이거|이것|그럼|그러면)(\s|$|의|에|은|는|도|거)")
+
+
+class QueryRouter:
+    """규칙 기반 질의 경로 분류기"""
+
+    def __init__(self, mode: str = None, fast_max_chars: int = None):
+        self.mode = (mode or os.environ.get("QUERY_ROUTER", "auto")).lower()
+        if self.mode not in ROUTES + ("auto", "off"):
+            print(f"알 수 없는 라우터 설정 '{self.mode}', auto 사용")
+            self.mode = "auto"
+        self.fast_max_chars = fast_max_chars or int(os.environ.get("ROUTER_FAST_MAX_CHARS", 30))
+
+    def classify(self, question: str, has_history: bool = False) -> Tuple[str, str]:
+        """질문 → (경로, 사유)"""
+        text = question.strip()
+        topics = [keyword for keyword in TOPIC_KEYWORDS if keyword in text]
+        programs = [keyword for keyword in topics if keyword in PROGRAM_KEYWORDS]
+        if self.mode == "off":
+            return ("deep", "라우터 사용 안 함")
+        if self.mode in ROUTES:
+            return (self.mode, "QUERY_ROUTER 고정")
+
+        if DEEP_PATTERN.search(text):
+            return ("deep", "비교/열거/절차 질문")
+        if len(programs) >= 2:
+            return ("deep", f"여러 모집 제도 ({', '.join(programs)})")
+        if len(text) > self.fast_max_chars * 2 or (CONJUNCTION_PATTERN.search(text) and len(text) > self.fast_max_chars):
+            return ("deep", "긴 질문/여러 조건")
+        if has_history and (REFERENCE_PATTERN.search(text) or not topics):
+            return ("standard", "이전 대화 참조 (재작성 필요)")
+        if topics and len(text) <= self.fast_max_chars and not CONJUNCTION_PATTERN.search(text):
+            return ("fast", f"주제어가 있는 짧은 질문 ({', '.join(topics)})")
+        return ("standard", "일반 질문")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 리랭킹 모듈
+=================================
+핵심 기능:
+1. LLM 관련성 점수(1-10) 파싱
+2. 동시성 제한/문서별 타임아웃/조기 종료를 지원하는 비동기 LLM 리랭커
+3. CPU 크로스인코더 리랭커 (한 번의 배치 forward로 모든 후보 평가)
+4. 설정 기반 리랭커 선택 및 실패 시 LLM 리랭커 폴백
+"""
+
+import os
+import re
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_relevance_score(text: str, default: int = 1) -> int:
+    """LLM 출력에서 1-10 사이 점수 추출 ("10"을 1로 읽지 않도록 숫자 단위로 파싱)"""
+    if not text:
+        return default
+    for token in _NUMBER_PATTERN.findall(text):
+        value = float(token)
+        if 1 <= value <= 10:
+            return int(round(value))
+    return default
+
+
+class Reranker(ABC):
+    """리랭커 공통 인터페이스 - score()는 (문서, 1-10 점수) 목록을 반환"""
+
+    name = "base"
+
+    @abstractmethod
+    async def score(self, question: str, documents: List) -> List[Tuple[object, float]]:
+        ...
+
+
+class LLMReranker(Reranker):
+    """semantic_reranking_prompt 체인을 문서별로 동시에 호출하는 리랭커"""
+
+    name = "llm"
+
+    def __init__(self, chain, limiter=None, max_concurrency: int = None, timeout: float = None,
+                 early_stop_count: int = None, min_score: int = 8,
+                 error_score: int = 3, min_chars: int = 10):
+        self.chain = chain
+        self.limiter = limiter  # 백엔드(vllm_8b) 전역 동시성 제한기
+        self.max_concurrency = max_concurrency if max_concurrency is not None \
+            else int(os.environ.get("RERANK_MAX_CONCURRENCY", 8))
+        self.timeout = timeout if timeout is not None else float(os.environ.get("RERANK_TIMEOUT", 30))
+        # min_score 이상 문서가 이만큼 모이면 남은 문서 평가를 중단 (0이면 사용 안 함)
+        # 기본 5: 하위 질문(최대 3개)별 리랭킹 결과가 답변 문맥 최대 문서 수(CONTEXT_MAX_DOCS=15)를 나눠 씀
+        self.early_stop_count = early_stop_count if early_stop_count is not None \
+            else int(os.environ.get("RERANK_EARLY_STOP", 5))
+        self.min_score = min_score
+        self.error_score = error_score  # 실패/타임아웃 시 낮은 기본 점수
+        self.min_chars = min_chars
+
+    async def _invoke(self, content: str, question: str) -> str:
+        """타임아웃은 백엔드 대기열 대기 시간을 제외한 LLM 호출 자체에만 적용"""
+        inputs = {"document": content, "question": question}
+        if self.limiter is None:
+            return await asyncio.wait_for(self.chain.ainvoke(inputs), self.timeout)
+        async with self.limiter.slot():
+            return await asyncio.wait_for(self.chain.ainvoke(inputs), self.timeout)
+
+    async def _score_one(self, semaphore: asyncio.Semaphore, doc, question: str) -> int:
+        content = doc.page_content.strip()
+        # 정말로 빈 문서만 제외(10자 미만)
+        if len(content) < self.min_chars:
+            return 1
+        async with semaphore:
+            try:
+                score_text = await self._invoke(content, question)
+                return parse_relevance_score(score_text)
+            except asyncio.TimeoutError:
+                print(f"리랭킹 타임아웃 ({self.timeout}s)")
+                return self.error_score
+            except Exception as e:
+                print(f"리랭킹 실패: {e}")
+                return self.error_score
+
+    async def score(self, question: str, documents: List) -> List[Tuple[object, int]]:
+        """문서별 (문서, 점수) 목록 반환 - 조기 종료 시 평가되지 않은 문서는 제외"""
+        if not documents:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # 검색 순위 순서대로 시작하므로 상위 문서가 먼저 평가됨
+        tasks = {
+            asyncio.ensure_future(self._score_one(semaphore, doc, question)): doc
+            for doc in documents
+        }
+        relevant = 0
+        try:
+            for next_done in asyncio.as_completed(list(tasks)):
+                score = await next_done
+                if score >= self.min_score:
+                    relevant += 1
+                    if self.early_stop_count and relevant >= self.early_stop_count:
+                        print(f"⏹️ 리랭킹 조기 종료: {self.min_score}점 이상 {relevant}개 확보")
+                        break
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        # as_completed는 완료 순서이므로 원래 검색 순서대로 결과 구성
+        return [
+            (doc, task.result())
+            for task, doc in tasks.items()
+            if task.done() and not task.cancelled()
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    """bge-reranker 계열 크로스인코더로 모든 후보를 CPU 배치 forward 한 번에 평가"""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = None, max_length: int = None, batch_size: int = None,
+                 device: str = "cpu"):
+        # torch는 크로스인코더 사용 시에만 필요
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.torch = torch
+        self.model_name = model_name or os.environ.get("CROSS_ENCODER_MODEL", "BAAI/bge-reranker-v2-m3")
+        self.max_length = max_length or int(os.environ.get("CROSS_ENCODER_MAX_LENGTH", 512))
+        # 후보 수가 이 값 이하이면 한 번의 forward로 처리
+        self.batch_size = batch_size or int(os.environ.get("CROSS_ENCODER_BATCH_SIZE", 64))
+        self.device = device
+        self.tokenizer = self._from_pretrained(AutoTokenizer, self.model_name)
+        self.model = self._from_pretrained(AutoModelForSequenceClassification, self.model_name)
+        self.model.to(self.device)
+        self.model.eval()
+
+    @staticmethod
+    def _from_pretrained(loader, name: str):
+        """로컬 HF 캐시를 우선 사용하고, 없을 때만 다운로드"""
+        try:
+            return loader.from_pretrained(name, local_files_only=True)
+        except OSError:
+            if os.environ.get("HF_HUB_OFFLINE") == "1":
+                raise
+            print(f"로컬 캐시에 모델이 없어 다운로드합니다: {name}")
+            return loader.from_pretrained(name)
+
+    def _predict(self, question: str, contents: List[str]) -> List[float]:
+        """(질문, 문서) 쌍의 logit을 1-10 점수로 변환 (1 + 9 * sigmoid)"""
+        scores = []
+        with self.torch.inference_mode():
+            for start in range(0, len(contents), self.batch_size):
+                batch = contents[start:start + self.batch_size]
+                encoded = self.tokenizer(
+                    [question] * len(batch),
+                    batch,
+                    padding=True,
+                    truncation="only_second",
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                ).to(self.device)
+                logits = self.model(**encoded).logits.view(-1).float()
+                scores.extend((1 + 9 * self.torch.sigmoid(logits)).tolist())
+        return scores
+
+    async def score(self, question: str, documents: List) -> List[Tuple[object, float]]:
+        if not documents:
+            return []
+        contents = [doc.page_content.strip() for doc in documents]
+        # CPU 연산은 이벤트 루프를 막지 않도록 스레드에서 실행
+        scores = await asyncio.to_thread(self._predict, question, contents)
+        return list(zip(documents, scores))
+
+
+class FallbackReranker(Reranker):
+    """기본 리랭커 실패 시 보조 리랭커(LLM)로 다시 평가"""
+
+    def __init__(self, primary: Reranker, fallback: Reranker):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    async def score(self, question: str, documents: List) -> List[Tuple[object, float]]:
+        try:
+            return await self.primary.score(question, documents)
+        except Exception as e:
+            print(f"{self.primary.name} 리랭킹 실패, {self.fallback.name} 리랭커로 폴백: {e}")
+            return await self.fallback.score(question, documents)
+
+
+def create_reranker(llm_reranker: LLMReranker, backend: str = None) -> Reranker:
+    """RERANKER_BACKEND 설정(llm | cross_encoder)에 따라 리랭커 생성"""
+    backend = (backend or os.environ.get("RERANKER_BACKEND", "llm")).lower()
+    if backend == "cross_encoder":
+        try:
+            reranker = CrossEncoderReranker()
+            print(f"크로스인코더 리랭커 로드 완료: {reranker.model_name}")
+            return FallbackReranker(reranker, llm_reranker)
+        except Exception as e:
+            print(f"크로스인코더 리랭커 로드 실패, LLM 리랭커 사용: {e}")
+    elif backend != "llm":
+        print(f"알 수 없는 리랭커 백엔드 '{backend}', LLM 리랭커 사용")
+    return llm_reranker
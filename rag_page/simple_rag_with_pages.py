@@ -4,210 +4,781 @@
 병무청 AI 상담 시스템 - RAG 모듈
 =================================
 핵심 기능:
-1. PDF 문서 → 토큰 기반 청킹 → 임베딩 → FAISS 저장
-2. 하이브리드 검색 (FAISS + BM25)
+1. PDF 문서 → (병렬 추출 + 페이지 캐시) → 토큰 오프셋 기반 구조 인식 청킹(페이지 경계 넘나듦) → 임베딩(디스크 캐시) → FAISS 저장 (매니페스트 기반 증분 빌드)
+2. 하이브리드 검색 (FAISS + 사전 계산된 BM25 희소 인덱스, 동시 실행 후 정수 ID 기반 RRF 결합)
+3. 청크별 고정 ID(chunk_id) 및 출처 메타데이터 사전 계산
+4. 질의 임베딩 / 검색 결과(청크 ID) LRU+TTL 캐시 (인덱스 버전별, 재빌드 시 무효화)
+5. 멀티쿼리 일괄 검색 (fast_search_many)
+6. pickle 없는 벡터스토어 형식 (mmap FAISS 인덱스 + 청크 blob + SQLite 메타데이터, 문서 지연 로딩)
+7. 커트라인 PDF 표 구조화 인덱스 (점수 질문은 벡터 검색 없이 조회)
+8. parent/child 청킹 (작은 청크로 검색, 답변 생성 시 parent 청크로 확장)
 """
 
 import os
 import glob
-import pdfplumber
-from typing import List
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 import warnings
+import numpy as np
 from transformers import AutoTokenizer
 
 warnings.filterwarnings("ignore")
 
 # LangChain imports
 from langchain_community.vectorstores import FAISS
-try:
-    from langchain_ollama import OllamaEmbeddings
-except ImportError:
-    from langchain_community.embeddings import OllamaEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.schema import Document
-from langchain_community.retrievers.bm25 import BM25Retriever
-from langchain.retrievers.ensemble import EnsembleRetriever
 from langchain_experimental.text_splitter import SemanticChunker
 
+from pdf_extractor import PDFExtractor
+from chunker import TokenChunker, ParentStore
+from embedding_cache import CachedOllamaEmbeddings
+from sparse_index import SparseBM25Index
+from cutoff_index import CutoffIndex, format_cutoff_row
+from hybrid_search import HybridSearcher
+from vector_index import DEFAULT_INDEX_SPEC, build_faiss_index, supports_removal, apply_search_params, describe_index
+from vector_store_io import load_vectorstore, save_vectorstore, is_mmap_format
+
+# 파일 해시와 청크 ID 목록을 기록하는 빌드 매니페스트 (벡터스토어 폴더에 저장)
+MANIFEST_FILE = "manifest.json"
+# 기본 청킹 설정 (bge-m3 토큰 수) - 매니페스트에 기록해 설정 변경 시 전체 재빌드
+# mode: flat(청크 하나로 검색/답변) | parent(size 크기 child로 검색, parent_size 크기 parent로 답변)
+DEFAULT_CHUNKING = {"engine": "tokens", "size": 512, "overlap": 64, "mode": "flat", "parent_size": 2048}
+# 청킹 설정이 기록되지 않은 이전 빌드 (페이지별 문자 분할)
+LEGACY_CHUNKING = {"size": 3000, "overlap": 300}
+
+
+def make_chunk_id(source: str, pages: List[int], chunk_index: int, content: str) -> str:
+    """파일명/페이지/청크 순번/내용으로 만든 고정 청크 ID (재빌드해도 동일)"""
+    key = f"{source}\x00{','.join(map(str, pages))}\x00{chunk_index}\x00{content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def load_tokenizer(name_or_path: str = None):
+    """bge-m3 토크나이저 로드 - TOKENIZER_PATH 또는 로컬 HF 캐시를 우선 사용하고, 없을 때만 다운로드"""
+    name_or_path = name_or_path or os.environ.get("TOKENIZER_PATH", "BAAI/bge-m3")
+    try:
+        return AutoTokenizer.from_pretrained(name_or_path, local_files_only=True)
+    except OSError:
+        if os.environ.get("HF_HUB_OFFLINE") == "1":
+            raise
+        print(f"로컬 캐시에 토크나이저가 없어 다운로드합니다: {name_or_path}")
+        return AutoTokenizer.from_pretrained(name_or_path)
+
+
+class LRUCache:
+    """스레드 안전 LRU + TTL 캐시 (적중/미스 횟수 기록)"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (저장 시각, 값)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def build_source_info(metadata: dict) -> dict:
+    """메타데이터에서 출처 정보(파일명, 페이지 표기, 인용문) 생성"""
+    # 파일명 처리
+    source = metadata.get('source', '알 수 없음')
+    if isinstance(source, str):
+        # 경로에서 파일명만 추출하고 확장자 제거
+        file_name = os.path.basename(source)
+        if '.' in file_name:
+            file_name = file_name.rsplit('.', 1)[0]
+    else:
+        file_name = str(source)
+
+    # 페이지 정보 정확히 추출
+    pages = metadata.get('pages', [])
+    primary_page = metadata.get('primary_page', None)
+    page_span = metadata.get('page_span', None)
+
+    # 페이지 정보 우선순위: pages > primary_page > page_span
+    if isinstance(pages, (list, tuple)) and pages:
+        if len(pages) == 1:
+            page_info = f"p.{pages[0]}"
+        else:
+            page_info = f"p.{min(pages)}-{max(pages)}"
+    elif primary_page and primary_page != '?' and primary_page != 0:
+        page_info = f"p.{primary_page}"
+    elif page_span and page_span != '?' and page_span != '0':
+        page_info = f"p.{page_span}"
+    else:
+        page_info = ""
+
+    source_citation = f"[출처: {file_name} {page_info}]" if page_info else f"[출처: {file_name}]"
+
+    return {
+        'file_name': file_name,
+        'page_info': page_info,
+        'source_citation': source_citation,
+        'pages': list(pages) if isinstance(pages, (list, tuple)) else pages,
+        'primary_page': primary_page,
+        'chunk_index': metadata.get('chunk_index', ''),
+        'total_chunks': metadata.get('total_chunks', ''),
+        'original_source': source
+    }
+
+
 class SimpleRAGWithPages:
     """병무청 AI 상담을 위한 토큰 기반 RAG 시스템"""
     
-    def __init__(self, data_path: str = "/app/workspace/data", store_path: str = "/app/shared_data"):
+    def __init__(self, data_path: str = "/app/workspace/data", store_path: str = "/app/shared_data",
+                 extract_workers: int = None, chunk_size: int = None, chunk_overlap: int = None,
+                 chunk_mode: str = None, parent_size: int = None, embedding_cache_dir: str = None):
         self.data_path = data_path
         self.store_path = store_path
         os.makedirs(self.store_path, exist_ok=True)
+        # 청킹 설정 (토큰 수, 환경변수: CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MODE, CHUNK_PARENT_SIZE)
+        # - 바뀌면 다음 빌드는 전체 재빌드
+        self.chunking = {
+            "engine": DEFAULT_CHUNKING["engine"],
+            "size": chunk_size or int(os.environ.get("CHUNK_SIZE", DEFAULT_CHUNKING["size"])),
+            "overlap": chunk_overlap if chunk_overlap is not None
+            else int(os.environ.get("CHUNK_OVERLAP", DEFAULT_CHUNKING["overlap"])),
+            "mode": (chunk_mode or os.environ.get("CHUNK_MODE", DEFAULT_CHUNKING["mode"])).lower(),
+            "parent_size": parent_size or int(os.environ.get("CHUNK_PARENT_SIZE", DEFAULT_CHUNKING["parent_size"])),
+        }
+        
+        # PDF 병렬 추출기 (페이지 텍스트 캐시: {store_path}/page_cache)
+        self.pdf_extractor = PDFExtractor(
+            cache_dir=os.path.join(self.store_path, "page_cache"),
+            max_workers=extract_workers
+        )
         
-        # 임베딩 모델
-        self.embedding = OllamaEmbeddings(
+        # 임베딩 모델 (배치/동시 요청 + 문서 임베딩 디스크 캐시: 기본 {store_path}/embedding_cache)
+        self.embedding = CachedOllamaEmbeddings(
             model="bge-m3:latest",
-            base_url="http://ollama:11434"
+            base_url=os.environ.get("OLLAMA_URL", "http://ollama:11434"),
+            cache_dir=embedding_cache_dir or os.path.join(self.store_path, "embedding_cache")
         )
         
-        # BGE M3 토크나이저 (토큰 기반 청킹용)
-        self.tokenizer = AutoTokenizer.from_pretrained("BAAI/bge-m3")
+        # BGE M3 토크나이저 (토큰 기반 청킹 / BM25 용어, 로컬 캐시 우선)
+        self.tokenizer = load_tokenizer()
+        self.chunker = TokenChunker(
+            self.tokenizer, self.chunking["size"], self.chunking["overlap"],
+            self.chunking["mode"], self.chunking["parent_size"]
+        )
+        
+        # 로드된 검색 인덱스 (vectorstore, bm25_index, parent_store, cutoff_index, hybrid_searcher, version, ...)
+        # - 다시 로드할 때는 새 dict를 모두 만든 뒤 한 번에 교체 (검색은 시작 시점의 dict 하나만 사용)
+        self._index = None
+        self.last_build_report = None
+        self._bm25_skip_ids = None
         
-        # 검색기들
-        self.vectorstore = None
-        self.bm25_retriever = None
-        self.faiss_retriever = None
-        self.ensemble_retriever = None
-        self.is_loaded = False
+        # 검색 캐시: 질의 → 임베딩, (질의, k, 인덱스 버전) → 순위별 chunk_id
+        cache_size = int(os.environ.get("SEARCH_CACHE_SIZE", 2048))
+        cache_ttl = float(os.environ.get("SEARCH_CACHE_TTL", 3600))
+        self.query_embedding_cache = LRUCache(cache_size, cache_ttl)
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+        # 다른 프로세스(make_vector_store.py)의 재빌드를 감지하기 위한 매니페스트 확인 주기(초)
+        self.index_check_interval = float(os.environ.get("INDEX_CHECK_INTERVAL", 30))
+        self._last_index_check = 0.0
+        self._reload_lock = threading.Lock()
         
+    @property
+    def is_loaded(self) -> bool:
+        return self._index is not None
+
+    @property
+    def vectorstore(self):
+        return self._index["vectorstore"] if self._index else None
+
+    @property
+    def bm25_index(self):
+        return self._index["bm25_index"] if self._index else None
+
+    @property
+    def cutoff_index(self):
+        return self._index["cutoff_index"] if self._index else None
+
+    @property
+    def parent_store(self):
+        return self._index["parent_store"] if self._index else None
+
+    @property
+    def hybrid_searcher(self):
+        return self._index["hybrid_searcher"] if self._index else None
+
+    @property
+    def index_version(self):
+        return self._index["version"] if self._index else None
+
+    @property
+    def store_name(self):
+        return self._index["store_name"] if self._index else None
+
     def count_tokens(self, text: str) -> int:
         """텍스트의 토큰 수 계산"""
         return len(self.tokenizer.encode(text, add_special_tokens=False))
     
-    def create_vectorstore(self, store_name: str = "vector_store"):
-        """PDF 문서를 토큰 기반 청킹으로 처리하여 벡터스토어 생성"""
+    def bm25_terms(self, text: str) -> List[int]:
+        """BM25 용어: bge-m3 서브워드 ID (공백/구두점만으로 된 조각 제외)"""
+        if self._bm25_skip_ids is None:
+            self._bm25_skip_ids = {
+                token_id for token, token_id in self.tokenizer.get_vocab().items()
+                if not any(ch.isalnum() for ch in token)
+            }
+        return [
+            token_id for token_id in self.tokenizer.encode(text, add_special_tokens=False)
+            if token_id not in self._bm25_skip_ids
+        ]
+
+    def build_bm25_index(self, docstore: dict) -> SparseBM25Index:
+        """docstore 전체 청크로 BM25 희소 인덱스 생성"""
+        return SparseBM25Index.build(
+            [(chunk_id, self.bm25_terms(doc.page_content)) for chunk_id, doc in docstore.items()]
+        )
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        """파일 내용의 SHA-256 해시"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load_pdf_pages(self, files: List[Tuple[str, str]]) -> Tuple[Dict[str, List[Document]], Dict[str, Exception]]:
+        """[(pdf_path, file_hash)]를 페이지 단위 Document 목록으로 변환 (병렬 추출 + 페이지 캐시)"""
+        pages_by_file, errors = self.pdf_extractor.extract(files)
+        documents = {}
+        for pdf_path, pages in pages_by_file.items():
+            file_name = os.path.basename(pdf_path)
+            documents[pdf_path] = [
+                Document(
+                    page_content=pages[page_num].strip(),
+                    metadata={
+                        "source": file_name,
+                        "page": page_num,
+                        "total_pages": len(pages)
+                    }
+                )
+                for page_num in sorted(pages)
+                if pages[page_num] and pages[page_num].strip()
+            ]
+            print(f"{file_name}: {len(pages)}페이지 처리 완료")
+        return documents, errors
+
+    def split_documents(self, page_documents: List[Document]) -> Tuple[List[Document], List[Document]]:
+        """한 파일의 페이지 문서를 토큰 오프셋 기반으로 청킹하고 청크 ID/출처 메타데이터 부여 → (검색용 청크, parent 청크)"""
+        chunks, parents = self.chunker.split(page_documents)
+        for chunk in parents + chunks:
+            # 고정 청크 ID와 출처 정보를 인덱스 생성 시 한 번만 계산해 저장
+            chunk.metadata["chunk_id"] = make_chunk_id(
+                chunk.metadata["source"], chunk.metadata["pages"], chunk.metadata["chunk_index"], chunk.page_content
+            )
+            self._attach_source_info(chunk.metadata)
+        for chunk in chunks:
+            if "parent_index" in chunk.metadata:
+                chunk.metadata["parent_id"] = parents[chunk.metadata.pop("parent_index")].metadata["chunk_id"]
+        return chunks, parents
+
+    @staticmethod
+    def load_manifest(save_path: str) -> Optional[dict]:
+        """빌드 매니페스트(파일 해시 -> 청크 ID 목록) 로드"""
+        manifest_path = os.path.join(save_path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"매니페스트 로드 실패, 전체 재빌드: {e}")
+            return None
+
+    @staticmethod
+    def save_manifest(save_path: str, files: dict, index_spec: str = DEFAULT_INDEX_SPEC,
+                      chunking: dict = None) -> dict:
+        """빌드 매니페스트 저장 - version은 전체 청크 ID 집합과 인덱스 유형의 해시"""
+        all_ids = sorted(chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"])
+        manifest = {
+            "version": hashlib.sha1("\n".join([index_spec] + all_ids).encode("utf-8")).hexdigest(),
+            "built_at": datetime.now().isoformat(),
+            "index_spec": index_spec,
+            "chunking": chunking or DEFAULT_CHUNKING,
+            "files": files
+        }
+        # 검색 프로세스가 쓰는 도중의 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체
+        manifest_path = os.path.join(save_path, MANIFEST_FILE)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return manifest
+
+    def create_vectorstore(self, store_name: str = "vector_store", incremental: bool = True,
+                           index_spec: str = None):
+        """PDF 문서를 토큰 기반 청킹으로 처리하여 벡터스토어 생성
+
+        incremental=True면 매니페스트와 비교해 새로 추가/변경된 파일만 파싱·임베딩하고,
+        삭제된 파일의 청크는 FAISS 인덱스와 docstore에서 제거합니다.
+        index_spec은 faiss.index_factory 문자열(Flat, HNSW32, IVF256,PQ64, SQ8 등, 기본 FAISS_INDEX_SPEC)이며
+        기존 빌드와 다르거나 삭제를 지원하지 않는 인덱스(HNSW)에서 청크를 지워야 하면 전체 재빌드합니다.
+        """
+        index_spec = index_spec or os.environ.get("FAISS_INDEX_SPEC", DEFAULT_INDEX_SPEC)
         # PDF 파일 수집
-        pdf_files = glob.glob(os.path.join(self.data_path, "*.pdf"))
+        pdf_files = sorted(glob.glob(os.path.join(self.data_path, "*.pdf")))
         if not pdf_files:
             print(f"{self.data_path}에 PDF 파일이 없습니다!")
             return None
             
         print(f"처리할 PDF 파일: {len(pdf_files)}개")
+        save_path = os.path.join(self.store_path, store_name)
         
-        # 모든 문서 수집
-        all_documents = []
+        # 기존 빌드 결과 로드 (매니페스트가 없으면 전체 재빌드)
+        vectorstore = None
+        old_files = {}
+        manifest = self.load_manifest(save_path) if incremental else None
+        if manifest is not None and manifest.get("index_spec", DEFAULT_INDEX_SPEC) != index_spec:
+            print(f"인덱스 유형 변경 ({manifest.get('index_spec', DEFAULT_INDEX_SPEC)} → {index_spec}), 전체 재빌드")
+            manifest = None
+        if manifest is not None and manifest.get("chunking", LEGACY_CHUNKING) != self.chunking:
+            print(f"청킹 설정 변경 ({manifest.get('chunking', LEGACY_CHUNKING)} → {self.chunking}), 전체 재빌드")
+            manifest = None
+        if manifest is not None:
+            try:
+                vectorstore = load_vectorstore(save_path, self.embedding, lazy=False)
+                old_files = manifest.get("files", {})
+            except Exception as e:
+                print(f"기존 벡터스토어 로드 실패, 전체 재빌드: {e}")
         
+        # 파일 해시 비교
+        current_files = {}
         for pdf_path in pdf_files:
-            file_name = os.path.basename(pdf_path)
-            print(f"처리 중: {file_name}")
-            
+            current_files[os.path.basename(pdf_path)] = (pdf_path, self.file_hash(pdf_path))
+        removed_files = [name for name in old_files if name not in current_files]
+        changed_files = [
+            name for name, (_, digest) in current_files.items()
+            if old_files.get(name, {}).get("sha256") != digest
+        ]
+        print(f"변경 사항: 신규/변경 {len(changed_files)}개, 삭제 {len(removed_files)}개, "
+              f"유지 {len(current_files) - len(changed_files)}개 파일")
+        
+        existing_ids = set(vectorstore.docstore._dict.keys()) if vectorstore is not None else set()
+        files = {name: old_files[name] for name in current_files if name not in changed_files}
+        reused = sum(len(entry["chunk_ids"]) for entry in files.values())
+        
+        # 신규/변경 파일만 파싱 및 청킹 (페이지 텍스트는 병렬 추출 + 캐시)
+        page_documents, extract_errors = self.load_pdf_pages([current_files[name] for name in changed_files])
+        new_chunks = []
+        new_parents = []
+        for name in changed_files:
+            pdf_path, digest = current_files[name]
             try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    for page_num, page in enumerate(pdf.pages, 1):
-                        text = page.extract_text()
-                        if text and text.strip():
-                            doc = Document(
-                                page_content=text.strip(),
-                                metadata={
-                                    "source": file_name,
-                                    "page": page_num,
-                                    "total_pages": len(pdf.pages)
-                                }
-                            )
-                            all_documents.append(doc)
-                            
-                print(f"{file_name}: {len(pdf.pages)}페이지 처리 완료")
+                if pdf_path in extract_errors:
+                    raise extract_errors[pdf_path]
+                chunks, parents = self.split_documents(page_documents[pdf_path])
             except Exception as e:
-                print(f"{file_name} 처리 중 오류: {e}")
+                print(f"{name} 처리 중 오류: {e}")
+                if name in old_files:
+                    # 처리 실패 시 이전 빌드의 청크를 그대로 유지
+                    files[name] = old_files[name]
+                    reused += len(old_files[name]["chunk_ids"])
                 continue
+            files[name] = {"sha256": digest, "chunk_ids": [c.metadata["chunk_id"] for c in chunks]}
+            new_parents.extend(parents)
+            for chunk in chunks:
+                if chunk.metadata["chunk_id"] in existing_ids:
+                    reused += 1  # 같은 내용의 청크는 임베딩 재사용
+                else:
+                    new_chunks.append(chunk)
+        
+        # 더 이상 어떤 파일에도 속하지 않는 청크 삭제
+        kept_ids = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+        stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in kept_ids]
         
-        if not all_documents:
+        if vectorstore is None and not new_chunks:
             print("처리된 문서가 없습니다!")
             return None
-            
-        print(f"총 {len(all_documents)}개 페이지 문서 생성")
-        
-        # 재귀적 텍스트 분할기를 사용한 고정 크기 청킹
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=3000,
-            chunk_overlap=300,
-            length_function=self.count_tokens,
-            separators=["\n\n", "\n", " ", ""]
-        )
         
-        # 문서 청킹
-        all_chunks = []
-        for doc in all_documents:
-            chunks = text_splitter.split_documents([doc])
-            for chunk in chunks:
-                # 메타데이터 업데이트
-                chunk.metadata.update({
-                    "pages": [doc.metadata["page"]],
-                    "primary_page": doc.metadata["page"]
-                })
-                all_chunks.append(chunk)
-        
-        print(f"총 {len(all_chunks)}개 청크 생성")
-        
-        # FAISS 벡터스토어 생성
-        print("벡터스토어 생성 중...")
-        vectorstore = FAISS.from_documents(
-            documents=all_chunks,
-            embedding=self.embedding
-        )
+        if stale_ids:
+            if not supports_removal(vectorstore.index):
+                print(f"{index_spec} 인덱스는 청크 삭제를 지원하지 않아 전체 재빌드합니다. (임베딩은 캐시 사용)")
+                return self.create_vectorstore(store_name, incremental=False, index_spec=index_spec)
+            vectorstore.delete(ids=stale_ids)
+        if new_chunks:
+            # FAISS 벡터스토어 생성/추가 (docstore ID = chunk_id)
+            print(f"임베딩 중: {len(new_chunks)}개 청크...")
+            ids = [chunk.metadata["chunk_id"] for chunk in new_chunks]
+            if vectorstore is None:
+                vectorstore = self._new_vectorstore(new_chunks, ids, index_spec)
+            else:
+                vectorstore.add_documents(new_chunks, ids=ids)
         
-        # 저장
-        save_path = os.path.join(self.store_path, store_name)
-        vectorstore.save_local(save_path)
-        print(f"벡터스토어 저장 완료: {save_path}")
+        # 저장 (BM25 인덱스는 IDF가 전체 문서 기준이므로 매 빌드마다 전체 재계산, 매니페스트는 마지막에 기록)
+        save_vectorstore(vectorstore, save_path)
+        self.build_bm25_index(vectorstore.docstore._dict).save(save_path)
+        self.build_parent_store(vectorstore.docstore._dict, new_parents, save_path, incremental)
+        self.build_cutoff_index(current_files, save_path, incremental)
+        manifest = self.save_manifest(save_path, files, index_spec, self.chunking)
+        self.result_cache.clear()
+        self.last_build_report = {
+            "version": manifest["version"],
+            "index_spec": index_spec,
+            "reused": reused,
+            "added": len(new_chunks),
+            "removed": len(stale_ids),
+            "total": len(vectorstore.docstore._dict)
+        }
+        print(f"벡터스토어 저장 완료: {save_path} ({describe_index(vectorstore.index)})")
+        print(f"청크 재사용 {reused}개, 추가 {len(new_chunks)}개, 삭제 {len(stale_ids)}개 "
+              f"(총 {self.last_build_report['total']}개)")
         
         return vectorstore
     
+    def _new_vectorstore(self, chunks: List[Document], ids: List[str], index_spec: str) -> FAISS:
+        """index spec으로 FAISS 인덱스를 만들어 청크 벡터로 학습한 뒤 벡터스토어 생성"""
+        texts = [chunk.page_content for chunk in chunks]
+        embeddings = self.embedding.embed_documents(texts)
+        index = build_faiss_index(index_spec, np.array(embeddings, dtype=np.float32))
+        vectorstore = FAISS(
+            embedding_function=self.embedding,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        vectorstore.add_embeddings(
+            list(zip(texts, embeddings)),
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=ids
+        )
+        return vectorstore
+
+    @staticmethod
+    def build_parent_store(docstore: dict, new_parents: List[Document], save_path: str, incremental: bool = True):
+        """현재 청크가 가리키는 parent 청크를 parents.sqlite로 저장 (유지된 파일의 parent는 이전 빌드에서 재사용)"""
+        parents = {parent.metadata["chunk_id"]: parent for parent in new_parents}
+        referenced = {doc.metadata.get("parent_id") for doc in docstore.values()} - {None}
+        missing = referenced - parents.keys()
+        if missing and incremental:
+            try:
+                previous = ParentStore.load(save_path)
+                parents.update(previous.get_many(missing))
+                previous.close()
+            except FileNotFoundError:
+                pass
+        ParentStore.save(save_path, [parents[parent_id] for parent_id in sorted(referenced) if parent_id in parents])
+        if referenced:
+            print(f"parent 청크 저장 완료: {len(referenced)}개")
+
+    @staticmethod
+    def build_cutoff_index(files: Dict[str, Tuple[str, str]], save_path: str, incremental: bool = True):
+        """커트라인 PDF 표를 구조화 인덱스(cutoffs.sqlite)로 저장 (해시가 같은 파일은 이전 빌드의 행 재사용)"""
+        previous = None
+        if incremental:
+            try:
+                previous = CutoffIndex.load(save_path)
+            except Exception:
+                previous = None
+        cutoff_index = CutoffIndex.build(files, previous)
+        cutoff_index.save(save_path)
+        stats = cutoff_index.stats()
+        print(f"커트라인 인덱스 저장 완료: {stats['files']}개 파일, {stats['rows']}행, 특기 {stats['specialties']}개")
+        return cutoff_index
+
+    @staticmethod
+    def _attach_source_info(metadata: dict):
+        """출처 표기용 필드(file_name, page_info, source_citation)를 메타데이터에 추가"""
+        source_info = build_source_info(metadata)
+        metadata["file_name"] = source_info["file_name"]
+        metadata["page_info"] = source_info["page_info"]
+        metadata["source_citation"] = source_info["source_citation"]
+
     def load_retriever(self, store_name: str = "vector_store"):
         """벡터스토어 로드 및 검색기 초기화"""
         if self.is_loaded:
             return True
-            
+        index = self._load_index(store_name)
+        if index is None:
+            return False
+        self._index = index
+        self.result_cache.clear()
+        return True
+
+    def _load_index(self, store_name: str) -> Optional[dict]:
+        """벡터스토어/BM25/parent/커트라인 인덱스와 하이브리드 검색기를 새로 로드한 dict (실패 시 None)"""
         store_path = os.path.join(self.store_path, store_name)
         if not os.path.exists(store_path):
             print(f"벡터스토어를 찾을 수 없습니다: {store_path}")
-            return False
+            return None
         
         try:
-            # FAISS 로드
-            self.vectorstore = FAISS.load_local(
-                store_path,
-                self.embedding,
-                allow_dangerous_deserialization=True
-            )
+            # 매니페스트 수정 시각은 먼저 읽음 (로드 중 재빌드되면 다음 확인 때 다시 로드)
+            manifest_mtime = self._read_manifest_mtime(store_path)
             
-            # 검색기 설정
-            self.faiss_retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 10}
-            )
+            # FAISS 로드 (인덱스는 mmap, 문서는 검색 결과로 쓰일 때만 읽음)
+            vectorstore = load_vectorstore(store_path, self.embedding, lazy=True)
             
-            # BM25 검색기 초기화
-            documents = [doc.page_content for doc in self.vectorstore.docstore._dict.values()]
-            self.bm25_retriever = BM25Retriever.from_texts(
-                documents,
-                metadatas=[doc.metadata for doc in self.vectorstore.docstore._dict.values()]
-            )
-            self.bm25_retriever.k = 10
+            # 근사 검색 인덱스의 검색 파라미터(IVF nprobe, HNSW efSearch) 적용
+            apply_search_params(vectorstore.index)
+            
+            # 이전 형식(pickle) 벡터스토어: chunk_id/출처 정보를 로드 시 한 번만 채움 (docstore ID를 chunk_id로 사용)
+            if not is_mmap_format(store_path):
+                print("이전 형식(pickle) 벡터스토어입니다. make_vector_store.py로 재빌드하면 mmap 형식으로 저장됩니다.")
+                for doc_id, doc in vectorstore.docstore._dict.items():
+                    if "chunk_id" not in doc.metadata:
+                        doc.metadata["chunk_id"] = doc_id
+                    if "source_citation" not in doc.metadata:
+                        self._attach_source_info(doc.metadata)
             
-            # 앙상블 검색기
-            self.ensemble_retriever = EnsembleRetriever(
-                retrievers=[self.faiss_retriever, self.bm25_retriever],
-                weights=[0.6, 0.4]  # FAISS 60%, BM25 40%
+            # BM25 인덱스 초기화 (빌드 시 저장된 희소 인덱스 로드)
+            docstore = vectorstore.docstore._dict
+            bm25_index = None
+            try:
+                bm25_index = SparseBM25Index.load(store_path)
+                if len(bm25_index) != len(docstore) or any(doc_id not in docstore for doc_id in bm25_index.doc_ids):
+                    print("BM25 인덱스가 벡터스토어와 일치하지 않아 다시 생성합니다.")
+                    bm25_index = None
+            except FileNotFoundError:
+                print("저장된 BM25 인덱스가 없어 메모리에서 생성합니다. (make_vector_store.py로 재빌드 권장)")
+            if bm25_index is None:
+                bm25_index = self.build_bm25_index(docstore)
+            
+            # parent 청크 저장소 (parent 모드로 빌드된 경우에만 사용)
+            try:
+                parent_store = ParentStore.load(store_path)
+                parent_store = parent_store if len(parent_store) else None
+            except FileNotFoundError:
+                parent_store = None
+            
+            # 커트라인 구조화 인덱스 (없으면 점수 질문도 일반 검색으로 처리)
+            try:
+                cutoff_index = CutoffIndex.load(store_path)
+            except FileNotFoundError:
+                cutoff_index = None
+                print("커트라인 인덱스가 없습니다. (make_vector_store.py로 재빌드하면 점수 질문 구조화 조회 사용)")
+            
+            # 하이브리드 검색기 (기본 가중치 FAISS 60%, BM25 40%)
+            index_to_id = vectorstore.index_to_docstore_id
+            hybrid_searcher = HybridSearcher(
+                faiss_index=vectorstore.index,
+                row_ids=[index_to_id[row] for row in range(len(index_to_id))],
+                bm25_index=bm25_index,
+                embed_queries=self.embed_queries,
+                tokenize=self.bm25_terms,
+                normalize_l2=vectorstore._normalize_L2
             )
             
-            self.is_loaded = True
-            print(f"검색기 로드 완료: {store_name}")
-            return True
+            # 인덱스 버전: 매니페스트 버전 (이전 형식이면 docstore ID 집합의 해시)
+            manifest = self.load_manifest(store_path)
+            if manifest is not None:
+                version = manifest["version"]
+            else:
+                all_ids = sorted(vectorstore.docstore._dict.keys())
+                version = hashlib.sha1("\n".join(all_ids).encode("utf-8")).hexdigest()
+            self._last_index_check = time.monotonic()
+            print(f"검색기 로드 완료: {store_name} (인덱스 버전 {version[:12]})")
+            return {
+                "vectorstore": vectorstore,
+                "bm25_index": bm25_index,
+                "parent_store": parent_store,
+                "cutoff_index": cutoff_index,
+                "hybrid_searcher": hybrid_searcher,
+                "version": version,
+                "store_name": store_name,
+                "manifest_mtime": manifest_mtime,
+            }
             
         except Exception as e:
             print(f"검색기 로드 실패: {e}")
-            return False
+            return None
     
-    def search(self, query: str, k: int = 5):
-        """하이브리드 검색 수행"""
+    @staticmethod
+    def _read_manifest_mtime(store_path: str) -> Optional[float]:
+        manifest_path = os.path.join(store_path, MANIFEST_FILE)
+        return os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+
+    def refresh_if_stale(self):
+        """index_check_interval마다 매니페스트를 확인해 재빌드되었으면 검색기를 다시 로드
+
+        새 인덱스를 모두 로드한 뒤 한 번에 교체하므로, 로드 중에도 기존 인덱스로 계속 검색합니다.
+        """
+        now = time.monotonic()
+        if not self.index_check_interval or now - self._last_index_check < self.index_check_interval:
+            return
+        self._last_index_check = now
+        current = self._index
+        store_path = os.path.join(self.store_path, current["store_name"])
+        if self._read_manifest_mtime(store_path) == current["manifest_mtime"]:
+            return
+        with self._reload_lock:
+            current = self._index
+            if self._read_manifest_mtime(store_path) == current["manifest_mtime"]:
+                return
+            print("벡터스토어 재빌드 감지, 검색기를 다시 로드합니다.")
+            index = self._load_index(current["store_name"])
+            if index is None:
+                return  # 다시 로드 실패 시 기존 인덱스로 계속 검색 (다음 확인 때 재시도)
+            self._index = index
+            self.result_cache.clear()
+            # 이전 인덱스의 BM25 작업 스레드 풀 종료 (진행 중인 검색은 현재 스레드에서 마저 실행)
+            current["hybrid_searcher"].close()
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """질의 임베딩 (메모리 캐시 → Ollama 순, 캐시에 없는 질의는 한 번에 배치 요청하고 디스크 캐시에는 쓰지 않음)"""
+        embeddings = {query: self.query_embedding_cache.get(query) for query in dict.fromkeys(queries)}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if missing:
+            for query, embedding in zip(missing, self.embedding.embed_queries(missing)):
+                self.query_embedding_cache.put(query, embedding)
+                embeddings[query] = embedding
+        return [embeddings[query] for query in queries]
+
+    def search_many(self, queries: List[str], k: int = 5, fetch_k: int = None,
+                    weights: Tuple[float, float] = None, dedupe: bool = True) -> List[List[Document]]:
+        """여러 질의를 한 번에 하이브리드 검색 (결과는 질의별로 인덱스 버전별 캐시)
+
+        fetch_k: FAISS/BM25 각각의 후보 수 (기본 max(k, HYBRID_FETCH_K))
+        weights: (FAISS, BM25) 결합 가중치 (기본 HYBRID_WEIGHTS)
+        dedupe: 앞선 질의 결과에 이미 나온 청크는 뒤 질의 결과에서 제외
+        """
         if not self.is_loaded:
             print("검색기가 로드되지 않았습니다.")
-            return []
+            return [[] for _ in queries]
         
         try:
-            # 앙상블 검색
-            results = self.ensemble_retriever.get_relevant_documents(query)
+            self.refresh_if_stale()
+            # 검색 도중 다시 로드되어도 같은 세대의 인덱스만 사용
+            index = self._index
+            docstore = index["vectorstore"].docstore._dict
+            chunk_ids_by_query = {}
+            missing = []
+            for query in dict.fromkeys(queries):
+                chunk_ids = self.result_cache.get((query, k, fetch_k, weights, index["version"]))
+                if chunk_ids is None:
+                    missing.append(query)
+                else:
+                    chunk_ids_by_query[query] = chunk_ids
+            
+            # 캐시에 없는 질의만 FAISS/BM25 일괄 검색 → 정수 ID로 결합 → 상위 k개만 문서로 변환
+            if missing:
+                for query, chunk_ids in zip(missing, index["hybrid_searcher"].search_many(missing, k, fetch_k, weights)):
+                    self.result_cache.put((query, k, fetch_k, weights, index["version"]), chunk_ids)
+                    chunk_ids_by_query[query] = chunk_ids
             
-            # 결과 제한
-            if len(results) > k:
-                results = results[:k]
-                
-            print(f"검색 결과: {len(results)}개 문서")
+            results = []
+            seen = set()
+            for query in queries:
+                chunk_ids = [
+                    chunk_id for chunk_id in chunk_ids_by_query[query]
+                    if chunk_id in docstore and not (dedupe and chunk_id in seen)
+                ]
+                seen.update(chunk_ids)
+                results.append([docstore[chunk_id] for chunk_id in chunk_ids])
+            
+            cached = len(chunk_ids_by_query) - len(missing)
+            print(f"검색 결과: 질의 {len(queries)}개, {sum(map(len, results))}개 문서"
+                  + (f" (캐시 {cached}개 질의)" if cached else ""))
             return results
             
         except Exception as e:
             print(f"검색 중 오류: {e}")
-            return []
+            return [[] for _ in queries]
+
+    def search(self, query: str, k: int = 5, fetch_k: int = None, weights: Tuple[float, float] = None):
+        """하이브리드 검색 수행"""
+        return self.search_many([query], k, fetch_k=fetch_k, weights=weights)[0]
+
+    def lookup_cutoffs(self, question: str, limit: int = 40) -> Optional[List[Document]]:
+        """점수 질문이면 커트라인 표 행을 (파일, 페이지)별 문서로 묶어 반환, 아니면 None"""
+        cutoff_index = self.cutoff_index
+        if cutoff_index is None:
+            return None
+        rows = cutoff_index.lookup(question, limit)
+        if not rows:
+            return None
+        pages = OrderedDict()
+        for row in rows:
+            pages.setdefault((row["source"], row["page"]), []).append(format_cutoff_row(row))
+        documents = []
+        for (source, page), lines in pages.items():
+            metadata = {"source": source, "pages": [page], "primary_page": page, "chunk_id": f"cutoff:{source}:{page}"}
+            self._attach_source_info(metadata)
+            documents.append(Document(page_content="\n".join(lines), metadata=metadata))
+        print(f"커트라인 조회: {len(rows)}행, {len(documents)}개 문서")
+        return documents
+
+    def expand_parents(self, docs: List[Document]) -> List[Document]:
+        """child 청크를 parent 청크로 확장 (같은 parent는 한 번만, parent가 없는 문서는 그대로)
+
+        parent는 child 중 가장 높은 rerank_score를 이어받고, 결과는 그 점수 순 (점수가 없으면 기존 순서 유지)
+        """
+        parent_store = self.parent_store
+        if parent_store is None:
+            return docs
+        parents = parent_store.get_many({doc.metadata["parent_id"] for doc in docs if doc.metadata.get("parent_id")})
+        expanded = OrderedDict()  # parent(또는 문서) 키 → (문서, 최고 rerank_score)
+        for doc in docs:
+            parent = parents.get(doc.metadata.get("parent_id"))
+            key = parent.metadata["chunk_id"] if parent is not None else doc.metadata.get("chunk_id", id(doc))
+            score = doc.metadata.get("rerank_score")
+            if key not in expanded:
+                expanded[key] = (parent if parent is not None else doc, score)
+            elif score is not None and (expanded[key][1] is None or score > expanded[key][1]):
+                expanded[key] = (expanded[key][0], score)
+        results = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": score})
+            if score is not None else doc
+            for doc, score in expanded.values()
+        ]
+        return sorted(results, key=lambda doc: -(doc.metadata.get("rerank_score") or 0))
+
+    def get_cache_stats(self) -> Dict:
+        """검색 캐시 적중/미스 통계"""
+        return {
+            "index_version": self.index_version,
+            "query_embedding": self.query_embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "embedding_client": self.embedding.stats(),
+        }
 
 # 전역 RAG 인스턴스
 rag_instance = None
 
-def init_fast_rag(data_path: str = "/app/workspace/data", store_name: str = "vector_store"):
-    """RAG 시스템 초기화"""
+def init_fast_rag(data_path: str = "/app/workspace/data", store_name: str = "vector_store",
+                  build_if_missing: bool = True):
+    """RAG 시스템 초기화 (build_if_missing=False면 벡터스토어가 없을 때 빌드하지 않고 오류 발생)"""
     global rag_instance
     
     if rag_instance is None:
@@ -215,13 +786,15 @@ def init_fast_rag(data_path: str = "/app/workspace/data", store_name: str = "vec
     
     success = rag_instance.load_retriever(store_name)
     if not success:
+        if not build_if_missing:
+            raise RuntimeError("벡터스토어를 로드할 수 없습니다. make_vector_store.py로 먼저 생성하세요.")
         print("기존 벡터스토어를 찾을 수 없습니다. 새로 생성합니다...")
         rag_instance.create_vectorstore(store_name)
         rag_instance.load_retriever(store_name)
     
     return rag_instance
 
-def fast_search(query: str, k: int = 5):
+def fast_search(query: str, k: int = 5, fetch_k: int = None, weights: Tuple[float, float] = None):
     """빠른 검색 함수"""
     global rag_instance
     
@@ -229,7 +802,43 @@ def fast_search(query: str, k: int = 5):
         print("RAG 시스템이 초기화되지 않았습니다.")
         return []
     
-    return rag_instance.search(query, k)
+    return rag_instance.search(query, k, fetch_k=fetch_k, weights=weights)
+
+def get_search_stats():
+    """검색 캐시 통계 (RAG 미초기화 시 None)"""
+    if rag_instance is None or not rag_instance.is_loaded:
+        return None
+    return rag_instance.get_cache_stats()
+
+def lookup_cutoffs(question: str):
+    """커트라인 구조화 조회 함수 (점수 질문이 아니거나 결과가 없으면 None)"""
+    if rag_instance is None or not rag_instance.is_loaded:
+        return None
+    return rag_instance.lookup_cutoffs(question)
+
+def expand_parents(docs: List[Document]) -> List[Document]:
+    """답변 생성용 parent 청크 확장 함수 (flat 모드나 RAG 미초기화 시 그대로 반환)"""
+    if rag_instance is None or not rag_instance.is_loaded:
+        return docs
+    return rag_instance.expand_parents(docs)
+
+def embed_question(query: str):
+    """답변 캐시용 질의 임베딩과 현재 인덱스 버전 (RAG 미초기화 시 (None, None))"""
+    if rag_instance is None or not rag_instance.is_loaded:
+        return None, None
+    rag_instance.refresh_if_stale()
+    return rag_instance.embed_queries([query])[0], rag_instance.index_version
+
+def fast_search_many(queries: List[str], k: int = 5, fetch_k: int = None,
+                     weights: Tuple[float, float] = None, dedupe: bool = True):
+    """여러 질의 일괄 검색 함수 (질의별 문서 목록, 기본적으로 질의 간 중복 제거)"""
+    global rag_instance
+    
+    if rag_instance is None:
+        print("RAG 시스템이 초기화되지 않았습니다.")
+        return [[] for _ in queries]
+    
+    return rag_instance.search_many(queries, k, fetch_k=fetch_k, weights=weights, dedupe=dedupe)
 
 def reset_rag():
     """RAG 시스템 리셋"""
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 희소(BM25) 인덱스 모듈
+=================================
+핵심 기능:
+1. bge-m3 토크나이저 서브워드 ID를 용어로 사용하는 BM25 역색인
+   (공백 단위 어절이 아닌 서브워드로 매칭하므로 "운전병은"처럼 조사가 붙은 어절도 부분 일치)
+2. 벡터스토어 빌드 시 한 번 계산해 FAISS 파일 옆에 압축 배열(bm25.npz)로 저장
+   - 용어별 CSC 형식: term_ids, indptr, 문서 행 번호, 사전 계산된 BM25 가중치
+3. 질의(여러 질의 일괄 포함)는 용어별 포스팅을 모아 np.bincount로 한 번에 점수 계산
+"""
+
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+BM25_FILE = "bm25.npz"
+
+
+class SparseBM25Index:
+    """용어 ID → (문서 행, BM25 가중치) 포스팅을 배열로 보관하는 BM25 인덱스"""
+
+    def __init__(self, doc_ids: np.ndarray, term_ids: np.ndarray, indptr: np.ndarray,
+                 postings_doc: np.ndarray, postings_weight: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids              # 행 번호 → chunk_id
+        self.term_ids = term_ids            # 정렬된 용어 ID
+        self.indptr = indptr                # 용어 i의 포스팅 = [indptr[i], indptr[i+1])
+        self.postings_doc = postings_doc
+        self.postings_weight = postings_weight
+        self.k1 = k1
+        self.b = b
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, documents: Sequence[Tuple[str, List[int]]], k1: float = 1.5, b: float = 0.75) -> "SparseBM25Index":
+        """[(chunk_id, 용어 ID 목록)]으로 인덱스 생성"""
+        if not documents:
+            raise ValueError("BM25 인덱스를 만들 문서가 없습니다.")
+        doc_ids = np.array([doc_id for doc_id, _ in documents], dtype=np.str_)
+        n_docs = len(documents)
+        lengths = np.array([len(terms) for _, terms in documents], dtype=np.float32)
+        avg_length = float(lengths.mean()) or 1.0
+
+        # (문서, 용어)별 출현 횟수
+        rows = np.repeat(np.arange(n_docs, dtype=np.int64), lengths.astype(np.int64))
+        terms = np.fromiter(
+            (term for _, doc_terms in documents for term in doc_terms), dtype=np.int64, count=int(lengths.sum())
+        )
+        # (용어, 문서) 쌍을 하나의 정수 키로 묶어 정렬 → 용어별로 문서 행이 모인 CSC 순서
+        pair_keys, tf = np.unique(terms * n_docs + rows, return_counts=True)
+        pair_terms = pair_keys // n_docs
+        pair_rows = (pair_keys % n_docs).astype(np.int32)
+
+        # 용어별 문서 빈도와 IDF (Lucene 방식: 항상 양수)
+        term_ids, df = np.unique(pair_terms, return_counts=True)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(df)
+
+        tf = tf.astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[pair_rows] / avg_length)
+        weights = np.repeat(idf, df).astype(np.float32) * tf * (k1 + 1) / (tf + norm)
+        return cls(doc_ids, term_ids.astype(np.int32), indptr, pair_rows, weights.astype(np.float32), k1, b)
+
+    def save(self, store_path: str):
+        """벡터스토어 폴더에 bm25.npz로 저장"""
+        path = os.path.join(store_path, BM25_FILE)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                doc_ids=self.doc_ids, term_ids=self.term_ids, indptr=self.indptr,
+                postings_doc=self.postings_doc, postings_weight=self.postings_weight,
+                params=np.array([self.k1, self.b], dtype=np.float64),
+            )
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, store_path: str) -> "SparseBM25Index":
+        with np.load(os.path.join(store_path, BM25_FILE)) as data:
+            k1, b = data["params"].tolist()
+            return cls(
+                data["doc_ids"], data["term_ids"], data["indptr"],
+                data["postings_doc"], data["postings_weight"], k1, b,
+            )
+
+    def scores_many(self, queries_terms: Sequence[List[int]]) -> np.ndarray:
+        """여러 질의의 BM25 점수 행렬 [질의 수, 문서 수] - 모든 질의를 한 번의 bincount로 계산
+
+        질의에 반복된 용어는 횟수만큼 가중합니다.
+        """
+        n_queries, n_docs = len(queries_terms), len(self.doc_ids)
+        lengths = np.array([len(terms) for terms in queries_terms], dtype=np.int64)
+        if not lengths.sum() or not len(self.term_ids):
+            return np.zeros((n_queries, n_docs), dtype=np.float32)
+        query_rows = np.repeat(np.arange(n_queries, dtype=np.int64), lengths)
+        terms = np.concatenate([np.asarray(t, dtype=np.int64) for t in queries_terms if len(t)])
+        # (질의, 용어)별 횟수
+        stride = int(terms.max()) + 1
+        keys, counts = np.unique(query_rows * stride + terms, return_counts=True)
+        query_rows, terms = np.divmod(keys, stride)
+        positions = np.minimum(np.searchsorted(self.term_ids, terms), len(self.term_ids) - 1)
+        found = self.term_ids[positions] == terms
+        positions, counts, query_rows = positions[found], counts[found], query_rows[found]
+        starts = self.indptr[positions]
+        spans = self.indptr[positions + 1] - starts
+        # 질의 용어들의 포스팅 구간을 하나의 인덱스 배열로 모아 한 번에 누적
+        offsets = np.repeat(starts - np.cumsum(spans) + spans, spans) + np.arange(spans.sum())
+        weights = self.postings_weight[offsets] * np.repeat(counts, spans).astype(np.float32)
+        cells = np.repeat(query_rows, spans) * n_docs + self.postings_doc[offsets]
+        scores = np.bincount(cells, weights=weights, minlength=n_queries * n_docs)
+        return scores.reshape(n_queries, n_docs).astype(np.float32)
+
+    def scores(self, query_terms: List[int]) -> np.ndarray:
+        """전체 문서의 BM25 점수 벡터"""
+        return self.scores_many([query_terms])[0]
+
+    def search_many(self, queries_terms: Sequence[List[int]], k: int) -> List[List[Tuple[int, float]]]:
+        """질의별 점수 상위 k개 (행 번호, 점수) - 점수 0인 문서는 제외"""
+        scores = self.scores_many(queries_terms)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in queries_terms]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, rows in zip(scores, top):
+            rows = rows[np.argsort(-query_scores[rows], kind="stable")]
+            results.append([(int(row), float(query_scores[row])) for row in rows if query_scores[row] > 0])
+        return results
+
+    def search(self, query_terms: List[int], k: int) -> List[Tuple[int, float]]:
+        """점수 상위 k개 (행 번호, 점수) - 점수 0인 문서는 제외"""
+        return self.search_many([query_terms], k)[0]
@@ -4,6 +4,18 @@ let currentSessionId = null;
 let currentSessionName = null;
 let ws = null;
 let isTyping = false;
+let streamingMessage = null;  // 토큰 스트리밍 중인 답변 { element, text }
+
+// 서버 진행 단계(stage 이벤트) 표시 문구
+const STAGE_LABELS = {
+    route: '질문 유형을 확인하고 있습니다...',
+    rewrite: '질문을 이해하고 있습니다...',
+    cache: '이전 답변을 확인하고 있습니다...',
+    decompose: '관련 질문을 정리하고 있습니다...',
+    retrieval: '관련 문서를 검색하고 있습니다...',
+    rerank: '검색된 문서를 평가하고 있습니다...',
+    generate: '답변을 작성하고 있습니다...'
+};
 
 // 페이지 로드 시 실행
 document.addEventListener('DOMContentLoaded', function() {
@@ -225,9 +237,34 @@ function connectWebSocket() {
     
     ws.onmessage = function(event) {
         const data = JSON.parse(event.data);
-        if (data.type === 'bot_response' && data.response) {
-            addMessage(data.response, 'assistant');
+        if (data.type === 'queue') {
+            // 서버 처리 용량 초과 시 대기 순번 표시
+            setTypingStatus(`요청이 많아 대기 중입니다... (대기 순번: ${data.position})`);
+            return;
         }
+        if (data.type === 'stage') {
+            if (STAGE_LABELS[data.stage]) setTypingStatus(STAGE_LABELS[data.stage]);
+            return;
+        }
+        if (data.type === 'token') {
+            // 첫 토큰에 답변 말풍선을 만들고 이후 토큰을 이어 붙임
+            if (!streamingMessage) {
+                streamingMessage = { element: addMessage('', 'assistant'), text: '' };
+            }
+            streamingMessage.text += data.content;
+            streamingMessage.element.querySelector('.message-text').innerHTML = renderMessageHtml(streamingMessage.text);
+            scrollToBottom();
+            return;
+        }
+        if (data.type === 'bot_response' && data.message) {
+            // 최종 답변으로 교체 (생성 실패 시 대체 답변일 수 있음)
+            if (streamingMessage) {
+                streamingMessage.element.querySelector('.message-text').innerHTML = renderMessageHtml(data.message);
+            } else {
+                addMessage(data.message, 'assistant');
+            }
+        }
+        streamingMessage = null;
         hideTypingIndicator();
     };
     
@@ -285,14 +322,8 @@ function sendMessage() {
     }
 }
 
-// 메시지 추가
-function addMessage(content, role) {
-    const chatMessages = document.getElementById('chatMessages');
-    const messageDiv = document.createElement('div');
-    messageDiv.className = `message ${role}-message`;
-    const avatar = role === 'user' ? '<i class="fas fa-user"></i>' : '<i class="fas fa-robot"></i>';
-    const time = new Date().toLocaleString('ko-KR');
-
+// 메시지 본문 HTML (코드 블록, 강조, 출처 표시)
+function renderMessageHtml(content) {
     function processText(text) {
         text = text.replace(/[&<>"]/g, tag => ({'&': '&amp;','<': '&lt;','>': '&gt;','"': '&quot;','\'': '&#39;'}[tag] || tag));
         text = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
@@ -317,6 +348,17 @@ function addMessage(content, role) {
     }
     
     html += `<div class='message-desc'>${processText(content.substring(lastIndex).trim())}</div>`;
+    return html;
+}
+
+// 메시지 추가
+function addMessage(content, role) {
+    const chatMessages = document.getElementById('chatMessages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${role}-message`;
+    const avatar = role === 'user' ? '<i class="fas fa-user"></i>' : '<i class="fas fa-robot"></i>';
+    const time = new Date().toLocaleString('ko-KR');
+    const html = renderMessageHtml(content);
 
     messageDiv.innerHTML = `
         <div class="message-avatar">${avatar}</div>
@@ -327,6 +369,7 @@ function addMessage(content, role) {
     `;
     chatMessages.appendChild(messageDiv);
     scrollToBottom();
+    return messageDiv;
 }
 
 // 코드 복사 함수
@@ -396,8 +439,13 @@ function setupTextareaAutoResize() {
     });
 }
 
+function setTypingStatus(text) {
+    document.getElementById('typingStatus').textContent = text;
+}
+
 function showTypingIndicator() {
     isTyping = true;
+    setTypingStatus('AI가 답변을 생성하고 있습니다...');
     document.getElementById('typingIndicator').style.display = 'flex';
     scrollToBottom();
 }
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""rag_page 모듈은 같은 폴더 기준으로 import하므로 테스트 실행 시 rag_page를 경로에 추가"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""BoundedMemorySaver가 실제 그래프 실행에서 스레드 수와 blob 수를 제한하는지 확인"""
+
+import asyncio
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from checkpointer import BoundedMemorySaver
+
+
+class State(TypedDict):
+    question: str
+    answer: str
+
+
+def build_graph(checkpointer):
+    graph = StateGraph(State)
+    graph.add_node("retrieve", lambda state: {"answer": state["question"] + " 문서"})
+    graph.add_node("generate", lambda state: {"answer": state["answer"] + " 답변"})
+    graph.add_edge(START, "retrieve")
+    graph.add_edge("retrieve", "generate")
+    graph.add_edge("generate", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+async def run_turns(app, threads, turns):
+    for turn in range(turns):
+        for thread_id in threads:
+            config = {"configurable": {"thread_id": thread_id}}
+            result = await app.ainvoke({"question": f"{thread_id}-{turn}"}, config)
+            assert result["answer"] == f"{thread_id}-{turn} 문서 답변"
+
+
+def test_thread_and_blob_counts_stay_bounded():
+    saver = BoundedMemorySaver(max_threads=3, ttl_seconds=0, max_checkpoints=2)
+    app = build_graph(saver)
+    threads = [f"session-{i}" for i in range(5)]
+
+    asyncio.run(run_turns(app, threads, 3))
+    stats = saver.stats()
+    blobs_after_warmup = len(saver.blobs)
+    assert stats["prune_enabled"]
+    assert stats["threads"] == 3
+    assert stats["evicted_threads"] > 0
+    assert all(count <= 2 for count in stats["checkpoints_per_thread"].values())
+
+    asyncio.run(run_turns(app, threads, 20))
+    stats = saver.stats()
+    assert stats["threads"] == 3
+    assert all(count <= 2 for count in stats["checkpoints_per_thread"].values())
+    assert len(saver.blobs) == blobs_after_warmup
+
+    # 마지막 상태는 정리 후에도 그대로 조회
+    state = app.get_state({"configurable": {"thread_id": threads[-1]}})
+    assert state.values["answer"] == f"{threads[-1]}-19 문서 답변"
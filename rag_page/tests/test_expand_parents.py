@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""parent 확장 후 문맥 패킹이 리랭킹 점수 순서를 유지하는지 확인"""
+
+from langchain.schema import Document
+
+from chunker import ParentStore
+from context_packer import ContextPacker
+from simple_rag_with_pages import SimpleRAGWithPages
+
+
+def make_rag(tmp_path, parents):
+    ParentStore.save(str(tmp_path), parents)
+    rag = SimpleRAGWithPages.__new__(SimpleRAGWithPages)
+    rag._index = {"parent_store": ParentStore.load(str(tmp_path))}
+    return rag
+
+
+def parent(parent_id: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": parent_id, "source": f"{parent_id}.pdf"})
+
+
+def child(parent_id: str, text: str, score) -> Document:
+    metadata = {"chunk_id": f"{parent_id}-{text}", "parent_id": parent_id, "source": f"{parent_id}.pdf"}
+    if score is not None:
+        metadata["rerank_score"] = score
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_expanded_parents_are_packed_by_best_child_score(tmp_path):
+    rag = make_rag(tmp_path, [parent("p1", "첫째 parent"), parent("p2", "둘째 parent"), parent("p3", "셋째 parent")])
+    children = [
+        child("p3", "a", 8),
+        child("p2", "b", 9),
+        child("p1", "c", 7),
+        child("p1", "d", 10),  # p1의 최고 점수는 10
+    ]
+
+    expanded = rag.expand_parents(children)
+    assert [doc.metadata["chunk_id"] for doc in expanded] == ["p1", "p2", "p3"]
+    assert [doc.metadata["rerank_score"] for doc in expanded] == [10, 9, 8]
+
+    packed, _ = ContextPacker(budget=1000, min_tokens=1).pack("질문", expanded)
+    assert [doc.page_content for doc in packed] == ["첫째 parent", "둘째 parent", "셋째 parent"]
+
+
+def test_expand_parents_keeps_retrieval_order_without_scores(tmp_path):
+    rag = make_rag(tmp_path, [parent("p1", "첫째 parent"), parent("p2", "둘째 parent")])
+    expanded = rag.expand_parents([child("p2", "a", None), child("p1", "b", None), child("p2", "c", None)])
+    assert [doc.metadata["chunk_id"] for doc in expanded] == ["p2", "p1"]
+    assert all("rerank_score" not in doc.metadata for doc in expanded)
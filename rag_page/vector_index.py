@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - FAISS 인덱스 유형 모듈
+=================================
+핵심 기능:
+1. faiss.index_factory 문자열(index spec)로 인덱스 생성 및 빌드된 청크 벡터로 학습
+   - Flat: 정확 검색 (기본값)
+   - HNSW32: 그래프 기반 근사 검색 (학습 불필요, 삭제 미지원)
+   - IVF256,Flat / IVF256,PQ64 / IVF256,SQ8: 역파일 + (원본 | PQ | 스칼라 양자화)
+   - SQ8: 스칼라 양자화 (float32 → uint8)
+2. 검색 파라미터(nprobe, efSearch) 적용
+3. 인덱스 메모리 크기 계산
+"""
+
+import os
+from typing import Optional
+
+import faiss
+import numpy as np
+
+DEFAULT_INDEX_SPEC = "Flat"
+
+
+def build_faiss_index(spec: str, vectors: np.ndarray, metric: int = faiss.METRIC_L2):
+    """index spec으로 빈 인덱스를 만들고, 학습이 필요한 유형이면 vectors로 학습 (벡터 추가는 하지 않음)"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], spec, metric)
+    if not index.is_trained:
+        try:
+            index.train(vectors)
+        except RuntimeError as e:
+            raise ValueError(
+                f"'{spec}' 인덱스 학습 실패 (청크 {len(vectors)}개): {e} "
+                "- 청크 수가 적으면 IVF 리스트 수/PQ 비트를 줄이거나 Flat/HNSW를 사용하세요."
+            ) from e
+    return index
+
+
+def supports_removal(index) -> bool:
+    """remove_ids 지원 여부 (HNSW 계열은 삭제 불가 → 전체 재빌드 필요)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return not isinstance(index, (faiss.IndexHNSW, faiss.IndexNSG))
+
+
+def apply_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """IVF nprobe / HNSW efSearch 설정 (기본: FAISS_NPROBE, FAISS_EF_SEARCH 환경변수)"""
+    nprobe = nprobe or int(os.environ.get("FAISS_NPROBE", 16))
+    ef_search = ef_search or int(os.environ.get("FAISS_EF_SEARCH", 64))
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # IVF 계열이 아님
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexPreTransform):
+        base = faiss.downcast_index(base.index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    return index
+
+
+def index_memory_bytes(index) -> int:
+    """직렬화 크기 기준 인덱스 메모리 사용량"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def describe_index(index) -> str:
+    """로그용 인덱스 요약"""
+    return f"{type(faiss.downcast_index(index)).__name__} ntotal={index.ntotal} {index_memory_bytes(index) / 1e6:.1f}MB"
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+병무청 AI 상담 시스템 - 벡터스토어 저장 형식 모듈
+=================================
+핵심 기능:
+1. pickle 없는 벡터스토어 저장 형식 (빌드마다 새 세대 폴더 store-{세대}/에 저장)
+   - index.faiss: FAISS 인덱스 (검색 프로세스는 mmap으로 읽어 워커 간 OS 페이지 캐시 공유)
+   - chunks.bin: 청크 본문(UTF-8)을 이어 붙인 blob
+   - chunks.sqlite: FAISS 행 번호, chunk_id, blob 오프셋/길이, 메타데이터(JSON)
+   - CURRENT: 현재 세대 폴더 이름 - 세 파일을 모두 쓴 뒤 이 파일만 원자적으로 교체
+     (중단/동시 재로드 시에도 새 인덱스와 이전 docstore가 섞이지 않음)
+2. 지연 로딩 docstore (MmapDocstore) - 최종 결과 문서만 본문/메타데이터를 읽음
+3. 이전 형식(index.pkl) 벡터스토어는 FAISS.load_local로 읽음
+"""
+
+import os
+import json
+import mmap
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Iterator
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+BLOB_FILE = "chunks.bin"
+META_FILE = "chunks.sqlite"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "store-"
+
+
+def resolve_store_dir(store_path: str) -> str:
+    """CURRENT가 가리키는 세대 폴더 (CURRENT가 없는 이전 저장 형식이면 store_path 자체)"""
+    current_path = os.path.join(store_path, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        return store_path
+    with open(current_path, encoding="utf-8") as f:
+        return os.path.join(store_path, f.read().strip())
+
+
+def _remove_stale_generations(save_path: str, keep: set):
+    """keep 외의 세대 폴더와 이전 형식 파일 삭제 (이미 mmap으로 연 프로세스는 삭제 후에도 계속 읽음)"""
+    for name in os.listdir(save_path):
+        path = os.path.join(save_path, name)
+        if name.startswith(GENERATION_PREFIX) and name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    for name in (INDEX_FILE, BLOB_FILE, META_FILE, LEGACY_DOCSTORE_FILE):
+        path = os.path.join(save_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def save_vectorstore(vectorstore: FAISS, save_path: str):
+    """FAISS 인덱스 + 청크 blob + SQLite 메타데이터를 새 세대 폴더에 저장한 뒤 CURRENT를 교체
+
+    직전 세대는 남겨 두어, CURRENT를 먼저 읽고 아직 파일을 열지 않은 검색 프로세스도 같은 세대를 읽을 수 있음
+    """
+    os.makedirs(save_path, exist_ok=True)
+    previous = os.path.basename(resolve_store_dir(save_path))
+    generation = f"{GENERATION_PREFIX}{time.time_ns():x}"
+    generation_path = os.path.join(save_path, generation)
+    os.makedirs(generation_path)
+    index_path = os.path.join(generation_path, INDEX_FILE)
+    blob_path = os.path.join(generation_path, BLOB_FILE)
+    meta_path = os.path.join(generation_path, META_FILE)
+
+    faiss.write_index(vectorstore.index, index_path)
+
+    rows = []
+    offset = 0
+    with open(blob_path, "wb") as blob:
+        for row in range(len(vectorstore.index_to_docstore_id)):
+            chunk_id = vectorstore.index_to_docstore_id[row]
+            doc = vectorstore.docstore.search(chunk_id)
+            data = doc.page_content.encode("utf-8")
+            blob.write(data)
+            rows.append((row, chunk_id, offset, len(data), json.dumps(doc.metadata, ensure_ascii=False)))
+            offset += len(data)
+
+    conn = sqlite3.connect(meta_path)
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (row INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, "
+            "offset INTEGER NOT NULL, length INTEGER NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "INSERT INTO info VALUES ('distance_strategy', ?), ('normalize_L2', ?)",
+            (str(vectorstore.distance_strategy.value), json.dumps(bool(vectorstore._normalize_L2)))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 세 파일을 모두 쓴 뒤 CURRENT 교체 한 번으로 새 세대 공개
+    current_path = os.path.join(save_path, CURRENT_FILE)
+    with open(f"{current_path}.tmp", "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(f"{current_path}.tmp", current_path)
+    # 이전 형식 파일(pickle docstore, 세대 폴더 없이 저장된 파일)은 더 이상 사용하지 않음
+    _remove_stale_generations(save_path, {generation, previous})
+
+
+class MmapDocstore(Mapping):
+    """chunk_id → Document 지연 로딩 매핑 (본문은 mmap blob, 메타데이터는 SQLite에서 필요할 때 읽음)
+
+    chunk_id와 blob 오프셋만 메모리에 두고, 읽은 문서는 작은 LRU 캐시에 보관합니다.
+    """
+
+    def __init__(self, store_path: str, cache_size: int = None):
+        self.meta_path = os.path.join(store_path, META_FILE)
+        # 연결은 로드 시 한 번만 열어 공유 (재빌드로 파일이 교체되어도 오프셋/blob과 같은 세대의 파일을 계속 읽음)
+        self._conn = sqlite3.connect(f"file:{self.meta_path}?mode=ro", uri=True, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        rows = self._conn.execute("SELECT row, chunk_id, offset, length FROM chunks ORDER BY row").fetchall()
+        self.row_ids = [chunk_id for _, chunk_id, _, _ in rows]
+        self._rows = {chunk_id: row for row, chunk_id, _, _ in rows}
+        self._offsets = np.array([offset for _, _, offset, _ in rows], dtype=np.int64)
+        self._lengths = np.array([length for _, _, _, length in rows], dtype=np.int64)
+        blob_path = os.path.join(store_path, BLOB_FILE)
+        with open(blob_path, "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(blob_path) else b""
+        self.cache_size = cache_size or int(os.environ.get("DOCSTORE_CACHE_SIZE", 512))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def info(self, key: str, default=None):
+        with self._db_lock:
+            row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def __getitem__(self, chunk_id: str) -> Document:
+        with self._lock:
+            doc = self._cache.get(chunk_id)
+            if doc is not None:
+                self._cache.move_to_end(chunk_id)
+                return doc
+        row = self._rows[chunk_id]  # 없으면 KeyError
+        start = int(self._offsets[row])
+        content = self._blob[start:start + int(self._lengths[row])].decode("utf-8")
+        # 검색은 asyncio.to_thread 작업 스레드에서 실행되므로 공유 연결은 잠금 후 사용
+        with self._db_lock:
+            (metadata,) = self._conn.execute("SELECT metadata FROM chunks WHERE row = ?", (row,)).fetchone()
+        doc = Document(page_content=content, metadata=json.loads(metadata))
+        with self._lock:
+            self._cache[chunk_id] = doc
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return doc
+
+    def __contains__(self, chunk_id) -> bool:
+        return chunk_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.row_ids)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def materialize(self) -> dict:
+        """전체 문서를 일반 dict로 읽기 (증분 빌드 시 수정 가능한 docstore 필요)"""
+        docs = {}
+        query = "SELECT chunk_id, offset, length, metadata FROM chunks ORDER BY row"
+        with self._db_lock:
+            rows = self._conn.execute(query).fetchall()
+        for chunk_id, start, length, metadata in rows:
+            content = self._blob[start:start + length].decode("utf-8")
+            docs[chunk_id] = Document(page_content=content, metadata=json.loads(metadata))
+        return docs
+
+    def close(self):
+        """SQLite 연결과 blob mmap 닫기 (materialize 후 메모리 docstore만 쓸 때)"""
+        with self._db_lock:
+            self._conn.close()
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+
+
+def is_mmap_format(store_path: str) -> bool:
+    store_dir = resolve_store_dir(store_path)
+    return os.path.exists(os.path.join(store_dir, META_FILE)) and os.path.exists(os.path.join(store_dir, BLOB_FILE))
+
+
+def load_vectorstore(store_path: str, embedding, lazy: bool = True) -> FAISS:
+    """벡터스토어 로드
+
+    lazy=True(검색 서버): FAISS 인덱스를 읽기 전용 mmap으로 열고 docstore는 MmapDocstore로 지연 로딩
+    lazy=False(빌드): 인덱스/문서를 메모리로 읽어 추가·삭제 가능한 벡터스토어 반환
+    이전 형식(index.pkl)은 FAISS.load_local로 읽습니다.
+    CURRENT는 한 번만 읽어 세 파일을 모두 같은 세대 폴더에서 엽니다.
+    """
+    store_dir = resolve_store_dir(store_path)
+    if not (os.path.exists(os.path.join(store_dir, META_FILE)) and os.path.exists(os.path.join(store_dir, BLOB_FILE))):
+        return FAISS.load_local(store_path, embedding, allow_dangerous_deserialization=True)
+
+    docs = MmapDocstore(store_dir)
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    normalize_l2 = json.loads(docs.info("normalize_L2", "false"))
+    distance_strategy = DistanceStrategy(docs.info("distance_strategy", DistanceStrategy.EUCLIDEAN_DISTANCE.value))
+    if lazy:
+        # IO_FLAG_MMAP_IFC: Flat/HNSW 벡터 저장소까지 mmap (구버전 faiss는 IVF 리스트만 mmap)
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(index_path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        docstore = InMemoryDocstore(docs)
+    else:
+        index = faiss.read_index(index_path)
+        docstore = InMemoryDocstore(docs.materialize())
+        docs.close()
+    return FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(docs.row_ids)),
+        normalize_L2=normalize_l2,
+        distance_strategy=distance_strategy,
+    )